@@ -1,16 +1,339 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
+from flask.json.provider import DefaultJSONProvider
 import os
+import math
+import click
+import time
 from dotenv import load_dotenv
-from utils.route_planner import plan_route
+from utils.route_planner import plan_stops_route, trip_stops, plan_routes_batch, iter_routes_batch, warm_geocode_cache, geocode_cache, route_cache, get_upstream_status
 from utils.hours_of_service import calculate_hos_compliance
-from utils.eld_generator import generate_eld_logs
+from utils.hos_simulator import simulate_hos
+from datetime import datetime
+from utils.eld_generator import generate_eld_logs, iter_eld_logs
+from utils.log_encoding import grid_format_from_request, encode_eld_logs, encode_log_sheet, GridSavings
+from utils.geometry import shape_route_output, GEOMETRY_FORMATS
+from utils.streaming import stream_format, encode_event, STREAM_CONTENT_TYPES, STREAM_HEADERS
+from utils.plan_cache import PlanCache, plan_key
+from utils.replan import PlanStore, store_plan, parse_completed_stops, resolve_position, replan_route, resume_state
+from utils.driver_cycles import DriverCycleStore
+from utils.log_render import parse_log_sheets, render_logs, render_cache, RENDER_FORMATS, RENDER_CONTENT_TYPES
+from utils.departure_sweep import parse_departure_window, parse_cycle_hours, sweep_departures, SWEEP_MAX_CANDIDATES
+from utils.gazetteer import autocomplete, write_gazetteer, GAZETTEER_CSV, GAZETTEER_PATH
+from utils.metrics import span, start_timing, current_spans, server_timing, render_metrics, gauge_lines, REQUEST_SECONDS
+from models import to_json
 
 load_dotenv()
 
+class ModelJSONProvider(DefaultJSONProvider):
+    # plan models are only turned into dicts here, when the response is written
+    @staticmethod
+    def default(o):
+        try:
+            return to_json(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
+
 app = Flask(__name__)
+app.json = ModelJSONProvider(app)
 CORS(app)
 
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 500))
+# classic: segment-boundary rests with placeholder times, simulator: event driven with real clock times
+HOS_ENGINE = os.environ.get('HOS_ENGINE', 'classic')
+HOS_ENGINES = ('classic', 'simulator')
+
+REQUIRED_FIELDS = ['current_location', 'pickup_location', 'dropoff_location', 'current_hours']
+
+# whole serialized responses, dropped together with the route cache legs they were built from
+plan_cache = PlanCache(route_cache)
+
+# legs and hos checkpoints of recent plans, for re-planning trips in progress
+# kept in sqlite next to the geocode cache so any worker can re-plan, memory only where the disk is read-only
+plan_store = PlanStore()
+
+# per-driver on-duty hours by day, trips with a driver_id plan from this instead of current_hours
+driver_cycles = DriverCycleStore()
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    start_timing()
+
+@app.after_request
+def add_server_timing(response):
+    # per-stage spans of this request, streamed responses have sent their headers before any stage ran
+    elapsed = time.perf_counter() - g.get("request_started", time.perf_counter())
+    REQUEST_SECONDS.observe(elapsed, endpoint=request.endpoint or "unknown")
+    if not response.is_streamed:
+        response.headers["Server-Timing"] = server_timing(current_spans(), total=elapsed)
+    return response
+
+def is_number(value):
+    # a finite number, or a string float() reads as one. bools are rejected even though float() takes them
+    if isinstance(value, bool):
+        return False
+    try:
+        return math.isfinite(float(value))
+    except (TypeError, ValueError):
+        return False
+
+def validate_trip(data, hours_range=False):
+    """
+    error message for the first problem with a trip request, None when it's fine
+    hours_range leaves current_hours to parse_cycle_hours, the sweep takes a list or range there
+    """
+    if not isinstance(data, dict):
+        return "Expected a trip object"
+    has_driver = data.get('driver_id') not in (None, "")
+    for field in REQUIRED_FIELDS:
+        # a known driver's cycle hours come from the driver cycle store
+        if field == 'current_hours' and has_driver:
+            continue
+        # a multi-stop trip lists its stops instead of one pickup and dropoff
+        if field in ('pickup_location', 'dropoff_location') and data.get('stops') is not None:
+            continue
+        if field not in data:
+            return f"Missing required field: {field}"
+    hours = data.get('current_hours')
+    if 'current_hours' in data and not hours_range and not (hours is None and has_driver) and not is_number(hours):
+        return f"Invalid current_hours: {hours}"
+    if data.get('hos_engine') and data['hos_engine'] not in HOS_ENGINES:
+        return f"Unknown hos_engine: {data['hos_engine']}, expected one of {', '.join(HOS_ENGINES)}"
+    if data.get('departure_time'):
+        try:
+            datetime.fromisoformat(data['departure_time'])
+        except (TypeError, ValueError):
+            return f"Invalid departure_time: {data['departure_time']}"
+    if data.get('stops') is not None:
+        try:
+            trip_stops(data)
+        except ValueError as e:
+            return str(e)
+    return None
+
+def validate_fleet_driver(driver):
+    # error message for the first problem with a fleet driver entry, None when it's fine
+    if not isinstance(driver, dict):
+        return "Expected a driver object"
+    segment_hours = driver.get("segment_hours")
+    if not isinstance(segment_hours, list) or not segment_hours:
+        return "segment_hours must be a non-empty list"
+    if not all(is_number(hours) and float(hours) >= 0 for hours in segment_hours):
+        return "segment_hours must be non-negative numbers"
+    stop_hours = driver.get("stop_hours")
+    if stop_hours is not None:
+        if not isinstance(stop_hours, list) or len(stop_hours) > len(segment_hours):
+            return "stop_hours must be a list no longer than segment_hours"
+        if not all(hours is None or (is_number(hours) and float(hours) >= 0) for hours in stop_hours):
+            return "stop_hours must be non-negative numbers or null"
+    if driver.get("current_hours") is not None and not is_number(driver["current_hours"]):
+        return f"Invalid current_hours: {driver['current_hours']}"
+    return None
+
+def route_trip(trip, include_steps=False):
+    # route data for a validated trip, its stops reordered for the least driving with optimize_stops
+    return plan_stops_route(
+        trip['current_location'],
+        trip_stops(trip),
+        optimize=bool(trip.get('optimize_stops')),
+        include_steps=include_steps
+    )
+
+def with_driver_cycle(trip):
+    """
+    a trip with a driver_id plans from the driver's stored duty history (as of the
+    departure day) instead of the client's current_hours. ValueError when there's nothing
+    stored for the driver and no current_hours to fall back to
+    """
+    driver_id = trip.get('driver_id')
+    if driver_id in (None, ""):
+        return trip
+
+    state = None
+    if driver_cycles.available:
+        departure = trip.get('departure_time')
+        state = driver_cycles.state(driver_id, datetime.fromisoformat(departure).date() if departure else None)
+    if state is None:
+        if trip.get('current_hours') is None:
+            raise ValueError(f"No duty history for driver {driver_id}, send current_hours or ingest it with /api/drivers/cycles")
+        return trip
+    return {**trip, "current_hours": state["cycle_hours"], "cycle_history": state["history"]}
+
+def parse_output_options(args, accept):
+    """
+    response shaping options, all opt-in so the default response stays the same
+    - grid_format: intervals | bitset for compact eld grids
+    - zoom: simplify route geometry for a map at this zoom level (0-22)
+    - geometry: geojson | polyline | polyline6
+    - steps: true to include mapbox turn-by-turn steps in each segment
+    """
+    options = {
+        "grid_format": grid_format_from_request(args, accept),
+        "zoom": None,
+        "geometry": (args.get("geometry") or "geojson").lower(),
+        "steps": (args.get("steps") or "false").lower() in ("1", "true", "yes")
+    }
+
+    if args.get("zoom") not in (None, ""):
+        try:
+            options["zoom"] = float(args["zoom"])
+        except ValueError:
+            raise ValueError(f"Invalid zoom: {args['zoom']}")
+        if not 0 <= options["zoom"] <= 22:
+            raise ValueError("zoom must be between 0 and 22")
+
+    if options["geometry"] not in GEOMETRY_FORMATS:
+        raise ValueError(f"Unknown geometry: {options['geometry']}, expected one of {', '.join(GEOMETRY_FORMATS)}")
+
+    return options
+
+def shape_route(route_data, options):
+    if not options:
+        return route_data
+    return shape_route_output(route_data, options["zoom"], options["geometry"])
+
+def calculate_hos(route_data, trip, resume=None):
+    """
+    trip can pick the engine ("hos_engine") and, for the simulator, a "departure_time"
+    resume is the driver state to pick up from when re-planning (see utils.replan.resume_state)
+    """
+    engine = trip.get('hos_engine') or HOS_ENGINE
+    resume = resume or {}
+    # a re-plan resumes from a checkpoint's cycle hours, not the stored history
+    cycle_history = None if 'weekly_hours' in resume else trip.get('cycle_history')
+
+    if engine == 'simulator':
+        departure = resume.get('timestamp') or trip.get('departure_time')
+        return simulate_hos(
+            route_data=route_data,
+            current_hours=float(resume.get('weekly_hours', trip['current_hours'])),
+            start_time=datetime.fromisoformat(departure) if departure else None,
+            cycle_history=cycle_history,
+            driven_today=resume.get('hours_driven', 0.0),
+            on_duty_today=resume.get('hours_on_duty', 0.0),
+            since_break=resume.get('since_break'),
+            day_offset=resume.get('day', 1) - 1
+        )
+
+    return calculate_hos_compliance(
+        route_data=route_data,
+        current_hours=float(resume.get('weekly_hours', trip['current_hours'])),
+        driven_today=resume.get('hours_driven', 0),
+        on_duty_today=resume.get('hours_on_duty'),
+        start_day=resume.get('day', 1),
+        cycle_history=cycle_history
+    )
+
+def build_plan(route_data, trip, options=None, resume=None):
+    # everything after routing: hos compliance, eld logs and the response body
+    grid_format = options["grid_format"] if options else None
+
+    # calculating hos compliance and stops
+    with span("hos"):
+        hos_plan = calculate_hos(route_data, trip, resume)
+
+    # generating the eld logs in compliance with hos ruleset
+    with span("eld"):
+        eld_logs = generate_eld_logs(hos_plan)
+
+    # summation of all data
+    plan = {
+        "route": shape_route(route_data, options),
+        "hos_plan": hos_plan,
+        "eld_logs": eld_logs
+    }
+
+    # opt-in compact grids, the default shape stays the 4 x 96 arrays
+    if grid_format:
+        plan["eld_logs"], plan["grid_encoding"] = encode_eld_logs(eld_logs, grid_format)
+
+    return plan
+
+def stream_response(events, fmt):
+    return Response(
+        stream_with_context(events),
+        mimetype=STREAM_CONTENT_TYPES[fmt],
+        headers=STREAM_HEADERS
+    )
+
+def stream_plan(data, fmt, options=None):
+    # route first, then the hos plan, then one event per day of logs
+    grid_format = options["grid_format"] if options else None
+    savings = GridSavings(grid_format) if grid_format else None
+    try:
+        route_data = route_trip(data, bool(options and options["steps"]))
+        yield encode_event(fmt, "route", shape_route(route_data, options))
+
+        with span("hos"):
+            hos_plan = calculate_hos(route_data, data)
+        yield encode_event(fmt, "hos_plan", hos_plan)
+
+        for log_sheet in iter_eld_logs(hos_plan):
+            if grid_format:
+                encoded = encode_log_sheet(log_sheet, grid_format)
+                savings.add(log_sheet, encoded)
+                log_sheet = encoded
+            yield encode_event(fmt, "eld_log", log_sheet)
+
+        plan_id = store_plan(plan_store, data, data.get('hos_engine') or HOS_ENGINE, route_data, hos_plan)
+        done = {"days": hos_plan["total_trip_days"], "plan_id": plan_id}
+        if savings:
+            # the same totals the non-stream response reports, summed as the sheets went out
+            done["grid_encoding"] = savings.to_dict()
+        yield encode_event(fmt, "done", done)
+    except Exception as e:
+        app.logger.error(f"Error streaming plan: {str(e)}")
+        yield encode_event(fmt, "error", {"error": str(e)})
+
+def stream_batch(trips, invalid, fmt, options=None):
+    # one event per trip as soon as it's planned, so memory doesn't grow with the batch
+    failed = len(invalid)
+    for index, error in invalid.items():
+        yield encode_event(fmt, "trip", {"index": index, "error": error})
+
+    stats = {}
+    valid = [index for index in range(len(trips)) if index not in invalid]
+    try:
+        trips_to_plan = [trips[index] for index in valid]
+        for position, route_data in iter_routes_batch(trips_to_plan, stats, bool(options and options["steps"])):
+            index = valid[position]
+            if isinstance(route_data, Exception):
+                failed += 1
+                yield encode_event(fmt, "trip", {"index": index, "error": str(route_data)})
+                continue
+            try:
+                result = {"index": index, **build_plan(route_data, trips[index], options)}
+            except Exception as e:
+                failed += 1
+                result = {"index": index, "error": str(e)}
+            yield encode_event(fmt, "trip", result)
+    except Exception as e:
+        app.logger.error(f"Error streaming batch: {str(e)}")
+        yield encode_event(fmt, "error", {"error": str(e)})
+        return
+
+    yield encode_event(fmt, "done", {
+        "trips": len(trips),
+        "succeeded": len(trips) - failed,
+        "failed": failed,
+        "unique_locations": stats.get("unique_locations", 0),
+        "unique_legs": stats.get("unique_legs", 0)
+    })
+
+def plan_response(cached, cache_status):
+    # strong etag on the exact body, a matching If-None-Match gets an empty 304
+    if request.if_none_match.contains(cached.etag.strip('"')):
+        response = Response(status=304)
+    else:
+        response = Response(cached.body, mimetype="application/json")
+        response.headers.update(cached.headers)
+    response.headers["ETag"] = cached.etag
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Plan-Cache"] = cache_status
+    return response
+
 @app.route('/api/plan', methods=['POST'])
 def create_plan():
     """
@@ -19,47 +342,58 @@ def create_plan():
         "current_location": "City, State",
         "pickup_location": "City, State",
         "dropoff_location": "City, State",
-        "current_hours": 5  # Hours already used in current cycle
+        "current_hours": 5,  # Hours already used in current cycle
+        "driver_id": "D-17",  # optional, use the driver's stored duty history instead of current_hours
+        "hos_engine": "simulator",  # optional, classic (default) or simulator
+        "departure_time": "2025-04-01T06:00"  # optional, simulator only
+    }
+    a multi-stop trip sends stops instead of pickup_location and dropoff_location
+    {
+        "stops": [
+            {"location": "City, State", "type": "pickup", "duration": 1.5, "load": "A"},  # duration and load optional
+            {"location": "City, State", "type": "dropoff", "load": "A"},
+            ...
+        ],
+        "optimize_stops": true  # optional, reorder for the least driving, a load's pickup stays before its dropoff
     }
     """
     try:
-        # ! DEBUG
-        app.logger.info("Received plan request")
-        data = request.json
-        app.logger.info(f"Request data: {data}")
-
         data = request.json
 
         # validation for the fields
-        required_fields = ['current_location', 'pickup_location', 'dropoff_location', 'current_hours']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
+        error = validate_trip(data)
+        if error:
+            return jsonify({"error": error}), 400
 
-        # route planning
-        route_data = plan_route(
-            current_location=data['current_location'],
-            pickup_location=data['pickup_location'],
-            dropoff_location=data['dropoff_location']
-        )
+        try:
+            options = parse_output_options(request.args, request.headers.get("Accept"))
+            data = with_driver_cycle(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # calculating hos compliance and stops
-        hos_plan = calculate_hos_compliance(
-            route_data=route_data,
-            current_hours=float(data['current_hours'])
-        )
+        # ?stream=ndjson|sse (or the matching Accept header) sends each stage as it's ready
+        fmt = stream_format(request.args, request.headers.get("Accept"))
+        if fmt:
+            return stream_response(stream_plan(data, fmt, options), fmt)
 
-        # generating the eld logs in compliance with hos ruleset
-        eld_logs = generate_eld_logs(hos_plan)
+        # identical trips are answered from the plan cache without rerunning the pipeline
+        key = plan_key(data, options, HOS_ENGINE)
+        cached = plan_cache.get(key)
+        if cached is not None and cached.plan_id in plan_store:
+            return plan_response(cached, "hit")
 
-        # summation of all data
-        response = {
-            "route": route_data,
-            "hos_plan": hos_plan,
-            "eld_logs": eld_logs
-        }
+        # route planning
+        route_data = route_trip(data, options["steps"])
 
-        return jsonify(response)
+        plan = build_plan(route_data, data, options)
+        # kept so a trip in progress can be re-planned from it with /api/plan/<plan_id>/replan
+        plan["plan_id"] = store_plan(plan_store, data, data.get('hos_engine') or HOS_ENGINE, route_data, plan["hos_plan"])
+        with span("serialize"):
+            body = jsonify(plan).get_data()
+        headers = {}
+        if options["grid_format"]:
+            headers["X-Grid-Bytes-Saved"] = str(plan["grid_encoding"]["saved_bytes"])
+        return plan_response(plan_cache.set(key, body, headers, route_data, plan["plan_id"]), "miss")
 
     except Exception as e:
         # ! DEBUG
@@ -69,11 +403,441 @@ def create_plan():
 
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/plan/<plan_id>/replan', methods=['POST'])
+def replan(plan_id):
+    """
+    re-plan a trip in progress from an earlier plan
+    {
+        "current_location": "City, State" or {"latitude": 41.2, "longitude": -95.9},
+        "completed_stops": ["pickup"],    # optional, or a count
+        "current_hours": 31.5,            # optional, hours used in the cycle right now
+        "hours_driven_today": 6,          # optional
+        "hours_on_duty_today": 8,         # optional
+        "current_time": "2025-04-02T13:30"  # optional, simulator clock
+    }
+    only the leg to the next stop is re-routed, the rest are reused, and hos resumes from
+    the state after the last completed stop instead of the start of the trip
+
+    plans are kept for PLAN_STORE_TTL in a sqlite file every worker on the host shares.
+    on a read-only filesystem (vercel) they're only in the memory of the instance that
+    made them, so a replan served by another instance gets the same 404 as an expired plan
+    """
+    try:
+        plan = plan_store.get(plan_id)
+        if plan is None:
+            return jsonify({"error": "Unknown or expired plan_id, plan the trip again with /api/plan"}), 404
+
+        data = request.json or {}
+        if 'current_location' not in data:
+            return jsonify({"error": "Missing required field: current_location"}), 400
+
+        try:
+            options = parse_output_options(request.args, request.headers.get("Accept"))
+            completed = parse_completed_stops(data.get('completed_stops'), plan.stop_types)
+            resume = resume_state(plan, completed, data)
+            current_coords = resolve_position(data['current_location'])
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        route_data, rerouted = replan_route(plan, current_coords, completed, options["steps"])
+
+        trip = {**plan.trip, "current_hours": resume["weekly_hours"], "hos_engine": plan.engine}
+        result = build_plan(route_data, trip, options, resume)
+        result["plan_id"] = store_plan(plan_store, trip, plan.engine, route_data, result["hos_plan"])
+        result["replanned_from"] = plan_id
+        result["replan"] = {
+            "completed_stops": completed,
+            "legs": len(route_data["segments"]),
+            "rerouted_legs": rerouted,
+            "reused_legs": len(route_data["segments"]) - rerouted
+        }
+
+        with span("serialize"):
+            return jsonify(result)
+
+    except Exception as e:
+        app.logger.error(f"Error processing replan request: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/plan/sweep', methods=['POST'])
+def sweep_plan():
+    """
+    the best departure times and starting cycle hours for one trip
+    {
+        same trip fields as /api/plan, except
+        "current_hours": 5 or [0, 20, 40] or {"min": 0, "max": 60, "step": 5},
+        "departure_window": {"start": "2025-04-01T00:00", "end": "2025-04-02T00:00", "step_minutes": 30}
+    }
+    the trip is routed once and the simulator runs for every departure time x cycle
+    hours, the options that come back are the ones nothing else beats on trip days,
+    rests and hours door to door. with a driver_id the stored duty history (as of each
+    departure's date) is the only cycle hours tried
+    """
+    try:
+        data = request.json
+
+        error = validate_trip(data, hours_range=True)
+        if error:
+            return jsonify({"error": error}), 400
+
+        try:
+            departures = parse_departure_window(data.get('departure_window'))
+            data = with_driver_cycle({**data, "departure_time": departures[0].isoformat()})
+            cycle_hours = parse_cycle_hours(data['current_hours'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # a window can span several days, each departure plans from the history as of its own date
+        cycle_histories = None
+        if data.get('cycle_history') is not None:
+            cycle_histories = {
+                day: driver_cycles.state(data['driver_id'], day)["history"]
+                for day in sorted({departure.date() for departure in departures})
+            }
+        if len(departures) * len(cycle_hours) > SWEEP_MAX_CANDIDATES:
+            return jsonify({"error": f"Too many candidates, max {SWEEP_MAX_CANDIDATES} departure times x current_hours"}), 400
+
+        route_data = route_trip(data)
+        with span("sweep"):
+            result = sweep_departures(route_data, departures, cycle_hours, cycle_histories)
+
+        result["route"] = {
+            "total_distance": route_data["total_distance"],
+            "total_driving_duration": route_data["total_driving_duration"],
+            "stops": len(route_data["stops"]),
+            "fuel_stops": len(route_data["fuel_stops"])
+        }
+        with span("serialize"):
+            return jsonify(result)
+
+    except Exception as e:
+        app.logger.error(f"Error processing sweep request: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/logs/render', methods=['POST'])
+def render_log_sheets():
+    """
+    log sheets drawn on the server, for exports and slow clients
+    ?format=pdf (default) | svg, ?day=N for just that day
+    {"eld_logs": [...]} as /api/plan returned them (compact grids are fine), or a trip
+    with the same fields as /api/plan to plan it and render its logs
+    pages stream out as they're drawn, days with the same content are drawn once
+    """
+    try:
+        data = request.json
+        fmt = (request.args.get("format") or "").lower()
+        if not fmt:
+            fmt = "svg" if "image/svg+xml" in (request.headers.get("Accept") or "") else "pdf"
+        if fmt not in RENDER_FORMATS:
+            return jsonify({"error": f"Unknown format: {fmt}, expected one of {', '.join(RENDER_FORMATS)}"}), 400
+
+        if isinstance(data, dict) and "eld_logs" in data:
+            logs = data["eld_logs"]
+        else:
+            error = validate_trip(data)
+            if error:
+                return jsonify({"error": error}), 400
+            try:
+                data = with_driver_cycle(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            route_data = route_trip(data)
+            with span("hos"):
+                hos_plan = calculate_hos(route_data, data)
+            with span("eld"):
+                logs = [log.to_dict() for log in generate_eld_logs(hos_plan)]
+
+        try:
+            sheets = parse_log_sheets(logs)
+            if request.args.get("day") not in (None, ""):
+                try:
+                    day = int(request.args["day"])
+                except ValueError:
+                    raise ValueError(f"Invalid day: {request.args['day']}")
+                sheets = [sheet for sheet in sheets if sheet["day"] == day]
+                if not sheets:
+                    return jsonify({"error": f"No log sheet for day {day}"}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        headers = {**STREAM_HEADERS, "Content-Disposition": f'inline; filename="eld-logs.{fmt}"'}
+        return Response(stream_with_context(render_logs(sheets, fmt)), mimetype=RENDER_CONTENT_TYPES[fmt], headers=headers)
+
+    except Exception as e:
+        app.logger.error(f"Error rendering log sheets: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/plan/batch', methods=['POST'])
+def create_plan_batch():
+    """
+    expected JSON input
+    {
+        "trips": [ { same fields as /api/plan }, ... ]
+    }
+    identical locations and legs are only looked up once for the whole batch,
+    results come back in input order and a bad trip only fails its own entry
+    """
+    try:
+        data = request.json or {}
+        trips = data.get("trips")
+        if not isinstance(trips, list) or not trips:
+            return jsonify({"error": "Expected a non-empty 'trips' array"}), 400
+        if len(trips) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large, max {MAX_BATCH_SIZE} trips"}), 400
+
+        try:
+            options = parse_output_options(request.args, request.headers.get("Accept"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        results = [None] * len(trips)
+        valid = []
+        invalid = {}
+        for index, trip in enumerate(trips):
+            error = validate_trip(trip)
+            if not error and trip.get('optimize_stops'):
+                # batch legs are shared between trips, so stops are routed in the order given
+                error = "optimize_stops isn't supported in batches, plan the trip with /api/plan"
+            if not error:
+                try:
+                    trips[index] = with_driver_cycle(trip)
+                except ValueError as e:
+                    error = str(e)
+            if error:
+                invalid[index] = error
+                results[index] = {"index": index, "error": invalid[index]}
+            else:
+                valid.append(index)
+
+        # streaming sends one line per trip in completion order, each tagged with its index
+        fmt = stream_format(request.args, request.headers.get("Accept"))
+        if fmt:
+            return stream_response(stream_batch(trips, invalid, fmt, options), fmt)
+
+        route_results, stats = plan_routes_batch([trips[index] for index in valid], options["steps"]) if valid else ([], {})
+
+        for index, route_data in zip(valid, route_results):
+            if isinstance(route_data, Exception):
+                results[index] = {"index": index, "error": str(route_data)}
+                continue
+            try:
+                results[index] = {"index": index, **build_plan(route_data, trips[index], options)}
+            except Exception as e:
+                results[index] = {"index": index, "error": str(e)}
+
+        failed = sum(1 for result in results if "error" in result)
+        with span("serialize"):
+            return jsonify({
+                "results": results,
+                "summary": {
+                    "trips": len(trips),
+                    "succeeded": len(trips) - failed,
+                    "failed": failed,
+                    "unique_locations": stats.get("unique_locations", 0),
+                    "unique_legs": stats.get("unique_legs", 0)
+                }
+            })
+
+    except Exception as e:
+        app.logger.error(f"Error processing batch request: {str(e)}")
+        import traceback
+        app.logger.error(traceback.format_exc())
+
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/hos/fleet', methods=['POST'])
+def fleet_hos():
+    """
+    expected JSON input
+    {
+        "drivers": [
+            {
+                "segment_hours": [4.5, 9.0],      # driving hours per leg
+                "stop_hours": [1.0, 1.0],         # on-duty stop after each leg, null for none
+                "current_hours": 20               # hours already used in current cycle
+            },
+            ...
+        ]
+    }
+    """
+    try:
+        # numpy is only loaded by the endpoints that need it, not on a cold start
+        from utils.hos_batch import calculate_fleet_hos_compliance
+
+        drivers = (request.json or {}).get("drivers")
+        if not isinstance(drivers, list) or not drivers:
+            return jsonify({"error": "Expected a non-empty 'drivers' array"}), 400
+        # every entry is checked before any array is built, the first bad one fails the request
+        for index, driver in enumerate(drivers):
+            error = validate_fleet_driver(driver)
+            if error:
+                return jsonify({"error": f"drivers[{index}]: {error}", "index": index}), 400
+
+        width = max(len(driver["segment_hours"]) for driver in drivers)
+        segment_hours = [[float('nan')] * width for _ in drivers]
+        stop_hours = [[float('nan')] * width for _ in drivers]
+        for row, driver in enumerate(drivers):
+            for i, hours in enumerate(driver["segment_hours"]):
+                segment_hours[row][i] = float(hours)
+            for i, hours in enumerate(driver.get("stop_hours") or []):
+                if hours is not None:
+                    stop_hours[row][i] = float(hours)
+
+        result = calculate_fleet_hos_compliance(
+            segment_hours,
+            stop_hours,
+            [float(driver.get("current_hours") or 0) for driver in drivers]
+        )
+
+        return jsonify({
+            "drivers": [
+                {
+                    "index": row,
+                    "total_trip_days": int(result["total_trip_days"][row]),
+                    "weekly_hours": float(result["weekly_hours"][row]),
+                    "rest_stops": result["rests"][row]
+                } for row in range(len(drivers))
+            ]
+        })
+
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid driver data: {str(e)}"}), 400
+    except Exception as e:
+        app.logger.error(f"Error processing fleet hos request: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/drivers/cycles', methods=['POST'])
+def ingest_driver_cycles():
+    """
+    bulk load daily on-duty totals, one record per driver and day
+    {
+        "records": [
+            {"driver_id": "D-17", "date": "2025-04-01", "on_duty_hours": 9.5},
+            {"driver_id": "D-17", "date": "2025-04-02", "on_duty_hours": 0, "off_duty_hours": 36},
+            ...
+        ]
+    }
+    off_duty_hours is optional, the longest off-duty stretch ending that day (34+ is a restart).
+    the whole batch is written in one transaction, or nothing is when a record is bad
+    """
+    try:
+        records = (request.json or {}).get("records")
+        if not isinstance(records, list) or not records:
+            return jsonify({"error": "Expected a non-empty 'records' array"}), 400
+        if not driver_cycles.available:
+            return jsonify({"error": "Driver cycle store is unavailable"}), 503
+
+        try:
+            result = driver_cycles.ingest(records)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify(result)
+
+    except Exception as e:
+        app.logger.error(f"Error ingesting driver cycles: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/drivers/<driver_id>/cycle', methods=['GET'])
+def driver_cycle(driver_id):
+    # rolling 8 day cycle for a driver as of ?date= (today by default), what a plan would start from
+    if not driver_cycles.available:
+        return jsonify({"error": "Driver cycle store is unavailable"}), 503
+    try:
+        state = driver_cycles.state(driver_id, request.args.get("date"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if state is None:
+        return jsonify({"error": f"No duty history for driver {driver_id}"}), 404
+    return jsonify(state)
+
+@app.route('/api/locations/autocomplete', methods=['GET'])
+def autocomplete_locations():
+    """
+    place suggestions for a location field, from the local gazetteer
+    GET /api/locations/autocomplete?q=dal&limit=8
+    each result's "name" ("Dallas, TX") can be sent back as a trip location
+    """
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "Missing query parameter: q"}), 400
+    try:
+        limit = int(request.args.get("limit", 8))
+    except ValueError:
+        return jsonify({"error": f"Invalid limit: {request.args['limit']}"}), 400
+    if not 1 <= limit <= 50:
+        return jsonify({"error": "limit must be between 1 and 50"}), 400
+
+    with span("autocomplete"):
+        results = autocomplete(query, limit)
+    return jsonify({"query": query, "results": results})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     # basically just using this to confirm if the app is live before continuing
     return jsonify({"status": "ok"})
 
+@app.route('/api/upstream', methods=['GET'])
+def upstream_status():
+    # connection pools and circuit breaker state for the upstream apis
+    return jsonify(get_upstream_status())
+
+def _cache_gauges():
+    caches = {
+        "geocode_memory": geocode_cache.stats()["memory"],
+        "route": route_cache.stats()["routes"],
+        "route_fallback": route_cache.stats()["fallbacks"],
+        "plan": plan_cache.stats(),
+        "driver_cycle": driver_cycles.stats()["memory"],
+        "plan_store": plan_store.stats()["memory"],
+        "log_render": render_cache.stats()
+    }
+    upstream = get_upstream_status()
+    return [
+        gauge_lines("eld_cache_hit_ratio", "Hit ratio of each cache since startup",
+                    [({"cache": name}, stats["hit_ratio"]) for name, stats in caches.items()]),
+        gauge_lines("eld_cache_entries", "Entries currently held by each cache",
+                    [({"cache": name}, stats["entries"]) for name, stats in caches.items()]),
+        gauge_lines("eld_plan_cache_invalidations", "Cached plans dropped because one of their legs left the route cache",
+                    [({}, caches["plan"]["invalidations"])]),
+        gauge_lines("eld_upstream_short_circuited", "Mapbox calls skipped by the open circuit breaker",
+                    [({"provider": "mapbox"}, upstream["mapbox"]["breaker"]["short_circuited"])]),
+        gauge_lines("eld_upstream_breaker_open", "1 while the mapbox circuit breaker is open",
+                    [({"provider": "mapbox"}, int(upstream["mapbox"]["breaker"]["state"] == "open"))])
+    ]
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    # prometheus text format: stage and request latency histograms, upstream errors/fallbacks, cache hit ratios
+    return Response(render_metrics(_cache_gauges()), mimetype="text/plain; version=0.0.4")
+
+@app.cli.command("warm-geocode")
+@click.argument("locations_file", type=click.File("r"))
+def warm_geocode(locations_file):
+    """
+    preload the geocode cache from a file with one "City, State" per line
+    usage: flask --app app warm-geocode known_locations.txt
+    """
+    locations = [line.strip() for line in locations_file if line.strip() and not line.startswith("#")]
+    failed = warm_geocode_cache(locations)
+
+    click.echo(f"Warmed {len(locations) - len(failed)} of {len(locations)} locations")
+    for item in failed:
+        click.echo(f"  failed: {item['location']} ({item['error']})")
+    click.echo(f"Cache stats: {geocode_cache.stats()}")
+
+@app.cli.command("build-gazetteer")
+@click.option("--csv", "csv_path", default=GAZETTEER_CSV, show_default=True, help="places snapshot to build from")
+@click.option("--output", default=GAZETTEER_PATH, show_default=True, help="where to write the compact file")
+def build_gazetteer_file(csv_path, output):
+    """
+    build the memory-mapped gazetteer file from the bundled places csv, so the first
+    geocode after a deploy doesn't have to
+    usage: flask --app app build-gazetteer
+    """
+    data = write_gazetteer(csv_path, output)
+    click.echo(f"Wrote {output} ({len(data)} bytes)")
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+end to end /api/plan through flask's test client, upstreams replayed from the fixtures
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import replay
+from benchmarks.replay import load_fixture
+from benchmarks.timing import measure
+
+
+def _client():
+    from app import app
+    return app.test_client()
+
+
+def _post(client, trip, query=""):
+    response = client.post(f"/api/plan{query}", json=trip)
+    if response.status_code != 200:
+        raise RuntimeError(f"/api/plan returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def _throughput(trips, requests_total, workers):
+    # requests per second with workers clients sending warm requests side by side
+    def worker(count):
+        client = _client()
+        for i in range(count):
+            _post(client, trips[i % len(trips)])
+
+    per_worker = max(1, requests_total // workers)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, [per_worker] * workers))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": per_worker * workers,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(per_worker * workers / elapsed, 2)
+    }
+
+
+def run(quick=False, repeat=20, latency=0.0):
+    """
+    - cold: caches cleared before every request, so every lookup goes to the replayed upstreams
+    - pipeline: geocodes and legs come from the caches but the plan is rebuilt every time
+    - warm: identical requests, answered from the whole-plan cache
+    - sweep: /api/plan/sweep over a day of hourly departures x 15 cycle hours, legs cached
+    latency adds a fixed delay to every replayed upstream call
+    """
+    upstream = replay.install(latency)
+    from app import plan_cache
+
+    client = _client()
+    trips = load_fixture("trips.json")
+    repeat = max(3, repeat // 4) if quick else repeat
+    results = []
+
+    for index, trip in enumerate(trips):
+        params = {"trip": index}
+
+        def cold():
+            replay.clear_caches()
+            _post(client, trip)
+
+        def pipeline():
+            plan_cache.clear()
+            _post(client, trip)
+
+        results.append({"name": "api.plan.cold", "params": params, **measure(cold, repeat=repeat)})
+        results.append({"name": "api.plan.pipeline", "params": params, **measure(pipeline, repeat=repeat)})
+        results.append({"name": "api.plan.warm", "params": params, **measure(lambda: _post(client, trip), repeat=repeat)})
+        results.append({
+            "name": "api.plan.warm_compact",
+            "params": params,
+            **measure(lambda: _post(client, trip, "?grid_format=bitset&zoom=6&geometry=polyline"), repeat=repeat)
+        })
+        sweep = {
+            **trip,
+            "current_hours": {"min": 0, "max": 70, "step": 5},
+            "departure_window": {"start": "2025-04-01T00:00", "step_minutes": 60}
+        }
+        results.append({"name": "api.plan.sweep", "params": params, **measure(lambda: _post(client, sweep, "/sweep"), repeat=repeat)})
+
+    requests_total = 40 if quick else 200
+    for workers in (1, 4):
+        results.append({
+            "name": "api.plan.throughput",
+            "params": {"workers": workers},
+            **_throughput(trips, requests_total, workers)
+        })
+
+    results.append({"name": "api.upstream_calls", "params": {}, **upstream.calls})
+    return results
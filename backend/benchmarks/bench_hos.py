@@ -0,0 +1,51 @@
+"""
+microbenchmarks for the hos engines, eld generation and log sheet rendering over synthetic trips
+"""
+from datetime import datetime
+
+from benchmarks.synthetic import synthetic_route
+from benchmarks.timing import measure
+from utils.hours_of_service import calculate_hos_compliance
+from utils.hos_simulator import simulate_hos
+from utils.eld_generator import generate_eld_logs
+from utils.log_render import RenderCache, parse_log_sheets, render_logs
+
+DAYS = (1, 7, 30, 60)
+LEGS = (2, 20, 200)
+QUICK_DAYS = (1, 60)
+QUICK_LEGS = (2, 200)
+
+START_TIME = datetime(2025, 4, 1, 6, 0)
+
+
+def run(quick=False, repeat=20):
+    results = []
+    for days in (QUICK_DAYS if quick else DAYS):
+        for legs in (QUICK_LEGS if quick else LEGS):
+            route_data = synthetic_route(days, legs)
+            params = {"days": days, "legs": legs}
+
+            classic = calculate_hos_compliance(route_data, 20)
+            simulated = simulate_hos(route_data, 20, start_time=START_TIME)
+            sheets = parse_log_sheets([log.to_dict() for log in generate_eld_logs(simulated)])
+            warm = RenderCache()
+
+            cases = [
+                ("hos.classic", lambda: calculate_hos_compliance(route_data, 20), classic),
+                ("hos.simulator", lambda: simulate_hos(route_data, 20, start_time=START_TIME), simulated),
+                ("eld.classic", lambda: generate_eld_logs(classic), classic),
+                ("eld.simulator", lambda: generate_eld_logs(simulated), simulated),
+                # a fresh cache draws every day, the warm one only writes the document around cached days
+                ("render.pdf", lambda: b"".join(render_logs(sheets, "pdf", RenderCache())), simulated),
+                ("render.pdf_cached", lambda: b"".join(render_logs(sheets, "pdf", warm)), simulated),
+                ("render.svg", lambda: b"".join(render_logs(sheets, "svg", RenderCache())), simulated)
+            ]
+            for name, fn, hos_plan in cases:
+                results.append({
+                    "name": name,
+                    "params": params,
+                    "schedule_entries": len(hos_plan["schedule"]),
+                    "trip_days": hos_plan["total_trip_days"],
+                    **measure(fn, repeat=repeat)
+                })
+    return results
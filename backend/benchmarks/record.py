@@ -0,0 +1,59 @@
+"""
+re-record the fixtures from the real apis, needs network and MAPBOX_ACCESS_TOKEN
+usage (from backend/): python -m benchmarks.record
+"""
+import json
+import os
+import sys
+
+from benchmarks.replay import FIXTURES_DIR, load_fixture, lane_key
+
+
+def main():
+    if not os.environ.get("MAPBOX_ACCESS_TOKEN"):
+        sys.exit("MAPBOX_ACCESS_TOKEN is required to record mapbox routes")
+
+    from utils.geocode_cache import normalize_location_key
+    from utils.route_planner import get_geolocator, nominatim_limiter, mapbox_get, MAPBOX_ACCESS_TOKEN
+
+    trips = load_fixture("trips.json")
+    fields = ("current_location", "pickup_location", "dropoff_location")
+
+    places = {}
+    for trip in trips:
+        for field in fields:
+            key = normalize_location_key(trip[field])
+            if key in places:
+                continue
+            with nominatim_limiter.limit():
+                location = get_geolocator().geocode(trip[field])
+            if location is None:
+                sys.exit(f"Nominatim has no result for {trip[field]}")
+            places[key] = {"address": location.address, "latitude": location.latitude, "longitude": location.longitude}
+            print(f"geocoded {trip[field]}")
+
+    routes = {}
+    for trip in trips:
+        points = [places[normalize_location_key(trip[field])] for field in fields]
+        for origin, destination in ((points[0], points[1]), (points[1], points[2])):
+            key = lane_key(origin["longitude"], origin["latitude"], destination["longitude"], destination["latitude"])
+            if key in routes:
+                continue
+            routes[key] = mapbox_get(
+                f"https://api.mapbox.com/directions/v5/mapbox/driving/{origin['longitude']},{origin['latitude']};{destination['longitude']},{destination['latitude']}",
+                {"access_token": MAPBOX_ACCESS_TOKEN, "geometries": "geojson", "overview": "full", "steps": "false"}
+            )
+            # the request uuid changes on every call, keep it out so re-recording diffs cleanly
+            routes[key].pop("uuid", None)
+            print(f"routed {key}")
+
+    with open(os.path.join(FIXTURES_DIR, "nominatim.json"), "w") as f:
+        json.dump(places, f, indent=1)
+    # geometries make this one big, keep it compact
+    with open(os.path.join(FIXTURES_DIR, "mapbox.json"), "w") as f:
+        json.dump(routes, f, separators=(",", ":"))
+    print(f"wrote {len(places)} places and {len(routes)} routes to {FIXTURES_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+run the benchmark suite and write the results as json
+
+usage (from backend/):
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --quick --baseline bench.json   # exits 1 on a regression
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+# only the latency figures are compared, throughput runs are too noisy on shared ci boxes
+COMPARED_FIELD = "median_ms"
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _result_key(result):
+    return result["name"] + json.dumps(result.get("params", {}), sort_keys=True)
+
+
+def compare(results, baseline, threshold):
+    # results whose median got slower than the baseline by more than threshold (0.25 = 25%)
+    previous = {_result_key(result): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(_result_key(result))
+        if not before or COMPARED_FIELD not in result or not before.get(COMPARED_FIELD):
+            continue
+        change = result[COMPARED_FIELD] / before[COMPARED_FIELD] - 1
+        if change > threshold:
+            regressions.append({
+                "name": result["name"],
+                "params": result.get("params", {}),
+                "baseline_ms": before[COMPARED_FIELD],
+                "current_ms": result[COMPARED_FIELD],
+                "change": round(change, 4)
+            })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ELD trip planner benchmarks")
+    parser.add_argument("--suite", choices=("all", "api", "hos"), default="all")
+    parser.add_argument("--quick", action="store_true", help="smaller grid and fewer runs, for ci")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per case")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every replayed upstream call")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before it counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    if args.suite in ("all", "api"):
+        # the api suite installs the replayed upstreams, it has to go before anything imports the app
+        from benchmarks import bench_api
+        results.extend(bench_api.run(quick=args.quick, repeat=args.repeat, latency=args.latency))
+    if args.suite in ("all", "hos"):
+        from benchmarks import bench_hos
+        results.extend(bench_hos.run(quick=args.quick, repeat=args.repeat))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "suite": args.suite,
+            "quick": args.quick,
+            "repeat": args.repeat,
+            "latency": args.latency
+        },
+        "results": results
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(results, json.load(f), args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for regression in report.get("regressions", []):
+        print(
+            f"REGRESSION {regression['name']} {regression['params']}: "
+            f"{regression['baseline_ms']}ms -> {regression['current_ms']}ms (+{regression['change']:.0%})",
+            file=sys.stderr
+        )
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
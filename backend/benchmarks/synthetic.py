@@ -0,0 +1,73 @@
+"""
+synthetic route_data for the hos/eld microbenchmarks, same shape build_legs_route_data returns
+"""
+import math
+import random
+
+from models import RouteSegment
+
+AVERAGE_SPEED = 55  # mph
+# roughly what one day of the classic engine covers once rests are in
+DRIVING_HOURS_PER_DAY = 11
+
+
+def _point(i, rng):
+    return {
+        "address": f"Stop {i}",
+        "latitude": 35 + rng.uniform(-5, 5),
+        "longitude": -95 + rng.uniform(-15, 15)
+    }
+
+
+def synthetic_route(days, legs, seed=0, points_per_leg=50):
+    """
+    a trip of legs segments with about days days worth of driving, a one hour pickup or
+    dropoff after every leg and fuel stops every 1000 miles. the stops and rests come on
+    top of the driving, so trip_days in the results is usually more than days
+    """
+    rng = random.Random(f"{days}:{legs}:{seed}")
+    total_hours = days * DRIVING_HOURS_PER_DAY
+    # uneven legs so rests don't always land on the same boundaries
+    weights = [rng.uniform(0.5, 1.5) for _ in range(legs)]
+    scale = total_hours / sum(weights)
+
+    places = [_point(i, rng) for i in range(legs + 1)]
+    segments = []
+    stops = []
+    for i in range(legs):
+        hours = weights[i] * scale
+        origin, destination = places[i], places[i + 1]
+        coordinates = [
+            [
+                origin["longitude"] + (destination["longitude"] - origin["longitude"]) * k / points_per_leg,
+                origin["latitude"] + (destination["latitude"] - origin["latitude"]) * k / points_per_leg
+            ]
+            for k in range(points_per_leg + 1)
+        ]
+        segments.append(RouteSegment(
+            origin=origin,
+            destination=destination,
+            distance=hours * AVERAGE_SPEED,
+            duration=hours,
+            geometry={"type": "LineString", "coordinates": coordinates}
+        ))
+        stops.append({"type": "pickup" if i % 2 == 0 else "dropoff", "location": destination, "duration": 1.0})
+
+    total_distance = sum(segment.distance for segment in segments)
+    fuel_stops = [
+        {
+            "distance_from_start": miles,
+            "estimated_location": f"Mile {miles}",
+            "duration": 0.5
+        }
+        for miles in range(1000, int(math.floor(total_distance)), 1000)
+    ]
+
+    return {
+        "segments": segments,
+        "stops": stops,
+        "fuel_stops": fuel_stops,
+        "total_distance": total_distance,
+        "total_driving_duration": total_hours,
+        "total_duration": total_hours + legs
+    }
@@ -0,0 +1,28 @@
+import statistics
+import time
+
+
+def measure(fn, repeat=20, warmup=1):
+    # run fn repeat times after warmup runs, returns latency stats in milliseconds
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return summarize(samples)
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0], 4),
+        "median_ms": round(statistics.median(ordered), 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max_ms": round(ordered[-1], 4),
+        "mean_ms": round(statistics.fmean(ordered), 4)
+    }
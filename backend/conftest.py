@@ -0,0 +1 @@
+# the app imports its modules as utils.* / models.*, so tests run with backend/ on the path like app.py does
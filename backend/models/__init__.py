@@ -0,0 +1,5 @@
+from models.base import Record, to_json
+from models.duty_status import DutyStatus
+from models.schedule import ScheduleEntry, RestStop
+from models.route_segment import RouteSegment
+from models.log_sheet import LogSheet
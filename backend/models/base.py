@@ -0,0 +1,83 @@
+class Record:
+    """
+    base for the slotted plan models
+
+    subclasses list their json keys in FIELDS as (json key, attribute) pairs, and the ones
+    left out of the json when unset in OPTIONAL. objects behave like read-only mappings
+    (record["day"], "timestamp" in record, dict(record)) so code written against the old
+    dicts keeps working, and only turn into real dicts when to_dict() is called at
+    serialization time
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+    OPTIONAL = frozenset()
+    _ATTRIBUTES = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._ATTRIBUTES = dict(cls.FIELDS)
+
+    def __init__(self, **values):
+        # accepts either the json key or the attribute name ("from" or "origin")
+        for key, attribute in self.FIELDS:
+            value = values.pop(key) if key in values else values.pop(attribute, None)
+            setattr(self, attribute, value)
+        if values:
+            raise TypeError(f"Unknown {type(self).__name__} fields: {', '.join(values)}")
+
+    def _attribute(self, key):
+        try:
+            return self._ATTRIBUTES[key]
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __getitem__(self, key):
+        value = getattr(self, self._attribute(key))
+        if value is None and key in self.OPTIONAL:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def keys(self):
+        return [key for key, attribute in self.FIELDS
+                if not (key in self.OPTIONAL and getattr(self, attribute) is None)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def to_dict(self):
+        return {key: getattr(self, attribute) for key, attribute in self.FIELDS
+                if not (key in self.OPTIONAL and getattr(self, attribute) is None)}
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def to_json(value):
+    # json.dumps default= hook for the models
+    if isinstance(value, Record):
+        return value.to_dict()
+    if hasattr(value, "value") and isinstance(getattr(value, "value"), str):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,49 @@
+from enum import Enum
+
+
+class DutyStatus(Enum):
+    """
+    the four eld duty statuses, row is the line on the log sheet grid
+    0 = off duty, 1 = sleeper berth, 2 = driving, 3 = on duty (not driving)
+    """
+
+    OFF_DUTY = "off_duty"
+    SLEEPER_BERTH = "sleeper_berth"
+    DRIVING = "driving"
+    ON_DUTY_NOT_DRIVING = "on_duty_not_driving"
+
+    @property
+    def row(self):
+        return _ROWS[self]
+
+    @classmethod
+    def from_label(cls, label):
+        # schedule status label ("Rest Start", "Pickup", ...) to a duty status, None if it doesn't change it
+        label = label.lower()
+        if label in _LABELS:
+            return _LABELS[label]
+        if "rest" in label and "berth" in label:
+            return cls.SLEEPER_BERTH
+        return None
+
+
+_ROWS = {
+    DutyStatus.OFF_DUTY: 0,
+    DutyStatus.SLEEPER_BERTH: 1,
+    DutyStatus.DRIVING: 2,
+    DutyStatus.ON_DUTY_NOT_DRIVING: 3
+}
+
+_LABELS = {
+    "start": DutyStatus.OFF_DUTY,
+    "end": DutyStatus.OFF_DUTY,
+    "rest start": DutyStatus.OFF_DUTY,
+    "rest end": DutyStatus.OFF_DUTY,
+    "break": DutyStatus.OFF_DUTY,
+    "sleeper berth rest": DutyStatus.SLEEPER_BERTH,
+    "rest (sleeper berth)": DutyStatus.SLEEPER_BERTH,
+    "driving": DutyStatus.DRIVING,
+    "pickup": DutyStatus.ON_DUTY_NOT_DRIVING,
+    "dropoff": DutyStatus.ON_DUTY_NOT_DRIVING,
+    "fuel": DutyStatus.ON_DUTY_NOT_DRIVING
+}
@@ -1 +1,20 @@
-#TODO log sheet schema
\ No newline at end of file
+from models.base import Record
+
+
+class LogSheet(Record):
+    """
+    one day of eld logs
+    - grid: 4 rows (duty statuses) x 96 fifteen minute slots
+    - hours: hours spent in each duty status
+    - locations: the status changes that happened that day
+    """
+
+    __slots__ = ("day", "date", "grid", "hours", "locations", "total_hours")
+    FIELDS = (
+        ("day", "day"),
+        ("date", "date"),
+        ("grid", "grid"),
+        ("hours", "hours"),
+        ("locations", "locations"),
+        ("total_hours", "total_hours")
+    )
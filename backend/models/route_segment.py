@@ -0,0 +1,23 @@
+from models.base import Record
+
+
+class RouteSegment(Record):
+    """
+    one driven leg of a planned route, "from"/"to" are the geocoded endpoints
+    source (mapbox / estimate / offline) isn't part of the json, the plan cache reads it
+    to tell a leg that was never cached from one that has left the route cache
+    """
+    __slots__ = ("origin", "destination", "distance", "duration", "geometry", "steps", "source")
+    FIELDS = (
+        ("from", "origin"),
+        ("to", "destination"),
+        ("distance", "distance"),
+        ("duration", "duration"),
+        ("geometry", "geometry"),
+        ("steps", "steps")
+    )
+    OPTIONAL = frozenset(["steps"])
+
+    def __init__(self, source=None, **values):
+        super().__init__(**values)
+        self.source = source
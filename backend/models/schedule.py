@@ -0,0 +1,46 @@
+from models.base import Record
+from models.duty_status import DutyStatus
+
+
+class ScheduleEntry(Record):
+    """
+    one line of the hos schedule, marks a change of status at a point in the trip
+    duty_status is worked out once from the label here so the log generator never has
+    to match strings again
+    """
+
+    __slots__ = ("day", "time", "timestamp", "status", "location", "latitude", "longitude",
+                 "hours_driven", "hours_on_duty", "weekly_hours", "note", "duty_status")
+    FIELDS = (
+        ("day", "day"),
+        ("time", "time"),
+        ("timestamp", "timestamp"),
+        ("status", "status"),
+        ("location", "location"),
+        ("latitude", "latitude"),
+        ("longitude", "longitude"),
+        ("hours_driven", "hours_driven"),
+        ("hours_on_duty", "hours_on_duty"),
+        ("weekly_hours", "weekly_hours"),
+        ("note", "note")
+    )
+    OPTIONAL = frozenset(["timestamp", "latitude", "longitude", "note"])
+
+    def __init__(self, **values):
+        super().__init__(**values)
+        self.duty_status = DutyStatus.from_label(self.status)
+
+
+class RestStop(Record):
+    # rest periods, breaks and fuel stops taken along the way
+    __slots__ = ("day", "location", "latitude", "longitude", "duration", "reason", "start")
+    FIELDS = (
+        ("day", "day"),
+        ("location", "location"),
+        ("latitude", "latitude"),
+        ("longitude", "longitude"),
+        ("duration", "duration"),
+        ("reason", "reason"),
+        ("start", "start")
+    )
+    OPTIONAL = frozenset(["start"])
@@ -0,0 +1,75 @@
+from datetime import date, timedelta
+
+from utils.cycle_window import CycleWindow
+from utils.driver_cycles import DriverCycleStore
+
+
+def test_ring_buffer_rolls_past_eight_days():
+    window = CycleWindow(8, [1, 2, 3, 4, 5, 6, 7, 8])
+    assert window.total == 36
+
+    window.advance(3)
+    assert window.history() == [0, 0, 0, 1, 2, 3, 4, 5]
+    assert window.total == 15
+
+    window.add(6)
+    window.advance()
+    assert window.history() == [0, 6, 0, 0, 1, 2, 3, 4]
+    assert window.total == 16
+
+    # a week and a half without records leaves nothing
+    window.advance(9)
+    assert window.history() == [0] * 8
+    assert window.total == 0
+
+
+def test_set_and_restart_drop():
+    window = CycleWindow(8, [5, 4, 3, 2, 1])
+    window.set(9, 8)  # outside the window, ignored
+    window.set(6, 1)
+    assert window.history() == [5, 6, 3, 2, 1, 0, 0, 0]
+
+    window.drop_before(2)
+    assert window.history() == [5, 6, 3, 0, 0, 0, 0, 0]
+    assert window.total == 14
+    assert window.remaining(70) == 56
+
+
+def _week(driver_id, first, hours):
+    return [{"driver_id": driver_id, "date": (first + timedelta(days=k)).isoformat(), "on_duty_hours": value}
+            for k, value in enumerate(hours)]
+
+
+def test_warm_window_moving_forward_reads_the_days_it_skips(tmp_path):
+    store = DriverCycleStore(path=str(tmp_path / "cycles.sqlite3"))
+    store.ingest(_week("D-1", date(2025, 4, 1), [10, 10, 10, 8]))
+    # cached as of the 2nd, the 3rd and 4th are already on disk and have to be read on the way to the 5th
+    assert store.state("D-1", "2025-04-02")["cycle_hours"] == 20
+
+    state = store.state("D-1", "2025-04-05")
+    assert state["history"] == [0, 8, 10, 10, 10, 0, 0, 0]
+    assert state["available_hours"] == 32
+
+    # an earlier day is read from disk and leaves the cached window alone
+    assert store.state("D-1", "2025-04-02")["history"] == [10, 10, 0, 0, 0, 0, 0, 0]
+    assert store.state("D-1", "2025-04-05")["cycle_hours"] == 38
+
+
+def test_corrected_restart_brings_the_older_days_back(tmp_path):
+    store = DriverCycleStore(path=str(tmp_path / "cycles.sqlite3"))
+    store.ingest(_week("D-2", date(2025, 4, 1), [10] * 7))
+    assert store.state("D-2", "2025-04-08")["cycle_hours"] == 70
+
+    store.ingest([{"driver_id": "D-2", "date": "2025-04-05", "on_duty_hours": 0, "off_duty_hours": 36}])
+    state = store.state("D-2", "2025-04-08")
+    assert (state["cycle_hours"], state["restart_day"]) == (20, "2025-04-05")
+
+    # the restart was reported by mistake, the same day again without it takes it back
+    store.ingest([{"driver_id": "D-2", "date": "2025-04-05", "on_duty_hours": 0, "off_duty_hours": 8}])
+    state = store.state("D-2", "2025-04-08")
+    assert (state["cycle_hours"], state["restart_day"]) == (60, None)
+
+
+def test_unknown_driver(tmp_path):
+    store = DriverCycleStore(path=str(tmp_path / "cycles.sqlite3"))
+    assert store.state("nobody", "2025-04-01") is None
@@ -0,0 +1,71 @@
+from datetime import date, datetime
+
+from utils.departure_sweep import sweep_departures, parse_departure_window
+
+
+def _route(*hours, stop_hours=1.0):
+    # straight legs at 50 mph with a pickup between them and a dropoff at the end, no fuel stops
+    segments = [{"distance": 50.0 * leg, "duration": float(leg)} for leg in hours]
+    stops = [{"type": "pickup" if i < len(hours) - 1 else "dropoff", "duration": stop_hours} for i in range(len(hours))]
+    return {"segments": segments, "stops": stops, "fuel_stops": []}
+
+
+def test_earliest_departure_that_finishes_the_same_day():
+    # 9 hours of driving: a 30 minute break after 8, plus the hour at the dropoff, 10.5 hours door to door.
+    # leaving at 13:00 still arrives 23:30, from 14:00 on the trip runs past midnight into a second day
+    departures = parse_departure_window({"start": "2025-04-01T00:00", "end": "2025-04-01T23:00"})
+    result = sweep_departures(_route(9), departures, [0])
+
+    assert result["options"] == [{
+        "departure_time": "2025-04-01T00:00:00",
+        "current_hours": 0,
+        "trip_days": 1,
+        "rests": 0,
+        "restarts": 0,
+        "total_hours": 10.5,
+        "arrival_time": "2025-04-01T10:30:00",
+        "equivalent": 13
+    }]
+    assert result["outcomes"] == 2
+
+
+def test_eleven_hour_rest_on_a_long_leg():
+    # 12 hours of driving: break at 8, the 11 hour limit at 11.5 on the clock, a 10 hour rest, then the last hour
+    result = sweep_departures(_route(12), [datetime(2025, 4, 1, 6)], [0])
+
+    [option] = result["options"]
+    assert (option["trip_days"], option["rests"], option["total_hours"]) == (2, 1, 23.5)
+    assert option["arrival_time"] == "2025-04-02T05:30:00"
+
+
+def test_cycle_hours_that_cant_reach_the_limit_share_one_run():
+    result = sweep_departures(_route(3, 2), [datetime(2025, 4, 1, 8)], [0, 20, 40])
+
+    assert (result["candidates"], result["simulated"], result["memoized"]) == (3, 1, 2)
+    [option] = result["options"]
+    assert option["current_hours"] == 0
+    assert option["equivalent"] == 2
+    assert option["total_hours"] == 7.0
+
+
+def test_each_departure_plans_from_its_own_days_history():
+    # 10 hours a day for the 7 days before april 1st. leaving on the 1st the cycle is full and
+    # the trip starts with a 34 hour restart, by the 2nd the oldest day has rolled off
+    histories = {
+        date(2025, 4, 1): [0, 10, 10, 10, 10, 10, 10, 10],
+        date(2025, 4, 2): [0, 0, 10, 10, 10, 10, 10, 10]
+    }
+    departures = [datetime(2025, 4, 1, 8), datetime(2025, 4, 2, 8)]
+    result = sweep_departures(_route(3), departures, [], histories)
+
+    assert result["outcomes"] == 2
+    assert result["options"] == [{
+        "departure_time": "2025-04-02T08:00:00",
+        "current_hours": 60,
+        "trip_days": 1,
+        "rests": 0,
+        "restarts": 0,
+        "total_hours": 4.0,
+        "arrival_time": "2025-04-02T12:00:00",
+        "equivalent": 0
+    }]
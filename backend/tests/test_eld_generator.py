@@ -0,0 +1,60 @@
+from utils.eld_generator import generate_eld_logs
+
+
+def _entry(day, status, time, date=None):
+    entry = {"day": day, "status": status, "time": time, "location": f"{status} spot"}
+    if date:
+        entry["timestamp"] = f"{date}T{time}:00"
+    return entry
+
+
+def _rows(*spans):
+    # (row, first slot, end slot) spans to a 4 x 96 grid
+    grid = [[0] * 96 for _ in range(4)]
+    for row, start, end in spans:
+        grid[row][start:end] = [1] * (end - start)
+    return grid
+
+
+def test_classic_schedule_is_spaced_evenly_over_the_day():
+    # no timestamps, five entries land on slots 0, 23, 47, 71 and 95
+    schedule = [_entry(1, status, "00:00") for status in ("Start", "Driving", "Pickup", "Driving", "End")]
+    [log] = generate_eld_logs({"schedule": schedule, "total_trip_days": 1})
+
+    assert log.grid == _rows((0, 0, 23), (2, 23, 47), (3, 47, 71), (2, 71, 95))
+    assert log.hours == {"off_duty": 5.75, "sleeper_berth": 0, "driving": 12.0, "on_duty_not_driving": 6.0}
+    assert log.total_hours == 23.75
+
+
+def _overnight_rest(first_day):
+    # 4 hours of driving from 18:00, a 10 hour rest over midnight, then 2.5 hours and the dropoff on day 2
+    day_one, day_two = first_day, first_day + 1
+    return [
+        _entry(day_one, "Start", "18:00", "2025-04-01"),
+        _entry(day_one, "Driving", "18:00", "2025-04-01"),
+        _entry(day_one, "Rest Start", "22:00", "2025-04-01"),
+        _entry(day_two, "Rest End", "08:00", "2025-04-02"),
+        _entry(day_two, "Driving", "08:00", "2025-04-02"),
+        _entry(day_two, "Dropoff", "10:30", "2025-04-02"),
+        _entry(day_two, "End", "11:30", "2025-04-02"),
+    ]
+
+
+def test_timed_rest_over_midnight_splits_across_two_sheets():
+    first, second = generate_eld_logs({"schedule": _overnight_rest(1), "total_trip_days": 2})
+
+    assert (first.day, first.date) == (1, "2025-04-01")
+    assert first.grid == _rows((0, 0, 72), (2, 72, 88), (0, 88, 96))
+    assert first.hours == {"off_duty": 20.0, "sleeper_berth": 0, "driving": 4.0, "on_duty_not_driving": 0}
+    assert [location["status"] for location in first.locations] == ["Start", "Driving", "Rest Start"]
+
+    assert (second.day, second.date) == (2, "2025-04-02")
+    assert second.grid == _rows((0, 0, 32), (2, 32, 42), (3, 42, 46), (0, 46, 96))
+    assert second.hours == {"off_duty": 20.5, "sleeper_berth": 0, "driving": 2.5, "on_duty_not_driving": 1.0}
+    assert [location["status"] for location in second.locations] == ["Rest End", "Driving", "Dropoff", "End"]
+    assert first.total_hours == second.total_hours == 24.0
+
+
+def test_replanned_trip_keeps_its_day_numbers():
+    logs = generate_eld_logs({"schedule": _overnight_rest(4), "total_trip_days": 5})
+    assert [(log.day, log.date) for log in logs] == [(4, "2025-04-01"), (5, "2025-04-02")]
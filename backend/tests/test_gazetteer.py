@@ -0,0 +1,56 @@
+import pytest
+
+from utils.gazetteer import Gazetteer, build_gazetteer, read_places_csv, GAZETTEER_CSV
+
+
+def _row(name, code, region, latitude, longitude, population):
+    return {"name": name, "region_code": code, "region": region, "country_code": "US",
+            "latitude": str(latitude), "longitude": str(longitude), "population": str(population)}
+
+
+@pytest.fixture(scope="module")
+def bundled():
+    return Gazetteer(build_gazetteer(read_places_csv(GAZETTEER_CSV)))
+
+
+@pytest.fixture(scope="module")
+def small():
+    return Gazetteer(build_gazetteer([
+        _row("Jackson", "MS", "Mississippi", 32.2988, -90.1848, 153701),
+        _row("Jackson", "MI", "Michigan", 42.2459, -84.4013, 31309),
+        _row("Dallas", "TX", "Texas", 32.7767, -96.7970, 1304379),
+        _row("Chicago", "IL", "Illinois", 41.8781, -87.6298, 2746388)
+    ]))
+
+
+@pytest.mark.parametrize("query", [
+    "Jackson, MI", "Arlington, VA", "Albany, GA", "Dallas, GA", "Austin, MN", "Denver, NC", "Boston, GA"
+])
+def test_same_city_in_another_state_falls_through(bundled, query):
+    # only the other state's city is in the bundled file, nominatim gets these
+    assert bundled.geocode(query) is None
+
+
+def test_region_picks_between_same_named_cities(small):
+    assert small.geocode("Jackson, MI")["address"] == "Jackson, Michigan, United States"
+    assert small.geocode("Jackson, Mississippi")["address"] == "Jackson, Mississippi, United States"
+    # a typo in the city is still fine, the region still has to match
+    assert small.geocode("Jakson, MI")["address"] == "Jackson, Michigan, United States"
+    assert small.geocode("Jakson, MS")["address"] == "Jackson, Mississippi, United States"
+
+
+def test_typo_in_city_resolves_within_region(small):
+    assert small.geocode("Dalas, TX")["address"] == "Dallas, Texas, United States"
+    assert small.geocode("Chicgo, Illinois")["address"] == "Chicago, Illinois, United States"
+    assert small.geocode("Dalas, IL") is None
+
+
+def test_region_is_never_fuzzed(small):
+    # one letter off the state code is a different state, not a typo
+    assert small.geocode("Dallas, TN") is None
+    assert small.geocode("Chicago, IN") is None
+
+
+def test_autocomplete_completes_the_region(small):
+    assert [place["name"] for place in small.autocomplete("Dalas, Tex")] == ["Dallas, TX"]
+    assert [place["name"] for place in small.autocomplete("Jackson, Mic")] == ["Jackson, MI"]
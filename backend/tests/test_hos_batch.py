@@ -0,0 +1,85 @@
+import math
+
+from utils.hos_batch import calculate_fleet_hos_compliance
+from utils.hours_of_service import calculate_hos_compliance
+
+NAN = math.nan
+
+# one row per driver: (driving hours per leg, on-duty hours of the stop after each leg, current cycle hours),
+# nan pads the shorter trips and marks a leg without a stop after it
+FLEET = {
+    # 6 + 1 hour pickup, then 6 more is past the 11 hour driving limit: rest, and the last leg is on day 2
+    "driving_limit": ([6, 6], [1, 1], 0),
+    # 5 + 3 + 5 leaves 13 hours on duty, the 2 hour dropoff waits for a rest
+    "window_before_stop": ([5, 5], [3, 2], 0),
+    # current hours count as on duty today, so the first leg rests for the 14 hour window and
+    # the second then runs into the 70 hour cycle
+    "cycle_limit": ([4, 7], [NAN, NAN], 60),
+    # a short trip padded out to the others' width, nothing to rest for
+    "short_trip": ([3, NAN], [1, NAN], 10),
+}
+
+
+def _fleet():
+    rows = list(FLEET.values())
+    return calculate_fleet_hos_compliance(
+        [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+    )
+
+
+def _summary(result, name):
+    driver = list(FLEET).index(name)
+    rests = [(rest["segment"], rest["position"], rest["day"], rest["reason"]) for rest in result["rests"][driver]]
+    totals = tuple(float(result[key][driver]) for key in ("weekly_hours", "hours_on_duty", "hours_driven"))
+    return int(result["total_trip_days"][driver]), rests, totals
+
+
+def test_driving_limit_rest_before_the_second_leg():
+    days, rests, totals = _summary(_fleet(), "driving_limit")
+    assert days == 2
+    assert rests == [(1, "before_segment", 1, "Exceeded 11-hour driving limit")]
+    assert totals == (14.0, 7.0, 6.0)
+
+
+def test_on_duty_window_rest_before_a_stop():
+    days, rests, totals = _summary(_fleet(), "window_before_stop")
+    assert days == 2
+    assert rests == [(1, "before_stop", 1, "Exceeded 14-hour on-duty limit")]
+    assert totals == (15.0, 2.0, 0.0)
+
+
+def test_cycle_limit_after_a_window_rest():
+    days, rests, totals = _summary(_fleet(), "cycle_limit")
+    assert days == 3
+    assert rests == [
+        (0, "before_segment", 1, "Exceeded 14-hour on-duty limit"),
+        (1, "before_segment", 2, "Exceeded 70-hour/8-day limit"),
+    ]
+    # a 10 hour rest doesn't give cycle hours back, only days rolling off would
+    assert totals == (71.0, 7.0, 7.0)
+
+
+def test_padded_trip_has_no_rests():
+    result = _fleet()
+    assert _summary(result, "short_trip") == (1, [], (14.0, 14.0, 3.0))
+    assert list(result["rest_counts"]) == [1, 1, 2, 0]
+
+
+def test_fleet_matches_the_scalar_engine():
+    result = _fleet()
+    place = {"address": "somewhere", "latitude": 35.0, "longitude": -95.0}
+
+    for name, (segment_hours, stop_hours, current_hours) in FLEET.items():
+        legs = [(hours, stop) for hours, stop in zip(segment_hours, stop_hours) if not math.isnan(hours)]
+        scalar = calculate_hos_compliance({
+            "segments": [{"from": place, "to": place, "duration": hours} for hours, _ in legs],
+            "stops": [{"type": "rest" if math.isnan(stop) else "pickup", "duration": 0 if math.isnan(stop) else stop}
+                      for _, stop in legs],
+            "fuel_stops": []
+        }, current_hours)
+        last = scalar["schedule"][-1]
+
+        days, rests, totals = _summary(result, name)
+        assert days == scalar["total_trip_days"]
+        assert totals == (last["weekly_hours"], last["hours_on_duty"], last["hours_driven"])
+        assert [day for _, _, day, _ in rests] == [rest["day"] for rest in scalar["rest_stops"]]
@@ -0,0 +1,50 @@
+from utils.stop_order import order_stops, stop_precedence, path_hours
+
+
+def _matrix(points):
+    return [[float(abs(a[0] - b[0]) + abs(a[1] - b[1])) for b in points] for a in points]
+
+
+TWO_LOADS = [
+    {"type": "pickup", "load": "A"}, {"type": "dropoff", "load": "A"},
+    {"type": "pickup", "load": "B"}, {"type": "dropoff", "load": "B"}
+]
+
+
+def test_given_order_kept_when_nothing_beats_it():
+    # nearest neighbour heads for B first and 2-opt can't undo it without breaking a load
+    matrix = _matrix([(8, 5), (2, 5), (2, 4), (6, 4), (9, 0)])
+    order, hours = order_stops(matrix, stop_precedence(TWO_LOADS))
+    assert order == [0, 1, 2, 3]
+    assert hours == path_hours([0, 1, 2, 3], matrix) == 18.0
+
+
+def test_moves_a_stop_past_a_blocked_reversal():
+    matrix = _matrix([(8, 5), (9, 0), (3, 0), (6, 5), (1, 6)])
+    order, hours = order_stops(matrix, stop_precedence(TWO_LOADS))
+    assert order == [2, 0, 1, 3]
+    assert hours == 24.0 < path_hours([0, 1, 2, 3], matrix)
+
+
+def test_unrelated_pickups_are_sorted_along_the_road():
+    # given 3, 1, 2 miles out, driven 1, 2, 3
+    matrix = _matrix([(0, 0), (3, 0), (1, 0), (2, 0)])
+    order, hours = order_stops(matrix, stop_precedence([{"type": "pickup", "load": None}] * 3))
+    assert order == [1, 2, 0]
+    assert hours == 3.0 < path_hours([0, 1, 2], matrix) == 6.0
+
+
+def test_dropoff_never_moves_ahead_of_its_pickup():
+    # the dropoff is on the way to the pickup, stopping there first would be 11 hours instead of 19
+    matrix = _matrix([(0, 0), (10, 0), (1, 0)])
+    order, hours = order_stops(matrix, stop_precedence(TWO_LOADS[:2]))
+    assert order == [0, 1]
+    assert hours == 19.0
+
+
+def test_dropoff_without_a_load_waits_for_the_pickups_ahead_of_it():
+    stops = [
+        {"type": "pickup", "load": "A"}, {"type": "dropoff", "load": None},
+        {"type": "pickup", "load": "B"}, {"type": "dropoff", "load": "B"}
+    ]
+    assert stop_precedence(stops) == [set(), {0}, set(), {2}]
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    small in-process lru cache with optional ttl expiry
+
+    - max_entries caps the number of keys, least recently used goes first
+    - ttl is in seconds, None means entries never expire
+    - max_bytes optionally bounds the total size, measured with size_fn(value)
+    - hits / misses / evictions / expirations are counted for monitoring
+    - listeners added with add_listener are called as fn(key, value, reason) whenever an
+      entry goes away ("expired", "evicted", "deleted", "cleared"), outside the lock
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, max_bytes=None, size_fn=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._listeners = []
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def _notify(self, removed):
+        for key, value, reason in removed:
+            for listener in self._listeners:
+                listener(key, value, reason)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            expires_at, value, size = item
+            if expires_at is None or expires_at > time.time():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+
+            del self._data[key]
+            self._bytes -= size
+            self.expirations += 1
+            self.misses += 1
+
+        self._notify([(key, value, "expired")])
+        return default
+
+    def ttl_remaining(self, key):
+        # seconds until key expires, inf if it never does, None if it isn't cached
+        with self._lock:
+            item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] is None:
+            return float("inf")
+        remaining = item[0] - time.time()
+        return remaining if remaining > 0 else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        size = self.size_fn(value) if self.size_fn else 0
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            # would evict everything else and still not fit
+            return
+
+        removed = []
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[2]
+            self._data[key] = (expires_at, value, size)
+            self._bytes += size
+
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                evicted_key, (_, evicted_value, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                removed.append((evicted_key, evicted_value, "evicted"))
+
+        if removed:
+            self._notify(removed)
+
+    def delete(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return False
+            self._bytes -= item[2]
+
+        self._notify([(key, item[1], "deleted")])
+        return True
+
+    def clear(self):
+        with self._lock:
+            removed = [(key, item[1], "cleared") for key, item in self._data.items()] if self._listeners else []
+            self._data.clear()
+            self._bytes = 0
+
+        self._notify(removed)
+
+    def __contains__(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and (item[0] is None or item[0] > time.time())
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
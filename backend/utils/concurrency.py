@@ -0,0 +1,169 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+
+class RateLimiter:
+    """
+    per-provider limiter
+    - max_concurrent: how many calls may be in flight at once
+    - min_interval: minimum seconds between the start of two calls (nominatim wants 1/s)
+    """
+
+    def __init__(self, name, max_concurrent=1, min_interval=0.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self.waits = 0
+        self.rejections = 0
+
+    def acquire(self, timeout=None):
+        if not self._semaphore.acquire(timeout=timeout if timeout is not None else -1):
+            self.rejections += 1
+            raise TimeoutError(f"Timed out waiting for {self.name} capacity")
+
+        if self.min_interval:
+            # reserve the next start slot, then sleep outside the lock until it comes up
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_slot)
+                self._next_slot = start + self.min_interval
+            delay = start - now
+            if delay > 0:
+                self.waits += 1
+                time.sleep(delay)
+
+    def release(self):
+        self._semaphore.release()
+
+    def limit(self, timeout=None):
+        return _Acquired(self, timeout)
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "min_interval": self.min_interval,
+            "waits": self.waits,
+            "rejections": self.rejections
+        }
+
+
+class _Acquired:
+    def __init__(self, limiter, timeout):
+        self.limiter = limiter
+        self.timeout = timeout
+
+    def __enter__(self):
+        self.limiter.acquire(self.timeout)
+        return self.limiter
+
+    def __exit__(self, exc_type, exc, tb):
+        self.limiter.release()
+        return False
+
+
+class SingleFlight:
+    """
+    coalesces concurrent calls for the same key: the first caller runs the lookup and
+    everyone who asks for that key while it's in flight waits for the same result, or
+    gets the same exception. nothing is remembered once the call finishes, that's what
+    the caches are for
+    """
+
+    def __init__(self, name, on_coalesced=None):
+        self.name = name
+        self.on_coalesced = on_coalesced
+        self._calls = {}  # key -> _Call
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, timeout=None, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if self.on_coalesced:
+                self.on_coalesced(self.name)
+            return call.wait(timeout, f"Timed out waiting on an in-flight {self.name} lookup")
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls)
+        }
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout, message):
+        if not self.done.wait(timeout):
+            raise TimeoutError(message)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class UpstreamPool:
+    """
+    thread pool dedicated to one upstream provider, so a stalled provider can only
+    tie up its own workers and never the lookups for the other one
+    """
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-io")
+
+    def submit(self, fn, *args, **kwargs):
+        # run in a copy of the caller's context so request scoped state (timing spans) follows
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, fn, *args, **kwargs)
+
+    def map(self, fn, items, timeout=None):
+        return gather([self.submit(fn, item) for item in items], timeout=timeout)
+
+
+def gather(futures, timeout=None):
+    # wait for all futures, results in submission order, first error (or the timeout) is raised
+    done, not_done = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+
+    for future in futures:
+        if future in done and future.exception() is not None:
+            for pending in not_done:
+                pending.cancel()
+            raise future.exception()
+
+    if not_done:
+        for pending in not_done:
+            pending.cancel()
+        raise TimeoutError(f"Upstream lookups did not finish within {timeout}s")
+
+    return [future.result() for future in futures]
@@ -0,0 +1,65 @@
+class CycleWindow:
+    """
+    on-duty hours for each of the last `days` calendar days, for the rolling 70 hour / 8 day limit
+
+    the days sit in a ring buffer with a running total next to them, so adding hours,
+    moving to the next day and reading the cycle total are all O(1) instead of shifting
+    a list and summing it again on every update
+    """
+
+    __slots__ = ("days", "total", "_hours", "_today")
+
+    def __init__(self, days=8, history=None):
+        self.days = days
+        self.total = 0.0
+        self._hours = [0.0] * days
+        self._today = 0
+        # history[0] is today, [1] the day before, and so on
+        for days_ago, hours in enumerate(list(history or [])[:days]):
+            self.set(hours, days_ago)
+
+    def _slot(self, days_ago):
+        return (self._today - days_ago) % self.days
+
+    def add(self, hours):
+        # on-duty time for today
+        self._hours[self._today] += hours
+        self.total += hours
+
+    def set(self, hours, days_ago=0):
+        if not 0 <= days_ago < self.days:
+            return
+        slot = self._slot(days_ago)
+        self.total += hours - self._hours[slot]
+        self._hours[slot] = hours
+
+    def get(self, days_ago=0):
+        if not 0 <= days_ago < self.days:
+            return 0.0
+        return self._hours[self._slot(days_ago)]
+
+    def advance(self, days=1):
+        # move on to a new day, the oldest day drops out of the window
+        if days >= self.days:
+            self.clear()
+            return
+        for _ in range(days):
+            self._today = (self._today + 1) % self.days
+            self.total -= self._hours[self._today]
+            self._hours[self._today] = 0.0
+
+    def drop_before(self, days_ago):
+        # forget every day older than days_ago, what a 34 hour restart does to the cycle
+        for older in range(days_ago + 1, self.days):
+            self.set(0.0, older)
+
+    def clear(self):
+        self._hours = [0.0] * self.days
+        self.total = 0.0
+
+    def remaining(self, limit):
+        return limit - self.total
+
+    def history(self):
+        # newest first, the same shape cycle_history takes
+        return [self.get(days_ago) for days_ago in range(self.days)]
@@ -0,0 +1,236 @@
+import os
+from datetime import datetime, timedelta
+
+from utils.hos_simulator import HOSSimulator, EPSILON, FUEL_STOP_HOURS, MAX_WEEKLY_HOURS, WEEKLY_DAYS
+
+SWEEP_MAX_CANDIDATES = int(os.environ.get('SWEEP_MAX_CANDIDATES', 2000))
+SWEEP_MIN_STEP_MINUTES = 5
+SWEEP_DEFAULT_STEP_MINUTES = 60
+SWEEP_DEFAULT_WINDOW_HOURS = 24
+
+
+def parse_departure_window(window):
+    """
+    departure times to try, from {"start": "2025-04-01T00:00", "end": "2025-04-02T00:00",
+    "step_minutes": 30}. end defaults to a day after start, step to an hour
+    """
+    if not isinstance(window, dict) or not window.get("start"):
+        raise ValueError("departure_window needs a start time")
+    try:
+        start = datetime.fromisoformat(window["start"])
+        end = datetime.fromisoformat(window["end"]) if window.get("end") else start + timedelta(hours=SWEEP_DEFAULT_WINDOW_HOURS)
+    except (TypeError, ValueError):
+        raise ValueError("departure_window start and end must be iso datetimes")
+    try:
+        step = float(window.get("step_minutes") or SWEEP_DEFAULT_STEP_MINUTES)
+    except (TypeError, ValueError):
+        raise ValueError("departure_window step_minutes must be a number")
+    if step < SWEEP_MIN_STEP_MINUTES:
+        raise ValueError(f"departure_window step_minutes must be at least {SWEEP_MIN_STEP_MINUTES}")
+    if end < start:
+        raise ValueError("departure_window end is before its start")
+
+    count = int((end - start).total_seconds() / 60 / step + EPSILON) + 1
+    if count > SWEEP_MAX_CANDIDATES:
+        raise ValueError(f"Too many departure times, max {SWEEP_MAX_CANDIDATES}")
+    return [start + timedelta(minutes=step * k) for k in range(count)]
+
+
+def parse_cycle_hours(value):
+    # starting cycle hours to try: one number, a list, or {"min": 0, "max": 60, "step": 5}
+    if isinstance(value, dict):
+        try:
+            low, high = float(value["min"]), float(value["max"])
+            step = float(value.get("step") or 1)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("current_hours range needs numeric min and max")
+        if step <= 0 or high < low:
+            raise ValueError("current_hours range needs min <= max and a positive step")
+        count = int((high - low) / step + EPSILON) + 1
+        if count > SWEEP_MAX_CANDIDATES:
+            raise ValueError(f"Too many current_hours values, max {SWEEP_MAX_CANDIDATES}")
+        values = [round(low + step * k, 4) for k in range(count)]
+    elif isinstance(value, list):
+        values = value
+    else:
+        values = [value]
+
+    try:
+        values = sorted(set(float(hours) for hours in values))
+    except (TypeError, ValueError):
+        raise ValueError("current_hours must be numbers")
+    if not values or not all(0 <= hours <= MAX_WEEKLY_HOURS for hours in values):
+        raise ValueError(f"current_hours must be between 0 and {MAX_WEEKLY_HOURS:g}")
+    return values
+
+
+class _Resolved(Exception):
+    # a checkpoint the memo already knows the rest of the trip from
+    def __init__(self, suffix):
+        self.suffix = suffix
+
+
+class _Mark:
+    # stands in for a schedule entry, the day is all the sweep reads back
+    __slots__ = ("day",)
+
+    def __init__(self, day):
+        self.day = day
+
+
+class _SweepSimulator(HOSSimulator):
+    """
+    the simulator without the schedule: no labels, positions or entries, only the clock,
+    the day count and the rests taken
+
+    every checkpoint is keyed by what decides the rest of the trip (where on the route,
+    the driver's clocks, the hour of day and the cycle days) and a key the memo has seen
+    ends the run right there, the rest of the trip is the same shifted in time. the cycle
+    days are left out when the 70 hour limit can't be reached before the end of the trip,
+    which is what lets low and high current_hours share one simulation
+    """
+
+    def __init__(self, route_data, memo, ahead, **kwargs):
+        super().__init__(route_data, **kwargs)
+        self.memo = memo
+        self.ahead = ahead
+        self.path = []
+        self.rests = 0
+        self.restarts = 0
+
+    def _point_at(self, segment_index, at_segment_end=False):
+        return None
+
+    def _record(self, status, place, note=None):
+        mark = _Mark(self.state.day_index(self.t) - self.state.day_index(0) + 1 + self.day_offset)
+        self.schedule.append(mark)
+        return mark
+
+    def _rest_stop(self, entry, hours, reason):
+        return None
+
+    def _take_rest(self, place, reason):
+        self.rests += 1
+        super()._take_rest(place, reason)
+
+    def _take_restart(self, place):
+        self.restarts += 1
+        super()._take_restart(place)
+
+    def totals(self):
+        return (self.t, self.state.day_index(self.t), self.rests, self.restarts)
+
+    def _checkpoint(self, segment_index, remaining_hours, fuel_index):
+        state = self.state
+        used = state.cycle_used(self.t)
+        drive_after, stops_from, fuel_count = self.ahead
+        on_duty_ahead = (remaining_hours + drive_after[segment_index] + stops_from[segment_index]
+                         + max(0, fuel_count - fuel_index) * FUEL_STOP_HOURS)
+        cycle = None
+        if used + on_duty_ahead >= MAX_WEEKLY_HOURS - EPSILON:
+            today = state.day_index(self.t)
+            cycle = tuple(round(state.daily.get(today - days_ago, 0.0), 6) for days_ago in range(WEEKLY_DAYS))
+
+        key = (
+            segment_index, round(remaining_hours, 6), fuel_index,
+            round(state.driven, 6), round(state.since_break, 6), round(self.t - state.window_start, 6),
+            round((state.start_hour + self.t) % 24, 6), cycle
+        )
+        totals = self.totals()
+        self.path.append((key, totals))
+        suffix = self.memo.get(key)
+        if suffix is not None:
+            raise _Resolved(tuple(total + rest for total, rest in zip(totals, suffix)))
+
+
+def _on_duty_ahead(route_data):
+    # (driving after each segment, stop time from each segment on, fuel stops) for the cycle check
+    segments = route_data["segments"]
+    stops = route_data.get("stops", [])
+    drive_after = [0.0] * len(segments)
+    stops_from = [0.0] * len(segments)
+    driving = stopping = 0.0
+    for i in range(len(segments) - 1, -1, -1):
+        drive_after[i] = driving
+        driving += segments[i]["duration"]
+        if i < len(stops) and stops[i]["type"] in ("pickup", "dropoff"):
+            stopping += stops[i]["duration"]
+        stops_from[i] = stopping
+    return drive_after, stops_from, len(route_data.get("fuel_stops", []))
+
+
+def _pareto(options):
+    # options no other option beats on every objective, objectives are the first three fields
+    front = []
+    for option in sorted(options, key=lambda option: option["objectives"]):
+        if not any(all(a <= b for a, b in zip(kept["objectives"], option["objectives"])) for kept in front):
+            front.append(option)
+    return front
+
+
+def sweep_departures(route_data, departures, cycle_hours, cycle_histories=None):
+    """
+    the simulator over every departure time x starting cycle hours for one route, and
+    the pareto-best of them on (trip days, rests, hours door to door)
+
+    runs share a memo of trip remainders keyed by checkpoint, so a candidate stops
+    simulating as soon as it reaches a state an earlier one already played out.
+    cycle_histories ({date: a driver's stored days as of that date}) makes the driver's
+    history on each departure's date the only cycle option, and those runs share a memo
+    per date. candidates with the same outcome are folded into the one that leaves earliest
+    """
+    memos = {}
+    ahead = _on_duty_ahead(route_data)
+
+    outcomes = {}
+    candidates = simulated = 0
+    for departure in departures:
+        if cycle_histories:
+            history = cycle_histories[departure.date()]
+            runs = [(sum(history[:WEEKLY_DAYS]), list(history))]
+            memo = memos.setdefault(departure.date(), {})
+        else:
+            runs = [(hours, None) for hours in cycle_hours]
+            memo = memos.setdefault(None, {})
+
+        for hours, history in runs:
+            candidates += 1
+            simulator = _SweepSimulator(route_data, memo, ahead, current_hours=hours, start_time=departure,
+                                        cycle_history=history)
+            try:
+                simulator.run()
+                final = simulator.totals()
+                simulated += 1
+            except _Resolved as resolved:
+                final = resolved.suffix
+            for key, totals in simulator.path:
+                memo.setdefault(key, tuple(end - total for end, total in zip(final, totals)))
+
+            t, day, rests, restarts = final
+            trip_days = day - simulator.state.day_index(0) + 1
+            objectives = (trip_days, rests + restarts, round(t, 4))
+            if objectives in outcomes:
+                outcomes[objectives]["equivalent"] += 1
+                continue
+            outcomes[objectives] = {
+                "objectives": objectives,
+                "departure_time": departure.isoformat(),
+                "current_hours": round(hours, 4),
+                "trip_days": trip_days,
+                "rests": rests,
+                "restarts": restarts,
+                "total_hours": round(t, 4),
+                "arrival_time": (departure + timedelta(hours=t)).isoformat(),
+                "equivalent": 0
+            }
+
+    options = _pareto(outcomes.values())
+    for option in options:
+        del option["objectives"]
+    return {
+        "options": options,
+        "candidates": candidates,
+        "simulated": simulated,
+        "memoized": candidates - simulated,
+        "outcomes": len(outcomes)
+    }
@@ -0,0 +1,245 @@
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+from utils.cache import TTLCache
+from utils.cycle_window import CycleWindow
+
+DRIVER_CYCLES_PATH = os.environ.get('DRIVER_CYCLES_PATH', 'driver_cycles.sqlite3')
+DRIVER_CYCLES_MAX_ENTRIES = int(os.environ.get('DRIVER_CYCLES_MAX_ENTRIES', 10000))
+
+CYCLE_DAYS = 8
+CYCLE_LIMIT_HOURS = 70.0
+RESTART_HOURS = 34.0
+
+
+def _parse_day(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+
+def parse_cycle_record(record):
+    """
+    one day of a driver's duty history as a row for the driver_days table
+    {"driver_id": "D-17", "date": "2025-04-01", "on_duty_hours": 9.5, "off_duty_hours": 36}
+    off_duty_hours is optional, the longest off-duty stretch that ended that day. 34 or
+    more means the driver took a restart
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Expected a record object")
+    driver_id = record.get("driver_id")
+    if driver_id in (None, "") or isinstance(driver_id, (bool, dict, list)):
+        raise ValueError("Missing required field: driver_id")
+    if "date" not in record:
+        raise ValueError("Missing required field: date")
+    day = _parse_day(record["date"])
+
+    try:
+        hours = float(record.get("on_duty_hours"))
+        off_duty = float(record.get("off_duty_hours") or 0)
+    except (TypeError, ValueError):
+        raise ValueError("on_duty_hours and off_duty_hours must be numbers")
+    if not 0 <= hours <= 24:
+        raise ValueError("on_duty_hours must be between 0 and 24")
+
+    return str(driver_id), day.isoformat(), hours, int(off_duty >= RESTART_HOURS)
+
+
+class _DriverWindow:
+    # a driver's CycleWindow as of a calendar day, the unit the memory tier caches
+    __slots__ = ("day", "window", "restart_day")
+
+    def __init__(self, day, window, restart_day=None):
+        self.day = day
+        self.window = window
+        self.restart_day = restart_day
+
+
+def _apply_restart(state):
+    """
+    drop the days before the latest restart in the window. a restart is a record with
+    off_duty_hours >= 34, or two full days without on-duty time (at least 48 hours off),
+    only days before today count since today isn't over yet
+    """
+    window = state.window
+    for days_ago in range(1, window.days - 1):
+        if window.get(days_ago) == 0 and window.get(days_ago + 1) == 0:
+            restart_day = state.day - timedelta(days=days_ago)
+            if state.restart_day is None or restart_day > state.restart_day:
+                state.restart_day = restart_day
+            break
+
+    if state.restart_day is not None:
+        days_ago = (state.day - state.restart_day).days
+        if days_ago >= window.days:
+            state.restart_day = None
+        else:
+            window.drop_before(days_ago)
+
+
+class DriverCycleStore:
+    """
+    per-driver duty history for the 70 hour / 8 day cycle
+    - disk: sqlite table of on-duty hours per driver and day, the source of truth shared by workers
+    - memory: each driver's last 8 days as a CycleWindow, moved forward instead of being
+      re-read (only the days it moves into come from disk), so the cycle total for a plan
+      is O(1) once it's warm
+    """
+
+    def __init__(self, path=DRIVER_CYCLES_PATH, max_entries=DRIVER_CYCLES_MAX_ENTRIES, days=CYCLE_DAYS):
+        self.path = path
+        self.days = days
+        self.windows = TTLCache(max_entries=max_entries)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.available = bool(path)
+
+        if self.available:
+            try:
+                self._init_db()
+            except sqlite3.Error:
+                # read-only filesystem (serverless) or bad path, plans fall back to current_hours
+                self.available = False
+
+    def _connect(self):
+        # sqlite connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS driver_days ("
+            " driver_id TEXT NOT NULL,"
+            " day TEXT NOT NULL,"
+            " on_duty_hours REAL NOT NULL,"
+            " restart INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (driver_id, day)) WITHOUT ROWID"
+        )
+        conn.commit()
+
+    def _rows(self, driver_id, first, last):
+        return self._connect().execute(
+            "SELECT day, on_duty_hours, restart FROM driver_days WHERE driver_id = ? AND day BETWEEN ? AND ?",
+            (driver_id, first.isoformat(), last.isoformat())
+        ).fetchall()
+
+    def _apply_rows(self, state, rows):
+        for row_day, hours, restart in rows:
+            row_day = date.fromisoformat(row_day)
+            state.window.set(hours, (state.day - row_day).days)
+            if restart and (state.restart_day is None or row_day > state.restart_day):
+                state.restart_day = row_day
+
+    def _load(self, driver_id, day):
+        # the window as of day straight from disk, None for a driver with no history at all
+        rows = self._rows(driver_id, day - timedelta(days=self.days - 1), day)
+        if not rows and self._connect().execute(
+                "SELECT 1 FROM driver_days WHERE driver_id = ? LIMIT 1", (driver_id,)).fetchone() is None:
+            return None
+
+        state = _DriverWindow(day, CycleWindow(self.days))
+        self._apply_rows(state, rows)
+        _apply_restart(state)
+        return state
+
+    def _window(self, driver_id, day):
+        state = self.windows.get(driver_id)
+        if state is None:
+            state = self._load(driver_id, day)
+            if state is not None:
+                self.windows.set(driver_id, state)
+        elif state.day > day:
+            # a day before the cached one, the ring can't go back so read it without caching
+            return self._load(driver_id, day)
+        elif state.day < day:
+            # days without records are days off. the days moved into can already be on disk
+            # when the window was cached for an earlier day than the latest ingest, one range read
+            rows = self._rows(driver_id, max(state.day + timedelta(days=1), day - timedelta(days=self.days - 1)), day)
+            state.window.advance((day - state.day).days)
+            state.day = day
+            self._apply_rows(state, rows)
+            _apply_restart(state)
+        return state
+
+    def state(self, driver_id, day=None):
+        """
+        cycle state for a plan starting on day (today by default), None for an unknown driver
+        history is on-duty hours per day, newest first, the shape cycle_history takes
+        """
+        if not self.available:
+            raise RuntimeError("Driver cycle store is unavailable")
+        day = _parse_day(day) if day is not None else date.today()
+        with self._lock:
+            state = self._window(str(driver_id), day)
+            if state is None:
+                return None
+            window = state.window
+            return {
+                "driver_id": str(driver_id),
+                "date": day.isoformat(),
+                "history": window.history(),
+                "cycle_hours": round(window.total, 4),
+                "available_hours": round(max(0.0, window.remaining(CYCLE_LIMIT_HOURS)), 4),
+                "restart_day": state.restart_day.isoformat() if state.restart_day else None
+            }
+
+    def ingest(self, records):
+        """
+        upsert daily totals for any number of drivers in one transaction, a later total
+        for the same driver and day replaces the earlier one. every record is checked
+        before anything is written, a ValueError names the first bad one
+        """
+        rows = []
+        for index, record in enumerate(records):
+            try:
+                rows.append(parse_cycle_record(record))
+            except ValueError as e:
+                raise ValueError(f"records[{index}]: {e}")
+        if not self.available:
+            raise RuntimeError("Driver cycle store is unavailable")
+
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO driver_days (driver_id, day, on_duty_hours, restart) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (driver_id, day) DO UPDATE SET"
+                " on_duty_hours = excluded.on_duty_hours, restart = excluded.restart",
+                rows
+            )
+
+        # warm windows take the new totals in place, restarts and days outside them reload from disk
+        drivers = set()
+        with self._lock:
+            for driver_id, day, hours, restart in rows:
+                drivers.add(driver_id)
+                state = self.windows.get(driver_id)
+                if state is None:
+                    continue
+                days_ago = (state.day - date.fromisoformat(day)).days
+                if restart or not 0 <= days_ago < self.days or (state.restart_day and days_ago >= (state.day - state.restart_day).days):
+                    self.windows.delete(driver_id)
+                else:
+                    state.window.set(hours, days_ago)
+                    _apply_restart(state)
+
+        return {"records": len(rows), "drivers": len(drivers)}
+
+    def stats(self):
+        drivers = None
+        if not self.available:
+            return {"memory": self.windows.stats(), "drivers": drivers, "path": self.path}
+        try:
+            drivers = self._connect().execute("SELECT COUNT(DISTINCT driver_id) FROM driver_days").fetchone()[0]
+        except sqlite3.Error:
+            pass
+        return {"memory": self.windows.stats(), "drivers": drivers, "path": self.path}
@@ -1,3 +1,41 @@
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from models import DutyStatus, LogSheet
+
+SLOTS_PER_DAY = 96  # 24h * 4 intervals/hour
+MINUTES_PER_SLOT = 15
+
+
+def duty_status(entry, previous_status):
+    # duty status for a schedule entry, labels that don't map to one keep the previous status
+    status = getattr(entry, "duty_status", None)
+    if status is None:
+        status = DutyStatus.from_label(entry["status"])
+    return status or previous_status
+
+
+def _empty_sheet():
+    grid = [[0] * SLOTS_PER_DAY for _ in DutyStatus]
+    status_hours = {status: 0 for status in DutyStatus}
+    return grid, status_hours
+
+
+def _hours_by_key(status_hours):
+    # the json keeps the "off_duty", "driving", ... keys
+    return {status.value: hours for status, hours in status_hours.items()}
+
+
+def _locations(entries):
+    return [
+        {
+            "time": entry["time"],
+            "location": entry["location"],
+            "status": entry["status"]
+        } for entry in entries
+    ]
+
+
 def generate_eld_logs(hos_plan):
     """
     for every day of the trip, generate a log sheet with
@@ -5,94 +43,121 @@ def generate_eld_logs(hos_plan):
     - summary of hours
     - location info
     """
-    eld_logs = []
-
-    total_days = hos_plan["total_trip_days"]
+    return list(iter_eld_logs(hos_plan))
 
-    # creating log sheet for every day
-    for day in range(1, total_days + 1):
-        # filtering schedule entries for this day
-        day_schedule = [entry for entry in hos_plan["schedule"] if entry["day"] == day]
 
-        if not day_schedule:
-            continue
+def iter_eld_logs(hos_plan):
+    """
+    same as generate_eld_logs but yields each day's sheet as soon as it's built
 
-        # initialize 24hr grid with 15min intervals
-        # 0 = off duty, 1 = sleeper berth, 2 = diving, 3 = on duty (not driving)
-        grid = [[0 for _ in range(96)] for _ in range(4)]  # 24h * 4 intervals/hour, 4 statuses
+    one pass over the schedule. when entries carry real timestamps (the simulator engine)
+    intervals are placed by clock time, otherwise entries are spaced evenly across each day
+    like before since the classic engine only has placeholder times
+    """
+    schedule = hos_plan["schedule"]
+    if schedule and all("timestamp" in entry for entry in schedule):
+        return _iter_timed_logs(schedule)
+    return _iter_spaced_logs(schedule)
 
-        # track hrs in each status
-        status_hours = {
-            "off_duty": 0,
-            "sleeper_berth": 0,
-            "driving": 0,
-            "on_duty_not_driving": 0
-        }
 
+def _iter_spaced_logs(schedule):
+    # schedule days never go backwards, so grouping consecutive entries is one pass
+    for day, entries in groupby(schedule, key=lambda entry: entry["day"]):
+        day_schedule = list(entries)
+        grid, status_hours = _empty_sheet()
 
         # process each status change
-        previous_status = "off_duty"
+        previous_status = DutyStatus.OFF_DUTY
         previous_time_index = 0
+        last = len(day_schedule) - 1
 
         for i, entry in enumerate(day_schedule):
-            # grab current status
-            status = entry["status"].lower()
-
-            # map status to grid row
-            status_row = None
-            if status in ["rest start", "rest end", "start", "end"]:
-                current_status = "off_duty"
-                status_row = 0
-            elif "rest" in status and "berth" in status:
-                current_status = "sleeper_berth"
-                status_row = 1
-            elif status == "driving":
-                current_status = "driving"
-                status_row = 2
-            elif status in ["pickup", "dropoff", "fuel"]:
-                current_status = "on_duty_not_driving"
-                status_row = 3
-            else:
-                current_status = previous_status
-                status_row = {"off_duty": 0, "sleeper_berth": 1, "driving": 2, "on_duty_not_driving": 3}[previous_status]
+            current_status = duty_status(entry, previous_status)
 
-            # converting time to grid index, in a real app I would use real times, but for this assessment, I'm just going to space evenly
+            # in a real app I would use real times, but for this assessment, I'm just going to space evenly
             if i == 0:
                 time_index = 0
-            elif i == len(day_schedule) - 1:
+            elif i == last:
                 time_index = 95
             else:
-                time_index = int((i / (len(day_schedule) - 1)) * 95)
+                time_index = int((i / last) * 95)
 
             # fill grid from prev time to current time
             duration_intervals = time_index - previous_time_index
             if duration_intervals > 0:
-                hours = duration_intervals / 4  # convert 15-min intervals to hrs
-                status_hours[previous_status] += hours
-
-                for j in range(previous_time_index, time_index):
-                    previous_row = {"off_duty": 0, "sleeper_berth": 1, "driving": 2, "on_duty_not_driving": 3}[previous_status]
-                    grid[previous_row][j] = 1
+                status_hours[previous_status] += duration_intervals / 4  # convert 15-min intervals to hrs
+                grid[previous_status.row][previous_time_index:time_index] = [1] * duration_intervals
 
             previous_status = current_status
             previous_time_index = time_index
 
-        # create log sheet
-        log_sheet = {
-            "day": day,
-            "date": f"2025-04-{day:02d}",  # random date, for assessment sake
-            "grid": grid,
-            "hours": status_hours,
-            "locations": [
-                {
-                    "time": entry["time"],
-                    "location": entry["location"],
-                    "status": entry["status"]
-                } for entry in day_schedule
-            ],
-            "total_hours": sum(status_hours.values())
-        }
-
-        eld_logs.append(log_sheet)
-
-    return eld_logs
\ No newline at end of file
+        yield LogSheet(
+            day=day,
+            date=f"2025-04-{day:02d}",  # random date, for assessment sake
+            grid=grid,
+            hours=_hours_by_key(status_hours),
+            locations=_locations(day_schedule),
+            total_hours=sum(status_hours.values())
+        )
+
+
+def _iter_timed_logs(schedule):
+    """
+    each entry's status runs from its timestamp until the next entry's, the time before
+    departure and after the end of the trip is logged off duty so every sheet covers 24h.
+    sheets are numbered from the first entry's day, a re-planned trip doesn't start at 1
+    """
+    first_date = datetime.fromisoformat(schedule[0]["timestamp"]).date()
+    first_day = schedule[0]["day"]
+
+    sheet_date = first_date
+    grid, status_hours = _empty_sheet()
+    day_entries = []
+
+    # off duty from midnight until departure, then one interval per entry
+    cursor = datetime.combine(first_date, datetime.min.time())
+    status = DutyStatus.OFF_DUTY
+    boundaries = [(datetime.fromisoformat(entry["timestamp"]), entry) for entry in schedule]
+    trip_end = boundaries[-1][0]
+    day_after_end = datetime.combine(trip_end.date() + timedelta(days=1), datetime.min.time())
+    boundaries.append((day_after_end, None))
+
+    for moment, entry in boundaries:
+        # lay the current status down from cursor to this moment, one calendar day at a time
+        while cursor < moment:
+            midnight = datetime.combine(cursor.date() + timedelta(days=1), datetime.min.time())
+            until = min(moment, midnight)
+
+            start_minutes = (cursor - datetime.combine(cursor.date(), datetime.min.time())).total_seconds() / 60
+            end_minutes = start_minutes + (until - cursor).total_seconds() / 60
+            start_slot = int(round(start_minutes / MINUTES_PER_SLOT))
+            end_slot = int(round(end_minutes / MINUTES_PER_SLOT))
+            if end_slot > start_slot:
+                grid[status.row][start_slot:end_slot] = [1] * (end_slot - start_slot)
+            status_hours[status] += (until - cursor).total_seconds() / 3600
+
+            cursor = until
+            if cursor == midnight:
+                yield _timed_sheet(sheet_date, first_date, first_day, grid, status_hours, day_entries)
+                sheet_date = cursor.date()
+                grid, status_hours = _empty_sheet()
+                day_entries = []
+
+        if entry is None:
+            break
+        # the closing "End" entry maps to off duty, which covers the rest of the last day
+        status = duty_status(entry, status)
+        day_entries.append(entry)
+
+
+def _timed_sheet(sheet_date, first_date, first_day, grid, status_hours, day_entries):
+    for status in status_hours:
+        status_hours[status] = round(status_hours[status], 4)
+    return LogSheet(
+        day=(sheet_date - first_date).days + first_day,
+        date=sheet_date.isoformat(),
+        grid=grid,
+        hours=_hours_by_key(status_hours),
+        locations=_locations(day_entries),
+        total_hours=round(sum(status_hours.values()), 4)
+    )
@@ -0,0 +1,325 @@
+import csv
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+
+from utils.geocode_cache import normalize_location_key
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+GAZETTEER_CSV = os.environ.get('GAZETTEER_CSV', os.path.join(DATA_DIR, 'north_america_places.csv'))
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH', os.path.join(DATA_DIR, 'gazetteer.bin'))
+# answer known places locally and only send the rest to nominatim
+GAZETTEER_ENABLED = os.environ.get('GAZETTEER_ENABLED', 'True') == 'True'
+
+COUNTRY_NAMES = {"US": "United States", "CA": "Canada", "MX": "Mexico"}
+# trailing parts of a query that don't narrow anything down in a north american gazetteer
+COUNTRY_SUFFIXES = {"us", "usa", "united states", "united states of america", "canada", "mexico"}
+
+# file layout, little endian
+# header: magic, place count, key count, string bytes
+# places: lat / lon in microdegrees, population, label and address as (offset, length) into strings
+# keys: (offset, length) into strings and the place, sorted by key then place
+# places are stored most populous first, so for one key the first place is the likeliest
+MAGIC = b"GZT1"
+HEADER = struct.Struct("<4sIII")
+PLACE = struct.Struct("<iiIIHIH")
+KEY = struct.Struct("<IHI")
+
+
+def place_key(text):
+    # "St. John's" / "saint johns" / "ST JOHNS" all end up as "st johns", accents dropped
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = normalize_location_key(text).replace(".", "").replace("'", "")
+    text = re.sub(r"\bsaint\b", "st", text)
+    text = re.sub(r"\bsainte\b", "ste", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def query_key(query):
+    # place_key minus what doesn't help a lookup: a trailing zip code or country
+    parts = [part for part in place_key(query).split(", ") if part]
+    if parts:
+        parts[-1] = re.sub(r"\s*\d{5}(-\d{4})?$", "", parts[-1])
+    while len(parts) > 1 and parts[-1] in COUNTRY_SUFFIXES:
+        parts.pop()
+    return ", ".join(part for part in parts if part)
+
+
+def read_places_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def build_gazetteer(rows):
+    """
+    the compact file for a list of csv rows (name, region_code, region, country_code,
+    latitude, longitude, population), as bytes
+
+    every place gets a key for "name, region code", "name, region" and just "name", so
+    "Dallas, TX", "Dallas, Texas" and "Dallas" all resolve with one binary search
+    """
+    rows = sorted(rows, key=lambda row: -int(row["population"] or 0))
+    strings = bytearray()
+
+    def add_string(text):
+        data = text.encode("utf-8")
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    places = []
+    keys = set()
+    for index, row in enumerate(rows):
+        name, code, region = row["name"].strip(), row["region_code"].strip(), row["region"].strip()
+        country = COUNTRY_NAMES.get(row["country_code"].strip(), row["country_code"].strip())
+        label = add_string(f"{name}, {code}")
+        address = add_string(f"{name}, {region}, {country}")
+        places.append(PLACE.pack(
+            round(float(row["latitude"]) * 1e6), round(float(row["longitude"]) * 1e6),
+            int(row["population"] or 0), label[0], label[1], address[0], address[1]
+        ))
+        for text in (f"{name}, {code}", f"{name}, {region}", name):
+            keys.add((place_key(text).encode("utf-8"), index))
+
+    key_records = []
+    for key, index in sorted(keys):
+        offset, length = add_string(key.decode("utf-8"))
+        key_records.append(KEY.pack(offset, length, index))
+
+    return b"".join([HEADER.pack(MAGIC, len(places), len(key_records), len(strings))] + places + key_records + [bytes(strings)])
+
+
+def _edit_distance(query, key, max_edits, prefix=False):
+    """
+    levenshtein distance, or to the closest prefix of key when prefix is set (for
+    autocomplete), None once it's certain to go over max_edits
+    """
+    if not prefix and abs(len(query) - len(key)) > max_edits:
+        return None
+    previous = list(range(len(key) + 1))
+    for i, query_char in enumerate(query, 1):
+        current = [i] + [0] * len(key)
+        for j, key_char in enumerate(key, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (query_char != key_char))
+        if min(current) > max_edits:
+            return None
+        previous = current
+    distance = min(previous) if prefix else previous[-1]
+    return distance if distance <= max_edits else None
+
+
+def _allowed_edits(query):
+    # short queries get no slack, a 3 letter typo is a different word
+    return 0 if len(query) <= 3 else 1 if len(query) <= 7 else 2
+
+
+class Gazetteer:
+    """
+    read side of the compact file, usually over a read-only mmap so opening it costs
+    nothing and the pages are shared between workers
+
+    keys are sorted, so every key starting with a prefix sits in one contiguous run
+    found by binary search: exact lookups, prefix completion and the candidate range
+    for fuzzy matches all come from that one index
+    """
+
+    def __init__(self, buffer, path=None):
+        magic, self.place_count, self.key_count, _ = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a gazetteer file")
+        self.buffer = buffer
+        self.path = path
+        self._places_at = HEADER.size
+        self._keys_at = self._places_at + self.place_count * PLACE.size
+        self._strings_at = self._keys_at + self.key_count * KEY.size
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, path)
+
+    def _string(self, offset, length):
+        start = self._strings_at + offset
+        return self.buffer[start:start + length]
+
+    def _key(self, i):
+        offset, length, place = KEY.unpack_from(self.buffer, self._keys_at + i * KEY.size)
+        return self._string(offset, length), place
+
+    def place(self, index):
+        latitude, longitude, population, label_at, label_len, address_at, address_len = PLACE.unpack_from(
+            self.buffer, self._places_at + index * PLACE.size)
+        return {
+            "name": self._string(label_at, label_len).decode("utf-8"),
+            "address": self._string(address_at, address_len).decode("utf-8"),
+            "latitude": latitude / 1e6,
+            "longitude": longitude / 1e6,
+            "population": population
+        }
+
+    def _lower_bound(self, key):
+        low, high = 0, self.key_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _range(self, prefix):
+        # indexes of every key starting with prefix
+        start = self._lower_bound(prefix)
+        end = self._lower_bound(prefix + b"\xff")
+        return range(start, end)
+
+    def exact(self, query):
+        key = query_key(query).encode("utf-8")
+        i = self._lower_bound(key)
+        if i < self.key_count:
+            found, place = self._key(i)
+            if found == key:
+                return place
+        return None
+
+    def complete(self, query, limit=10):
+        # places with a key starting with query, most populous first
+        places = set()
+        for i in self._range(query_key(query).encode("utf-8")):
+            places.add(self._key(i)[1])
+        return sorted(places)[:limit]
+
+    def fuzzy(self, query, limit=10, prefix=False):
+        """
+        [(place, edits)] closest first. candidates are the keys sharing the query's first
+        letter, a typo there isn't caught but it keeps the scan to a sliver of the index
+
+        for a "city, region" query only the city is fuzzy, the region has to match (or,
+        for autocomplete, start the candidate's region). a state code is two letters, so
+        letting it count against the edits would send "Jackson, MI" to Jackson, MS
+        """
+        key = query_key(query)
+        if not key:
+            return []
+        city, _, region = key.rpartition(", ")
+        if not city:
+            city, region = key, None
+        max_edits = _allowed_edits(city)
+        best = {}
+        for i in self._range(key[:1].encode("utf-8")):
+            candidate, place = self._key(i)
+            candidate = candidate.decode("utf-8")
+            if region is not None:
+                candidate, _, candidate_region = candidate.rpartition(", ")
+                if not candidate or not (candidate_region.startswith(region) if prefix else candidate_region == region):
+                    continue
+            distance = _edit_distance(city, candidate, max_edits, prefix)
+            if distance is not None and distance < best.get(place, max_edits + 1):
+                best[place] = distance
+        return sorted(((place, distance) for place, distance in best.items()), key=lambda item: (item[1], item[0]))[:limit]
+
+    def geocode(self, query):
+        """
+        {"address", "latitude", "longitude"} like a nominatim result, or None to fall back
+        to nominatim. a fuzzy match is only taken for a "city, region" query with one
+        clear winner in that region, a bare name typo could be anywhere and a city we
+        don't have in that region is nominatim's to find
+        """
+        place = self.exact(query)
+        if place is None and "," in query_key(query):
+            matches = self.fuzzy(query, limit=2)
+            if matches and (len(matches) == 1 or matches[0][1] < matches[1][1]):
+                place = matches[0][0]
+
+        if place is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        found = self.place(place)
+        return {"address": found["address"], "latitude": found["latitude"], "longitude": found["longitude"]}
+
+    def autocomplete(self, query, limit=10):
+        # prefix matches, or near misses when nothing starts with a long enough query (a typo)
+        places = self.complete(query, limit)
+        if not places and len(query_key(query)) > 3:
+            places = [place for place, _ in self.fuzzy(query, limit, prefix=True)]
+        return [self.place(place) for place in places]
+
+    def stats(self):
+        return {"places": self.place_count, "keys": self.key_count, "hits": self.hits, "misses": self.misses}
+
+
+def write_gazetteer(csv_path=GAZETTEER_CSV, path=GAZETTEER_PATH):
+    # build the compact file next to the csv, written to a temp file first so readers never see half of it
+    data = build_gazetteer(read_places_csv(csv_path))
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return data
+
+
+_gazetteer = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _load():
+    # the compact file if it's there and current, otherwise (re)built from the csv
+    built_at, csv_at = _mtime(GAZETTEER_PATH), _mtime(GAZETTEER_CSV)
+    if built_at is not None and (csv_at is None or built_at >= csv_at):
+        try:
+            return Gazetteer.open(GAZETTEER_PATH)
+        except (OSError, ValueError):
+            pass
+    if csv_at is None:
+        return None
+
+    try:
+        write_gazetteer(GAZETTEER_CSV, GAZETTEER_PATH)
+        return Gazetteer.open(GAZETTEER_PATH)
+    except OSError:
+        # read-only filesystem (serverless), keep the built bytes in memory instead
+        return Gazetteer(build_gazetteer(read_places_csv(GAZETTEER_CSV)))
+
+
+def get_gazetteer():
+    # loaded on first use, so importing the app and /api/health never touch the file
+    global _gazetteer, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                _gazetteer = _load() if GAZETTEER_ENABLED else None
+                _loaded = True
+    return _gazetteer
+
+
+def gazetteer_geocode(location_str):
+    gazetteer = get_gazetteer()
+    return gazetteer.geocode(location_str) if gazetteer is not None else None
+
+
+def autocomplete(query, limit=10):
+    gazetteer = get_gazetteer()
+    return gazetteer.autocomplete(query, limit) if gazetteer is not None else []
+
+
+def gazetteer_status():
+    status = {"enabled": GAZETTEER_ENABLED, "loaded": _loaded, "path": GAZETTEER_PATH}
+    if _gazetteer is not None:
+        status.update(_gazetteer.stats())
+    return status
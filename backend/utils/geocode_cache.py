@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from utils.cache import TTLCache
+
+GEOCODE_CACHE_PATH = os.environ.get('GEOCODE_CACHE_PATH', 'geocode_cache.sqlite3')
+GEOCODE_CACHE_MAX_ENTRIES = int(os.environ.get('GEOCODE_CACHE_MAX_ENTRIES', 2048))
+GEOCODE_CACHE_MAX_DISK_ENTRIES = int(os.environ.get('GEOCODE_CACHE_MAX_DISK_ENTRIES', 100000))
+GEOCODE_CACHE_TTL = float(os.environ.get('GEOCODE_CACHE_TTL', 30 * 24 * 60 * 60))  # 30 days
+
+
+def normalize_location_key(location_str):
+    # "  dallas ,TX" and "Dallas, TX" should land on the same key
+    key = re.sub(r"\s+", " ", str(location_str).strip().lower())
+    key = re.sub(r"\s*,\s*", ", ", key)
+    return key
+
+
+class GeocodeCache:
+    """
+    two tier cache for geocoding results
+    - memory: lru in front of everything, cheap to hit on every request
+    - disk: sqlite table so the lookups survive restarts and are shared by workers
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+                 max_disk_entries=GEOCODE_CACHE_MAX_DISK_ENTRIES, ttl=GEOCODE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self._local = threading.local()
+        self._writes = 0
+        self._disk_ok = bool(path)
+
+        if self._disk_ok:
+            try:
+                self._init_db()
+            except sqlite3.Error:
+                # read-only filesystem (serverless) or bad path, memory tier still works
+                self._disk_ok = False
+
+    def _connect(self):
+        # sqlite connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS geocode_accessed ON geocode (accessed_at)")
+        conn.commit()
+
+    def get(self, location_str):
+        key = normalize_location_key(location_str)
+
+        result = self.memory.get(key)
+        if result is not None:
+            return result
+
+        if not self._disk_ok:
+            return None
+
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at FROM geocode WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.disk_misses += 1
+                return None
+
+            value, created_at = row
+            now = time.time()
+            if self.ttl and created_at + self.ttl <= now:
+                conn.execute("DELETE FROM geocode WHERE key = ?", (key,))
+                conn.commit()
+                self.disk_misses += 1
+                return None
+
+            conn.execute("UPDATE geocode SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        except sqlite3.Error:
+            return None
+
+        self.disk_hits += 1
+        result = json.loads(value)
+        # promote to memory, keeping the remaining disk ttl
+        self.memory.set(key, result, ttl=(created_at + self.ttl - now) if self.ttl else None)
+        return result
+
+    def set(self, location_str, result):
+        key = normalize_location_key(location_str)
+        self.memory.set(key, result)
+
+        if not self._disk_ok:
+            return
+
+        try:
+            now = time.time()
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result), now, now)
+            )
+            # drop least recently accessed rows once over the disk limit, checked every so often
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._trim(conn)
+            conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def _trim(self, conn):
+        conn.execute(
+            "DELETE FROM geocode WHERE key IN ("
+            " SELECT key FROM geocode ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    def clear(self):
+        self.memory.clear()
+        if self._disk_ok:
+            conn = self._connect()
+            conn.execute("DELETE FROM geocode")
+            conn.commit()
+
+    def stats(self):
+        disk_entries = None
+        if self._disk_ok:
+            try:
+                disk_entries = self._connect().execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+            except sqlite3.Error:
+                pass
+
+        return {
+            "memory": self.memory.stats(),
+            "disk": {
+                "enabled": self._disk_ok,
+                "path": self.path,
+                "entries": disk_entries,
+                "max_entries": self.max_disk_entries,
+                "hits": self.disk_hits,
+                "misses": self.disk_misses
+            }
+        }
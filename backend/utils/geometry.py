@@ -0,0 +1,94 @@
+import math
+
+import polyline
+
+GEOMETRY_FORMATS = ("geojson", "polyline", "polyline6")
+METERS_PER_DEGREE = 111320.0
+
+
+def tolerance_for_zoom(zoom):
+    # about one screen pixel at this web mercator zoom level, in degrees
+    meters_per_pixel = 156543.03392 / (2 ** zoom)
+    return meters_per_pixel / METERS_PER_DEGREE
+
+
+def _point_segment_distance(point, start, end, lon_scale):
+    # planar distance in degrees with longitude squashed by cos(lat), fine at route scale
+    px, py = point[0] * lon_scale, point[1]
+    ax, ay = start[0] * lon_scale, start[1]
+    bx, by = end[0] * lon_scale, end[1]
+
+    dx, dy = bx - ax, by - ay
+    if dx == 0 and dy == 0:
+        return math.hypot(px - ax, py - ay)
+
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def douglas_peucker(coordinates, tolerance):
+    """
+    simplify a [[lon, lat], ...] line, keeping the endpoints
+    iterative so long cross-country legs don't hit the recursion limit
+    """
+    if len(coordinates) < 3 or tolerance <= 0:
+        return list(coordinates)
+
+    mid_lat = coordinates[len(coordinates) // 2][1]
+    lon_scale = math.cos(math.radians(mid_lat))
+
+    keep = [False] * len(coordinates)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(coordinates) - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        max_distance = 0.0
+        index = None
+        for i in range(first + 1, last):
+            distance = _point_segment_distance(coordinates[i], coordinates[first], coordinates[last], lon_scale)
+            if distance > max_distance:
+                max_distance = distance
+                index = i
+
+        if index is not None and max_distance > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [point for point, kept in zip(coordinates, keep) if kept]
+
+
+def encode_geometry(coordinates, geometry_format):
+    # geojson is [lon, lat], the polyline encoding wants (lat, lon)
+    precision = 6 if geometry_format == "polyline6" else 5
+    return {
+        "type": "Polyline",
+        "precision": precision,
+        "encoded": polyline.encode([(lat, lon) for lon, lat in coordinates], precision)
+    }
+
+
+def shape_route_output(route_data, zoom=None, geometry_format="geojson"):
+    """
+    copy of route_data with each segment's geometry simplified for the given zoom and/or
+    encoded as a polyline, the cached routes underneath are left alone
+    """
+    if zoom is None and geometry_format == "geojson":
+        return route_data
+
+    tolerance = tolerance_for_zoom(zoom) if zoom is not None else 0
+    shaped = dict(route_data)
+    shaped["segments"] = []
+
+    for segment in route_data["segments"]:
+        segment = dict(segment)
+        coordinates = douglas_peucker(segment["geometry"]["coordinates"], tolerance)
+
+        if geometry_format == "geojson":
+            segment["geometry"] = {"type": "LineString", "coordinates": coordinates}
+        else:
+            segment["geometry"] = encode_geometry(coordinates, geometry_format)
+        shaped["segments"].append(segment)
+
+    return shaped
@@ -0,0 +1,125 @@
+import numpy as np
+
+MAX_DRIVING_HOURS = 11.0
+MAX_ON_DUTY_HOURS = 14.0
+REQUIRED_REST_HOURS = 10.0
+MAX_WEEKLY_HOURS = 70.0
+WEEKLY_DAYS = 8
+
+REST_REASONS = {
+    1: "Exceeded 11-hour driving limit",
+    2: "Exceeded 14-hour on-duty limit",
+    3: "Exceeded 70-hour/8-day limit"
+}
+
+
+def _weekly_total(daily_hours):
+    # column by column, left to right, so the floats come out exactly like the scalar CycleWindow
+    total = np.zeros(daily_hours.shape[0])
+    for column in range(daily_hours.shape[1]):
+        total = total + daily_hours[:, column]
+    return total
+
+
+def _take_rest(needs_rest, reasons, code_rows, day, daily_hours, weekly, driven, on_duty):
+    # 10 hour rest for every driver in needs_rest: new day, today's counters back to zero
+    day[needs_rest] += 1
+    # running cycle total, the oldest day drops out like CycleWindow.advance
+    weekly[needs_rest] -= daily_hours[needs_rest, -1]
+    daily_hours[needs_rest] = np.roll(daily_hours[needs_rest], 1, axis=1)
+    daily_hours[needs_rest, 0] = 0
+    driven[needs_rest] = 0
+    on_duty[needs_rest] = 0
+    code_rows.append(reasons)
+
+
+def calculate_fleet_hos_compliance(segment_hours, stop_hours, current_hours):
+    """
+    array version of calculate_hos_compliance for a whole fleet at once
+
+    - segment_hours: (drivers, segments) driving hours, nan where a driver has no segment
+    - stop_hours: (drivers, segments) on-duty hours of the pickup/dropoff after each
+      segment, nan when there's no stop
+    - current_hours: (drivers,) hours already used in the cycle
+
+    every limit check is one vectorized step per segment across all drivers, so a sweep
+    costs O(segments) numpy operations instead of O(drivers x segments) python ones.
+    rest decisions, days and weekly hours match the scalar function for the same inputs
+    """
+    segment_hours = np.asarray(segment_hours, dtype=float)
+    stop_hours = np.asarray(stop_hours, dtype=float)
+    current_hours = np.asarray(current_hours, dtype=float)
+    drivers, segments = segment_hours.shape
+
+    driven = np.zeros(drivers)
+    on_duty = current_hours.copy()
+    daily_hours = np.zeros((drivers, WEEKLY_DAYS))
+    daily_hours[:, 0] = current_hours
+    weekly = _weekly_total(daily_hours)
+    day = np.ones(drivers, dtype=int)
+
+    # rest events, recorded as (reason code per driver, 0 = no rest) for each check
+    event_positions = []
+    event_codes = []
+    event_days = []
+
+    for i in range(segments):
+        hours = segment_hours[:, i]
+        active = ~np.isnan(hours)
+
+        # same precedence as the scalar elif chain
+        codes = np.zeros(drivers, dtype=int)
+        codes = np.where(active & (hours > MAX_WEEKLY_HOURS - weekly), 3, codes)
+        codes = np.where(active & (hours > MAX_ON_DUTY_HOURS - on_duty), 2, codes)
+        codes = np.where(active & (hours > MAX_DRIVING_HOURS - driven), 1, codes)
+        needs_rest = codes > 0
+        if needs_rest.any():
+            event_positions.append((i, "before_segment"))
+            event_days.append(day.copy())
+            _take_rest(needs_rest, codes, event_codes, day, daily_hours, weekly, driven, on_duty)
+
+        hours = np.where(active, hours, 0.0)
+        driven += hours
+        on_duty += hours
+        daily_hours[:, 0] += hours
+        weekly += hours
+
+        stop = stop_hours[:, i]
+        has_stop = active & ~np.isnan(stop)
+        if not has_stop.any():
+            continue
+
+        stop = np.where(has_stop, stop, 0.0)
+        codes = np.zeros(drivers, dtype=int)
+        codes = np.where(has_stop & (weekly + stop > MAX_WEEKLY_HOURS), 3, codes)
+        codes = np.where(has_stop & (on_duty + stop > MAX_ON_DUTY_HOURS), 2, codes)
+        needs_rest = codes > 0
+        if needs_rest.any():
+            event_positions.append((i, "before_stop"))
+            event_days.append(day.copy())
+            _take_rest(needs_rest, codes, event_codes, day, daily_hours, weekly, driven, on_duty)
+
+        on_duty += stop
+        daily_hours[:, 0] += stop
+        weekly += stop
+
+    # per-driver rest insertions, only touches the drivers that actually rested
+    rests = [[] for _ in range(drivers)]
+    for (segment, position), codes, days in zip(event_positions, event_codes, event_days):
+        for driver in np.nonzero(codes)[0]:
+            rests[driver].append({
+                "segment": segment,
+                "position": position,
+                "day": int(days[driver]),
+                "duration": REQUIRED_REST_HOURS,
+                "reason": REST_REASONS[int(codes[driver])]
+            })
+
+    return {
+        "total_trip_days": day,
+        "rest_counts": np.array([len(driver_rests) for driver_rests in rests], dtype=int),
+        "weekly_hours": weekly,
+        "hours_on_duty": on_duty,
+        "hours_driven": driven,
+        "rests": rests
+    }
@@ -0,0 +1,301 @@
+import math
+from datetime import datetime, timedelta
+
+from models import ScheduleEntry, RestStop
+
+MAX_DRIVING_HOURS = 11.0
+MAX_ON_DUTY_WINDOW = 14.0
+REQUIRED_REST_HOURS = 10.0
+MAX_WEEKLY_HOURS = 70.0
+WEEKLY_DAYS = 8
+BREAK_AFTER_DRIVING_HOURS = 8.0
+BREAK_HOURS = 0.5
+RESTART_HOURS = 34.0
+FUEL_STOP_HOURS = 0.5
+
+# tiny slack so float error doesn't leave a 0.0000001 hour sliver of driving
+EPSILON = 1e-9
+# a fuel stop this close to the end of a segment is done during the stop there instead
+FUEL_BOUNDARY_MILES = 1.0
+
+
+class _DriverState:
+    """
+    clocks the simulator tracks, all in hours since departure
+    - driven: driving since the last 10 hour rest (11 hour limit)
+    - window_start: when the current 14 hour window opened
+    - since_break: driving since the last 30+ minute interruption
+    - daily: on-duty hours per calendar day, for the rolling 70 hour / 8 day cycle
+    """
+
+    def __init__(self, start_hour, cycle_history, driven_today=0.0, on_duty_today=0.0, since_break=None):
+        self.start_hour = start_hour  # hour of day we depart at, for calendar day boundaries
+        self.driven = driven_today
+        self.window_start = -on_duty_today
+        self.since_break = driven_today if since_break is None else since_break
+        self.daily = {}
+        # cycle_history[0] is the departure day, [1] the day before, and so on
+        for days_ago, hours in enumerate(cycle_history[:WEEKLY_DAYS]):
+            self.daily[-days_ago] = float(hours)
+
+    def day_index(self, t):
+        return int(math.floor((self.start_hour + t) / 24 + EPSILON))
+
+    def add_on_duty(self, t, hours):
+        # book on-duty time to calendar days, splitting across midnight
+        while hours > EPSILON:
+            day = self.day_index(t)
+            day_end = (day + 1) * 24 - self.start_hour
+            portion = min(hours, day_end - t)
+            self.daily[day] = self.daily.get(day, 0.0) + portion
+            t += portion
+            hours -= portion
+
+    def cycle_used(self, t):
+        today = self.day_index(t)
+        return sum(self.daily.get(day, 0.0) for day in range(today - WEEKLY_DAYS + 1, today + 1))
+
+    def restart_cycle(self):
+        self.daily = {}
+
+    def rest(self, t_end):
+        self.driven = 0.0
+        self.since_break = 0.0
+        self.window_start = t_end
+
+
+class HOSSimulator:
+    """
+    event driven hours of service simulator
+
+    while driving, every limit that could end the current stretch (end of segment, next
+    fuel stop, 11 hour, 14 hour window, 30 minute break, 70 hour cycle) is an event at
+    the clock time it would happen. the earliest one is handled, which starts a
+    stop/break/rest, and the others are worked out again from the new state. cost is
+    O(events), independent of leg length, and rests land mid-segment wherever a limit
+    is actually hit
+    """
+
+    def __init__(self, route_data, current_hours=0.0, start_time=None, cycle_history=None,
+                 driven_today=0.0, on_duty_today=0.0, since_break=None, day_offset=0):
+        self.route_data = route_data
+        self.start_time = start_time or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start_hour = self.start_time.hour + self.start_time.minute / 60 + self.start_time.second / 3600
+        history = cycle_history if cycle_history is not None else [current_hours]
+        self.state = _DriverState(start_hour, history, driven_today, on_duty_today, since_break)
+        self.day_offset = day_offset  # days of the trip already behind us when re-planning
+
+        self.t = 0.0
+        self.position = 0.0  # miles from the start of the trip
+        self.schedule = []
+        self.rest_stops = []
+        self._index = None
+        self._segment_offsets = []
+        self._last_point = None  # (position, point), rest start / end and the driving after share a spot
+
+    # --- positions and labels -------------------------------------------------
+
+    def _route_index(self):
+        if self._index is None:
+            # numpy comes in with the index, not at import time
+            from utils.route_index import RouteIndex
+
+            self._index = RouteIndex.from_route(self.route_data)
+        return self._index
+
+    def _point_at(self, segment_index, at_segment_end=False):
+        segment = self.route_data["segments"][segment_index]
+        if at_segment_end:
+            return segment["to"]["address"], segment["to"]["latitude"], segment["to"]["longitude"]
+
+        offset = self._segment_offsets[segment_index]
+        if self.position - offset <= EPSILON:
+            return segment["from"]["address"], segment["from"]["latitude"], segment["from"]["longitude"]
+
+        if self._last_point is not None and self._last_point[0] == self.position:
+            return self._last_point[1]
+        point = self._route_index().locate(self.position)
+        label = f"Mile {self.position:.0f}, en route to {segment['to']['address']}"
+        self._last_point = (self.position, (label, point["latitude"], point["longitude"]))
+        return self._last_point[1]
+
+    # --- schedule -------------------------------------------------------------
+
+    def _clock(self, t):
+        return self.start_time + timedelta(hours=t)
+
+    def _record(self, status, place, note=None):
+        location, latitude, longitude = place
+        timestamp = self._clock(self.t).isoformat()
+        entry = ScheduleEntry(
+            day=self.state.day_index(self.t) - self.state.day_index(0) + 1 + self.day_offset,
+            time=timestamp[11:16],
+            timestamp=timestamp,
+            status=status,
+            location=location,
+            latitude=latitude,
+            longitude=longitude,
+            hours_driven=round(self.state.driven, 4),
+            hours_on_duty=round(max(0.0, self.t - self.state.window_start), 4),
+            weekly_hours=round(self.state.cycle_used(self.t), 4),
+            note=note or None
+        )
+        self.schedule.append(entry)
+        return entry
+
+    def _rest_stop(self, entry, hours, reason):
+        return RestStop(
+            day=entry.day,
+            location=entry.location,
+            latitude=entry.latitude,
+            longitude=entry.longitude,
+            duration=hours,
+            reason=reason,
+            start=entry.timestamp
+        )
+
+    def _off_duty(self, status, hours, place, reason):
+        entry = self._record(status, place, reason)
+        self.rest_stops.append(self._rest_stop(entry, hours, reason))
+        self.t += hours
+
+    def _on_duty(self, status, hours, place):
+        self._record(status, place)
+        self.state.add_on_duty(self.t, hours)
+        self.t += hours
+        if hours >= BREAK_HOURS - EPSILON:
+            # 30 minutes of not driving counts as the break, on duty or not
+            self.state.since_break = 0.0
+
+    def _take_rest(self, place, reason):
+        self._off_duty("Rest Start", REQUIRED_REST_HOURS, place, f"Required 10-hour rest period: {reason}")
+        self.state.rest(self.t)
+        self._record("Rest End", place)
+
+    def _take_restart(self, place):
+        self._off_duty("Rest Start", RESTART_HOURS, place, "34-hour restart: Exceeded 70-hour/8-day limit")
+        self.state.rest(self.t)
+        self.state.restart_cycle()
+        self._record("Rest End", place)
+
+    def _checkpoint(self, segment_index, remaining_hours, fuel_index):
+        # departure and the end of every rest, where the departure sweep memoizes the rest of the trip
+        pass
+
+    # --- main loop ------------------------------------------------------------
+
+    def run(self):
+        segments = self.route_data["segments"]
+        stops = self.route_data.get("stops", [])
+        fuel_miles = sorted(stop["distance_from_start"] for stop in self.route_data.get("fuel_stops", []))
+
+        offset = 0.0
+        for segment in segments:
+            self._segment_offsets.append(offset)
+            offset += segment["distance"]
+
+        self._record("Start", self._point_at(0) if segments else ("", None, None))
+
+        fuel_index = 0
+        driving = False
+        if segments:
+            self._checkpoint(0, segments[0]["duration"], 0)
+
+        for i, segment in enumerate(segments):
+            segment_end = self._segment_offsets[i] + segment["distance"]
+            speed = segment["distance"] / segment["duration"] if segment["duration"] > 0 else math.inf
+            remaining_hours = segment["duration"]
+
+            while remaining_hours > EPSILON:
+                used = self.state.cycle_used(self.t)
+                # the state can already be at a limit when a stretch starts (e.g. after a stop)
+                if self.state.driven >= MAX_DRIVING_HOURS - EPSILON:
+                    self._take_rest(self._point_at(i), "Exceeded 11-hour driving limit")
+                    self._checkpoint(i, remaining_hours, fuel_index)
+                    driving = False
+                    continue
+                if self.t - self.state.window_start >= MAX_ON_DUTY_WINDOW - EPSILON:
+                    self._take_rest(self._point_at(i), "Exceeded 14-hour on-duty limit")
+                    self._checkpoint(i, remaining_hours, fuel_index)
+                    driving = False
+                    continue
+                if used >= MAX_WEEKLY_HOURS - EPSILON:
+                    self._take_restart(self._point_at(i))
+                    self._checkpoint(i, remaining_hours, fuel_index)
+                    driving = False
+                    continue
+                if self.state.since_break >= BREAK_AFTER_DRIVING_HOURS - EPSILON:
+                    self._off_duty("Break", BREAK_HOURS, self._point_at(i), "30-minute break after 8 hours driving")
+                    self.state.since_break = 0.0
+                    driving = False
+                    continue
+
+                if not driving:
+                    self._record("Driving", self._point_at(i))
+                    driving = True
+
+                # every way this stretch of driving could end, at the clock time it would happen
+                candidates = [
+                    ("segment_end", self.t + remaining_hours),
+                    ("drive_limit", self.t + MAX_DRIVING_HOURS - self.state.driven),
+                    ("window_limit", self.state.window_start + MAX_ON_DUTY_WINDOW),
+                    ("break_due", self.t + BREAK_AFTER_DRIVING_HOURS - self.state.since_break),
+                    # conservative, days rolling off the cycle only push this later
+                    ("cycle_limit", self.t + MAX_WEEKLY_HOURS - used)
+                ]
+                if fuel_index < len(fuel_miles) and fuel_miles[fuel_index] < segment_end - FUEL_BOUNDARY_MILES and speed != math.inf:
+                    candidates.append(("fuel", self.t + max(0.0, fuel_miles[fuel_index] - self.position) / speed))
+                # only the earliest matters, the rest change once it's handled and are worked out again.
+                # ties go to the first listed, so a segment that ends right at a limit just ends
+                kind, at = min(candidates, key=lambda candidate: candidate[1])
+
+                hours = min(max(0.0, at - self.t), remaining_hours)
+                self.state.add_on_duty(self.t, hours)
+                self.state.driven += hours
+                self.state.since_break += hours
+                self.t += hours
+                remaining_hours -= hours
+                self.position = segment_end if remaining_hours <= EPSILON else self.position + hours * speed
+
+                if kind == "fuel":
+                    self._on_duty("Fuel", FUEL_STOP_HOURS, self._point_at(i))
+                    self.rest_stops.append(self._rest_stop(self.schedule[-1], FUEL_STOP_HOURS, "Fuel stop"))
+                    fuel_index += 1
+                    driving = False
+                # the limit kinds are handled by the checks at the top of the loop
+
+            self.position = segment_end
+            # fuel stops that fell exactly on the boundary are done at the stop
+            while fuel_index < len(fuel_miles) and fuel_miles[fuel_index] <= segment_end + FUEL_BOUNDARY_MILES:
+                fuel_index += 1
+
+            if i < len(stops) and stops[i]["type"] in ["pickup", "dropoff"]:
+                self._on_duty(stops[i]["type"].capitalize(), stops[i]["duration"], self._point_at(i, at_segment_end=True))
+                driving = False
+
+        end_place = self._point_at(len(segments) - 1, at_segment_end=True) if segments else ("", None, None)
+        self._record("End", end_place)
+
+        return {
+            "schedule": self.schedule,
+            "rest_stops": self.rest_stops,
+            "total_trip_days": self.schedule[-1].day,
+            "engine": "simulator",
+            "start_time": self.start_time.isoformat(),
+            "end_time": self._clock(self.t).isoformat(),
+            "total_hours": round(self.t, 4)
+        }
+
+
+def simulate_hos(route_data, current_hours=0.0, start_time=None, cycle_history=None,
+                 driven_today=0.0, on_duty_today=0.0, since_break=None, day_offset=0):
+    """
+    event-driven alternative to calculate_hos_compliance with real clock times
+
+    returns the same hos_plan shape (schedule, rest_stops, total_trip_days) where every
+    schedule entry also carries a timestamp and marks the start of that duty status.
+    since_break and day_offset are for resuming a trip in progress
+    """
+    simulator = HOSSimulator(route_data, current_hours, start_time, cycle_history, driven_today, on_duty_today,
+                             since_break, day_offset)
+    return simulator.run()
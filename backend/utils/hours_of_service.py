@@ -1,4 +1,8 @@
-def calculate_hos_compliance(route_data, current_hours):
+from models import ScheduleEntry, RestStop
+from utils.cycle_window import CycleWindow
+
+def calculate_hos_compliance(route_data, current_hours, driven_today=0, on_duty_today=None, start_day=1,
+                             cycle_history=None):
     """
     calculate hours of service compliance and necessary rest periods
 
@@ -6,6 +10,11 @@ def calculate_hos_compliance(route_data, current_hours):
     - 11-hour driving limit: drive a max of 11 hours after 10 hours off duty
     - 14-hour limit: no driving beyond the 14th consecutive hour after coming on duty
     - 70-hour limit in 8 days: no driving after 70 hours on duty in 8 consecutive days
+
+    driven_today, on_duty_today and start_day resume a trip in progress (re-planning),
+    on_duty_today defaults to current_hours like a fresh plan.
+    cycle_history is the driver's real on-duty hours per day, newest (today) first, used
+    instead of putting all of current_hours on today
     """
 
     MAX_DRIVING_HOURS = 11.0
@@ -22,32 +31,35 @@ def calculate_hos_compliance(route_data, current_hours):
     }
 
     # starting with current hrs used
-    hours_driven_today = 0
-    hours_on_duty_today = current_hours
+    hours_driven_today = driven_today
+    if cycle_history is not None:
+        current_hours = sum(cycle_history[:WEEKLY_DAYS])
+    if on_duty_today is None:
+        on_duty_today = cycle_history[0] if cycle_history else current_hours
+    hours_on_duty_today = on_duty_today
     total_hours_used = current_hours
-    current_day = 1
+    current_day = start_day
 
-    # hrs for the past 8 days
-    daily_hours = [0] * WEEKLY_DAYS
-    daily_hours[0] = current_hours
+    # hrs for the past 8 days, ring buffer with a running total
+    daily_hours = CycleWindow(WEEKLY_DAYS, cycle_history if cycle_history is not None else [current_hours])
 
     # currently weekly hrs total
-    weekly_hours_total = sum(daily_hours)
+    weekly_hours_total = daily_hours.total
 
     # process each segment
     current_location = route_data["segments"][0]["from"]["address"]
     schedule = []
 
     # appending the initial status
-    schedule.append({
-        "day": current_day,
-        "time": "00:00",  # this would be actual time in real app
-        "status": "Start",
-        "location": current_location,
-        "hours_driven": hours_driven_today,
-        "hours_on_duty": hours_on_duty_today,
-        "weekly_hours": weekly_hours_total
-    })
+    schedule.append(ScheduleEntry(
+        day=current_day,
+        time="00:00",  # this would be actual time in real app
+        status="Start",
+        location=current_location,
+        hours_driven=hours_driven_today,
+        hours_on_duty=hours_on_duty_today,
+        weekly_hours=weekly_hours_total
+    ))
 
     # processing route segments with stops
     for i, segment in enumerate(route_data["segments"]):
@@ -74,46 +86,47 @@ def calculate_hos_compliance(route_data, current_hours):
         if needs_rest:
             # take a rest
             rest_location = current_location
-            rest_stop = {
-                "day": current_day,
-                "location": rest_location,
-                "duration": REQUIRED_REST_HOURS,
-                "reason": f"Required 10-hour rest period: {rest_reason}"
-            }
+            rest_stop = RestStop(
+                day=current_day,
+                location=rest_location,
+                latitude=segment["from"]["latitude"],
+                longitude=segment["from"]["longitude"],
+                duration=REQUIRED_REST_HOURS,
+                reason=f"Required 10-hour rest period: {rest_reason}"
+            )
             hos_plan["rest_stops"].append(rest_stop)
 
-            schedule.append({
-                "day": current_day,
-                "time": "--:--",  # placeholder
-                "status": "Rest Start",
-                "location": rest_location,
-                "hours_driven": hours_driven_today,
-                "hours_on_duty": hours_on_duty_today,
-                "weekly_hours": weekly_hours_total
-            })
+            schedule.append(ScheduleEntry(
+                day=current_day,
+                time="--:--",  # placeholder
+                status="Rest Start",
+                location=rest_location,
+                hours_driven=hours_driven_today,
+                hours_on_duty=hours_on_duty_today,
+                weekly_hours=weekly_hours_total
+            ))
 
             # increment day
             current_day += 1
 
             # shift daily hrs arr when new day starts
-            daily_hours.pop()  # remove the oldest day
-            daily_hours.insert(0, 0)  # add new day with zero hrs
+            daily_hours.advance()  # new day with zero hrs, the oldest day drops out
 
             hours_driven_today = 0
             hours_on_duty_today = 0
 
             # recalculate weekly hrs total
-            weekly_hours_total = sum(daily_hours)
-
-            schedule.append({
-                "day": current_day,
-                "time": "00:00",  # placeholder
-                "status": "Rest End",
-                "location": rest_location,
-                "hours_driven": hours_driven_today,
-                "hours_on_duty": hours_on_duty_today,
-                "weekly_hours": weekly_hours_total
-            })
+            weekly_hours_total = daily_hours.total
+
+            schedule.append(ScheduleEntry(
+                day=current_day,
+                time="00:00",  # placeholder
+                status="Rest End",
+                location=rest_location,
+                hours_driven=hours_driven_today,
+                hours_on_duty=hours_on_duty_today,
+                weekly_hours=weekly_hours_total
+            ))
 
         # drive segment
         hours_driven_today += segment_hours
@@ -121,20 +134,20 @@ def calculate_hos_compliance(route_data, current_hours):
         total_hours_used += segment_hours
 
         # update daily and weekly hrs
-        daily_hours[0] += segment_hours
-        weekly_hours_total = sum(daily_hours)
+        daily_hours.add(segment_hours)
+        weekly_hours_total = daily_hours.total
 
         current_location = segment["to"]["address"]
 
-        schedule.append({
-            "day": current_day,
-            "time": "++:++",  # placeholder
-            "status": "Driving",
-            "location": current_location,
-            "hours_driven": hours_driven_today,
-            "hours_on_duty": hours_on_duty_today,
-            "weekly_hours": weekly_hours_total
-        })
+        schedule.append(ScheduleEntry(
+            day=current_day,
+            time="++:++",  # placeholder
+            status="Driving",
+            location=current_location,
+            hours_driven=hours_driven_today,
+            hours_on_duty=hours_on_duty_today,
+            weekly_hours=weekly_hours_total
+        ))
 
         # check for stops after this segment
         if i < len(route_data["stops"]) and route_data["stops"][i]["type"] in ["pickup", "dropoff"]:
@@ -155,84 +168,87 @@ def calculate_hos_compliance(route_data, current_hours):
             # if we need a rest break before stop
             if needs_rest_for_stop:
                 rest_location = current_location
-                rest_stop = {
-                    "day": current_day,
-                    "location": rest_location,
-                    "duration": REQUIRED_REST_HOURS,
-                    "reason": f"Required 10-hour rest period before stop: {stop_rest_reason}"
-                }
+                rest_stop = RestStop(
+                    day=current_day,
+                    location=rest_location,
+                    latitude=segment["to"]["latitude"],
+                    longitude=segment["to"]["longitude"],
+                    duration=REQUIRED_REST_HOURS,
+                    reason=f"Required 10-hour rest period before stop: {stop_rest_reason}"
+                )
                 hos_plan["rest_stops"].append(rest_stop)
 
-                schedule.append({
-                    "day": current_day,
-                    "time": "##:##",  # placeholder
-                    "status": "Rest Start",
-                    "location": rest_location,
-                    "hours_driven": hours_driven_today,
-                    "hours_on_duty": hours_on_duty_today,
-                    "weekly_hours": weekly_hours_total
-                })
+                schedule.append(ScheduleEntry(
+                    day=current_day,
+                    time="##:##",  # placeholder
+                    status="Rest Start",
+                    location=rest_location,
+                    hours_driven=hours_driven_today,
+                    hours_on_duty=hours_on_duty_today,
+                    weekly_hours=weekly_hours_total
+                ))
 
                 # increment day
                 current_day += 1
 
-                daily_hours.pop()
-                daily_hours.insert(0, 0)
+                daily_hours.advance()
 
                 hours_driven_today = 0
                 hours_on_duty_today = 0
 
 
-                weekly_hours_total = sum(daily_hours)
+                weekly_hours_total = daily_hours.total
 
-                schedule.append({
-                    "day": current_day,
-                    "time": "00:00",  # placeholder
-                    "status": "Rest End",
-                    "location": rest_location,
-                    "hours_driven": hours_driven_today,
-                    "hours_on_duty": hours_on_duty_today,
-                    "weekly_hours": weekly_hours_total
-                })
+                schedule.append(ScheduleEntry(
+                    day=current_day,
+                    time="00:00",  # placeholder
+                    status="Rest End",
+                    location=rest_location,
+                    hours_driven=hours_driven_today,
+                    hours_on_duty=hours_on_duty_today,
+                    weekly_hours=weekly_hours_total
+                ))
 
             # add the stop
             hours_on_duty_today += stop_duration
             total_hours_used += stop_duration
 
             # update daily and weekly hrs
-            daily_hours[0] += stop_duration
-            weekly_hours_total = sum(daily_hours)
-
-            schedule.append({
-                "day": current_day,
-                "time": "**:**",  # placeholder
-                "status": stop["type"].capitalize(),
-                "location": current_location,
-                "hours_driven": hours_driven_today,
-                "hours_on_duty": hours_on_duty_today,
-                "weekly_hours": weekly_hours_total
-            })
+            daily_hours.add(stop_duration)
+            weekly_hours_total = daily_hours.total
+
+            schedule.append(ScheduleEntry(
+                day=current_day,
+                time="**:**",  # placeholder
+                status=stop["type"].capitalize(),
+                location=current_location,
+                hours_driven=hours_driven_today,
+                hours_on_duty=hours_on_duty_today,
+                weekly_hours=weekly_hours_total
+            ))
 
     # address the fuel stops
     for fuel_stop in route_data["fuel_stops"]:
-        fuel_stop_entry = {
-            "day": current_day,  # placeholder
-            "location": fuel_stop["estimated_location"],
-            "duration": fuel_stop["duration"],
-            "reason": "Fuel stop"
-        }
+        fuel_stop_entry = RestStop(
+            day=current_day,  # placeholder
+            location=fuel_stop["estimated_location"],
+            latitude=fuel_stop.get("latitude"),
+            longitude=fuel_stop.get("longitude"),
+            duration=fuel_stop["duration"],
+            reason="Fuel stop"
+        )
         hos_plan["rest_stops"].append(fuel_stop_entry)
 
     # last schedule entry
-    schedule.append({
-        "day": current_day,
-        "time": "@@:@@",  # placeholder
-        "status": "End",
-        "location": current_location,
-        "hours_driven": hours_driven_today,
-        "hours_on_duty": hours_on_duty_today,
-        "weekly_hours": weekly_hours_total
-    })
+    schedule.append(ScheduleEntry(
+        day=current_day,
+        time="@@:@@",  # placeholder
+        status="End",
+        location=current_location,
+        hours_driven=hours_driven_today,
+        hours_on_duty=hours_on_duty_today,
+        weekly_hours=weekly_hours_total
+    ))
 
     hos_plan["schedule"] = schedule
     hos_plan["total_trip_days"] = current_day
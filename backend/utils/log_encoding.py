@@ -0,0 +1,114 @@
+import json
+import re
+
+# grid rows are 0 = off duty, 1 = sleeper berth, 2 = driving, 3 = on duty (not driving)
+GRID_FORMATS = ("intervals", "bitset")
+GRID_SLOTS = 96
+
+
+def grid_format_from_request(args, accept):
+    # ?grid_format=intervals|bitset, or Accept: application/json; grid=intervals
+    requested = (args.get("grid_format") or "").lower()
+    if not requested:
+        match = re.search(r"grid=(\w+)", accept or "")
+        requested = match.group(1).lower() if match else ""
+
+    if requested in ("", "full"):
+        return None
+    if requested not in GRID_FORMATS:
+        raise ValueError(f"Unknown grid_format: {requested}, expected one of {', '.join(GRID_FORMATS)}")
+    return requested
+
+
+def encode_grid_intervals(grid):
+    # runs of filled cells as [status_row, start_index, end_index), ordered by start
+    intervals = []
+    for row_index, row in enumerate(grid):
+        start = None
+        for i, cell in enumerate(row):
+            if cell and start is None:
+                start = i
+            elif not cell and start is not None:
+                intervals.append([row_index, start, i])
+                start = None
+        if start is not None:
+            intervals.append([row_index, start, len(row)])
+
+    intervals.sort(key=lambda interval: interval[1])
+    return intervals
+
+
+def decode_grid_intervals(intervals, rows=4, slots=GRID_SLOTS):
+    grid = [[0] * slots for _ in range(rows)]
+    for row_index, start, end in intervals:
+        grid[row_index][start:end] = [1] * (end - start)
+    return grid
+
+
+def encode_grid_bitset(grid):
+    # one hex string per status row, bit i (from the left) is slot i
+    rows = []
+    for row in grid:
+        value = 0
+        for cell in row:
+            value = (value << 1) | (1 if cell else 0)
+        rows.append(format(value, f"0{(len(row) + 3) // 4}x"))
+    return rows
+
+
+def decode_grid_bitset(rows, slots=GRID_SLOTS):
+    grid = []
+    for hex_row in rows:
+        bits = bin(int(hex_row, 16))[2:].zfill(len(hex_row) * 4)[-slots:]
+        grid.append([int(bit) for bit in bits])
+    return grid
+
+
+def encode_log_sheet(log_sheet, grid_format):
+    # shallow copy with the grid swapped for its compact form
+    encoder = encode_grid_intervals if grid_format == "intervals" else encode_grid_bitset
+    encoded = dict(log_sheet)
+    encoded["grid"] = encoder(log_sheet["grid"])
+    encoded["grid_format"] = grid_format
+    return encoded
+
+
+def _json_size(value):
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+class GridSavings:
+    # running json size of the raw grids against the encoded ones, one sheet at a time
+    def __init__(self, grid_format):
+        self.grid_format = grid_format
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+
+    def add(self, log_sheet, encoded):
+        self.raw_bytes += _json_size(log_sheet["grid"])
+        self.encoded_bytes += _json_size(encoded["grid"])
+
+    def to_dict(self):
+        return {
+            "format": self.grid_format,
+            "raw_grid_bytes": self.raw_bytes,
+            "encoded_grid_bytes": self.encoded_bytes,
+            "saved_bytes": self.raw_bytes - self.encoded_bytes,
+            "ratio": round(self.encoded_bytes / self.raw_bytes, 4) if self.raw_bytes else 1.0
+        }
+
+
+def encode_eld_logs(eld_logs, grid_format):
+    """
+    compact every day's grid, returns (encoded_logs, savings) where savings compares
+    the json size of the raw grids against the encoded ones
+    """
+    encoded_logs = []
+    savings = GridSavings(grid_format)
+
+    for log_sheet in eld_logs:
+        encoded = encode_log_sheet(log_sheet, grid_format)
+        savings.add(log_sheet, encoded)
+        encoded_logs.append(encoded)
+
+    return encoded_logs, savings.to_dict()
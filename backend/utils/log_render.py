@@ -0,0 +1,423 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+from xml.sax.saxutils import escape
+
+from models import DutyStatus, to_json
+from utils.cache import TTLCache
+from utils.log_encoding import decode_grid_intervals, decode_grid_bitset, GRID_SLOTS
+
+LOG_RENDER_CACHE_MAX_ENTRIES = int(os.environ.get('LOG_RENDER_CACHE_MAX_ENTRIES', 4096))
+LOG_RENDER_CACHE_MAX_BYTES = int(os.environ.get('LOG_RENDER_CACHE_MAX_BYTES', 32 * 1024 * 1024))  # 32mb
+RENDER_FORMATS = ("pdf", "svg")
+RENDER_CONTENT_TYPES = {"pdf": "application/pdf", "svg": "image/svg+xml"}
+
+# letter landscape in points, the svg uses the same units so both come from one layout
+# y runs down the page like svg, the pdf side flips it
+PAGE_WIDTH = 792
+PAGE_HEIGHT = 612
+MARGIN = 36
+GRID_LEFT = 110
+GRID_TOP = 110
+SLOT_WIDTH = 6
+ROW_HEIGHT = 24
+GRID_RIGHT = GRID_LEFT + GRID_SLOTS * SLOT_WIDTH
+GRID_BOTTOM = GRID_TOP + len(DutyStatus) * ROW_HEIGHT
+TOTALS_RIGHT = PAGE_WIDTH - MARGIN
+REMARKS_TOP = 250
+REMARK_HEIGHT = 13
+MAX_REMARKS = (PAGE_HEIGHT - MARGIN - REMARKS_TOP - 40) // REMARK_HEIGHT
+MAX_LOCATION_CHARS = 95
+
+ROW_LABELS = {
+    DutyStatus.OFF_DUTY: "Off Duty",
+    DutyStatus.SLEEPER_BERTH: "Sleeper Berth",
+    DutyStatus.DRIVING: "Driving",
+    DutyStatus.ON_DUTY_NOT_DRIVING: "On Duty"
+}
+DUTY_LINE_COLOR = (0.1, 0.25, 0.7)
+
+
+def parse_log_sheets(logs):
+    """
+    eld_logs as /api/plan returns them, compact grids (grid_format) included, as plain
+    dicts with a 4 x 96 grid. ValueError names the first bad sheet
+    """
+    if not isinstance(logs, list) or not logs:
+        raise ValueError("eld_logs must be a non-empty list")
+
+    sheets = []
+    for index, log in enumerate(logs):
+        if not isinstance(log, dict) or "grid" not in log:
+            raise ValueError(f"eld_logs[{index}] needs a grid")
+        grid = log["grid"]
+        try:
+            if log.get("grid_format") == "intervals":
+                grid = decode_grid_intervals(grid)
+            elif log.get("grid_format") == "bitset":
+                grid = decode_grid_bitset(grid)
+            grid = [[1 if cell else 0 for cell in row] for row in grid]
+        except (TypeError, ValueError, IndexError):
+            raise ValueError(f"eld_logs[{index}] has an unreadable grid")
+        if len(grid) != len(DutyStatus) or any(len(row) != GRID_SLOTS for row in grid):
+            raise ValueError(f"eld_logs[{index}] grid must be {len(DutyStatus)} rows of {GRID_SLOTS} slots")
+
+        hours = log.get("hours") or {}
+        try:
+            sheets.append({
+                "day": log.get("day", index + 1),
+                "date": str(log.get("date") or ""),
+                "grid": grid,
+                "hours": {status.value: float(hours.get(status.value) or 0) for status in DutyStatus},
+                "locations": [
+                    {"time": str(item.get("time") or ""), "status": str(item.get("status") or ""),
+                     "location": str(item.get("location") or "")}
+                    for item in log.get("locations") or []
+                ],
+                "total_hours": float(log.get("total_hours") or 0)
+            })
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError(f"eld_logs[{index}] has unreadable hours or locations")
+    return sheets
+
+
+def sheet_digest(sheet):
+    # what's drawn from a day's content, the day number and date aren't in it so identical days share it
+    content = [sheet["grid"], sheet["hours"], sheet["locations"], sheet["total_hours"]]
+    data = json.dumps(content, separators=(",", ":"), sort_keys=True, default=to_json)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# --- layout ---------------------------------------------------------------------
+# both formats draw the same ops:
+# ("line", x1, y1, x2, y2, width, gray), ("rect", x, y, w, h, width, gray),
+# ("text", x, y, size, text, anchor, bold), ("path", [(x, y), ...], width, rgb)
+
+def _template_ops():
+    # everything that's the same on every sheet
+    ops = [
+        ("text", MARGIN, 52, 16, "Driver's Daily Log (24 hours)", "start", True),
+        ("text", MARGIN, 78, 10, "Date:", "start", True),
+        ("text", 250, 78, 10, "Trip day:", "start", True),
+        ("text", TOTALS_RIGHT, GRID_TOP - 6, 8, "Hours", "end", True),
+        ("rect", GRID_LEFT, GRID_TOP, GRID_RIGHT - GRID_LEFT, GRID_BOTTOM - GRID_TOP, 1, 0)
+    ]
+    for hour in range(25):
+        x = GRID_LEFT + hour * 4 * SLOT_WIDTH
+        ops.append(("text", x, GRID_TOP - 6, 7, "M" if hour == 24 else f"{hour:02d}", "middle", False))
+        if 0 < hour < 24:
+            ops.append(("line", x, GRID_TOP, x, GRID_BOTTOM, 0.75, 0.3))
+
+    for status in DutyStatus:
+        top = GRID_TOP + status.row * ROW_HEIGHT
+        ops.append(("text", MARGIN, top + ROW_HEIGHT / 2 + 3, 9, ROW_LABELS[status], "start", False))
+        if status.row:
+            ops.append(("line", GRID_LEFT, top, GRID_RIGHT, top, 0.75, 0.3))
+        # quarter hour ticks hanging from the top of each row, the half hour one longer
+        for slot in range(1, GRID_SLOTS):
+            if slot % 4:
+                x = GRID_LEFT + slot * SLOT_WIDTH
+                ops.append(("line", x, top, x, top + (8 if slot % 4 == 2 else 4), 0.5, 0.5))
+
+    ops += [
+        ("line", GRID_RIGHT + 8, GRID_BOTTOM + 4, TOTALS_RIGHT, GRID_BOTTOM + 4, 0.5, 0),
+        ("text", GRID_RIGHT + 8, GRID_BOTTOM + 16, 8, "Total", "start", True),
+        ("text", MARGIN, REMARKS_TOP, 11, "Remarks", "start", True),
+        ("text", MARGIN, REMARKS_TOP + 18, 8, "Time", "start", True),
+        ("text", MARGIN + 50, REMARKS_TOP + 18, 8, "Status", "start", True),
+        ("text", MARGIN + 150, REMARKS_TOP + 18, 8, "Location", "start", True),
+        ("line", MARGIN, REMARKS_TOP + 22, TOTALS_RIGHT, REMARKS_TOP + 22, 0.5, 0)
+    ]
+    return ops
+
+
+def _duty_line(grid):
+    # the duty status line through the grid, one path per unbroken stretch of logged slots
+    runs = []
+    for slot in range(GRID_SLOTS):
+        row = next((row for row in range(len(grid)) if grid[row][slot]), None)
+        if runs and runs[-1][0] == row and runs[-1][2] == slot:
+            runs[-1][2] = slot + 1
+        else:
+            runs.append([row, slot, slot + 1])
+
+    paths = []
+    previous = None
+    for row, start, end in runs:
+        if row is None:
+            previous = None
+            continue
+        y = GRID_TOP + (row + 0.5) * ROW_HEIGHT
+        x_start, x_end = GRID_LEFT + start * SLOT_WIDTH, GRID_LEFT + end * SLOT_WIDTH
+        if previous is not None and previous[2] == start:
+            paths[-1] += [(x_start, y), (x_end, y)]
+        else:
+            paths.append([(x_start, y), (x_end, y)])
+        previous = (row, start, end)
+    return [("path", points, 2, DUTY_LINE_COLOR) for points in paths]
+
+
+def _body_ops(sheet):
+    # a day's own drawing: duty line, totals and remarks
+    ops = _duty_line(sheet["grid"])
+    for status in DutyStatus:
+        y = GRID_TOP + status.row * ROW_HEIGHT + ROW_HEIGHT / 2 + 3
+        ops.append(("text", TOTALS_RIGHT, y, 9, f"{sheet['hours'][status.value]:.2f}", "end", False))
+    ops.append(("text", TOTALS_RIGHT, GRID_BOTTOM + 16, 9, f"{sheet['total_hours']:.2f}", "end", True))
+
+    locations = sheet["locations"]
+    shown = locations if len(locations) <= MAX_REMARKS else locations[:MAX_REMARKS - 1]
+    y = REMARKS_TOP + 22
+    for item in shown:
+        y += REMARK_HEIGHT
+        location = item["location"]
+        if len(location) > MAX_LOCATION_CHARS:
+            location = location[:MAX_LOCATION_CHARS - 3] + "..."
+        ops += [
+            ("text", MARGIN, y, 8, item["time"], "start", False),
+            ("text", MARGIN + 50, y, 8, item["status"], "start", False),
+            ("text", MARGIN + 150, y, 8, location, "start", False)
+        ]
+    if len(shown) < len(locations):
+        ops.append(("text", MARGIN, y + REMARK_HEIGHT, 8, f"... {len(locations) - len(shown)} more", "start", False))
+    return ops
+
+
+def _header_ops(sheet, page, pages):
+    # the only per-page part that isn't keyed by content, so it's never cached
+    return [
+        ("text", MARGIN + 32, 78, 10, sheet["date"], "start", False),
+        ("text", 302, 78, 10, str(sheet["day"]), "start", False),
+        ("text", TOTALS_RIGHT, PAGE_HEIGHT - MARGIN + 14, 8, f"Page {page} of {pages}", "end", False)
+    ]
+
+
+# --- svg ------------------------------------------------------------------------
+
+def _n(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def _svg_gray(gray):
+    level = round(gray * 255)
+    return f"#{level:02x}{level:02x}{level:02x}"
+
+
+def _svg(ops):
+    parts = []
+    for op in ops:
+        kind = op[0]
+        if kind == "line":
+            _, x1, y1, x2, y2, width, gray = op
+            parts.append(f'<line x1="{_n(x1)}" y1="{_n(y1)}" x2="{_n(x2)}" y2="{_n(y2)}" '
+                         f'stroke="{_svg_gray(gray)}" stroke-width="{_n(width)}"/>')
+        elif kind == "rect":
+            _, x, y, w, h, width, gray = op
+            parts.append(f'<rect x="{_n(x)}" y="{_n(y)}" width="{_n(w)}" height="{_n(h)}" fill="none" '
+                         f'stroke="{_svg_gray(gray)}" stroke-width="{_n(width)}"/>')
+        elif kind == "text":
+            _, x, y, size, text, anchor, bold = op
+            attributes = f' text-anchor="{anchor}"' if anchor != "start" else ""
+            attributes += ' font-weight="bold"' if bold else ""
+            parts.append(f'<text x="{_n(x)}" y="{_n(y)}" font-size="{_n(size)}"{attributes}>{escape(text)}</text>')
+        else:
+            _, points, width, (r, g, b) = op
+            path = " ".join(f"{_n(x)},{_n(y)}" for x, y in points)
+            parts.append(f'<polyline points="{path}" fill="none" stroke="rgb({round(r * 255)},{round(g * 255)},{round(b * 255)})" '
+                         f'stroke-width="{_n(width)}" stroke-linejoin="round"/>')
+    return "".join(parts)
+
+
+# --- pdf ------------------------------------------------------------------------
+
+# helvetica advance widths (1/1000 em) for what sheets right-align or center, digits
+# and punctuation are exact, letters a rough average
+_WIDTHS = {**{digit: 556 for digit in "0123456789"}, ".": 278, ":": 278, " ": 278, "-": 333, "M": 833}
+
+
+def _text_width(text, size, bold=False):
+    width = sum(_WIDTHS.get(char, 667 if char.isupper() else 556) for char in text)
+    return width * size / 1000 * (1.05 if bold else 1)
+
+
+def _pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf(ops):
+    lines = []
+    for op in ops:
+        kind = op[0]
+        if kind == "line":
+            _, x1, y1, x2, y2, width, gray = op
+            lines.append(f"{_n(gray)} G {_n(width)} w {_n(x1)} {_n(PAGE_HEIGHT - y1)} m {_n(x2)} {_n(PAGE_HEIGHT - y2)} l S")
+        elif kind == "rect":
+            _, x, y, w, h, width, gray = op
+            lines.append(f"{_n(gray)} G {_n(width)} w {_n(x)} {_n(PAGE_HEIGHT - y - h)} {_n(w)} {_n(h)} re S")
+        elif kind == "text":
+            _, x, y, size, text, anchor, bold = op
+            if anchor != "start":
+                x -= _text_width(text, size, bold) / (2 if anchor == "middle" else 1)
+            font = "F2" if bold else "F1"
+            lines.append(f"BT /{font} {_n(size)} Tf {_n(x)} {_n(PAGE_HEIGHT - y)} Td ({_pdf_text(text)}) Tj ET")
+        else:
+            _, points, width, (r, g, b) = op
+            (x, y), rest = points[0], points[1:]
+            path = " ".join(f"{_n(px)} {_n(PAGE_HEIGHT - py)} l" for px, py in rest)
+            lines.append(f"{_n(r)} {_n(g)} {_n(b)} RG {_n(width)} w 1 j {_n(x)} {_n(PAGE_HEIGHT - y)} m {path} S")
+    # the standard fonts take winansi, anything outside it prints as ?
+    return ("\n".join(lines) + "\n").encode("cp1252", "replace")
+
+
+def _pdf_stream(data, extra=""):
+    compressed = zlib.compress(data, 6)
+    return b"".join([
+        f"<< /Length {len(compressed)} /Filter /FlateDecode{extra} >>\nstream\n".encode("ascii"),
+        compressed,
+        b"\nendstream"
+    ])
+
+
+# --- cached parts -----------------------------------------------------------------
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def _template(fmt):
+    """
+    the static sheet drawn once per process: an svg group every page <use>s, or the pdf
+    form xobject every page draws with one Do
+    """
+    template = _templates.get(fmt)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(fmt)
+            if template is None:
+                ops = _template_ops()
+                if fmt == "svg":
+                    template = (f'<defs><g id="sheet"><rect width="{PAGE_WIDTH}" height="{PAGE_HEIGHT}" fill="#fff"/>'
+                                f'{_svg(ops)}</g></defs>')
+                else:
+                    template = _pdf_stream(
+                        _pdf(ops),
+                        f" /Type /XObject /Subtype /Form /BBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}]"
+                        " /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >>"
+                    )
+                _templates[fmt] = template
+    return template
+
+
+class RenderCache:
+    # rendered day bodies by (content hash, format), an svg fragment or a compressed pdf stream
+    def __init__(self, max_entries=LOG_RENDER_CACHE_MAX_ENTRIES, max_bytes=LOG_RENDER_CACHE_MAX_BYTES):
+        self.bodies = TTLCache(max_entries=max_entries, max_bytes=max_bytes, size_fn=len)
+
+    def body(self, sheet, fmt, digest=None):
+        key = (digest or sheet_digest(sheet), fmt)
+        body = self.bodies.get(key)
+        if body is None:
+            ops = _body_ops(sheet)
+            body = _svg(ops) if fmt == "svg" else _pdf_stream(_pdf(ops))
+            self.bodies.set(key, body)
+        return body
+
+    def clear(self):
+        self.bodies.clear()
+
+    def stats(self):
+        return self.bodies.stats()
+
+
+render_cache = RenderCache()
+
+
+# --- documents ------------------------------------------------------------------
+
+def iter_svg(sheets, cache=render_cache):
+    """
+    one svg with a page per day stacked top to bottom, yielded a page at a time. the
+    sheet template sits in <defs> once and every page <use>s it
+    """
+    pages = len(sheets)
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{PAGE_WIDTH}" height="{PAGE_HEIGHT * pages}" '
+           f'viewBox="0 0 {PAGE_WIDTH} {PAGE_HEIGHT * pages}" font-family="Helvetica, Arial, sans-serif">'
+           f'{_template("svg")}')
+    for page, sheet in enumerate(sheets, 1):
+        yield (f'<g transform="translate(0,{PAGE_HEIGHT * (page - 1)})"><use href="#sheet"/>'
+               f'{_svg(_header_ops(sheet, page, pages))}{cache.body(sheet, "svg")}</g>')
+    yield "</svg>\n"
+
+
+def iter_pdf(sheets, cache=render_cache):
+    """
+    a minimal pdf 1.4, yielded a page at a time: the objects are numbered as they're
+    written and the page tree, catalog and xref table only come at the end, which pdf
+    allows. the sheet template is one form xobject, and days with the same content
+    point at the same body stream
+    objects: 1 catalog, 2 page tree, 3-4 fonts, 5 template, then per page its header
+    stream, its body stream (unless an identical day already wrote it) and the page
+    """
+    offsets = {}
+    position = 0
+    pages = len(sheets)
+
+    def write(number, body):
+        nonlocal position
+        offsets[number] = position
+        data = f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+        position += len(data)
+        return data
+
+    head = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    position = len(head)
+    chunk = [
+        head,
+        write(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"),
+        write(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"),
+        write(5, _template("pdf"))
+    ]
+    yield b"".join(chunk)
+
+    next_number = 6
+    kids = []
+    bodies = {}  # content hash -> body stream object
+    for page, sheet in enumerate(sheets, 1):
+        chunk = []
+        header = next_number
+        header_data = b"q /Sheet Do Q\n" + _pdf(_header_ops(sheet, page, pages))
+        chunk.append(write(header, f"<< /Length {len(header_data)} >>\nstream\n".encode("ascii") + header_data + b"endstream"))
+        next_number += 1
+
+        digest = sheet_digest(sheet)
+        if digest not in bodies:
+            bodies[digest] = next_number
+            chunk.append(write(next_number, cache.body(sheet, "pdf", digest)))
+            next_number += 1
+
+        chunk.append(write(next_number, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}]"
+            " /Resources << /Font << /F1 3 0 R /F2 4 0 R >> /XObject << /Sheet 5 0 R >> >>"
+            f" /Contents [{header} 0 R {bodies[digest]} 0 R] >>"
+        ).encode("ascii")))
+        kids.append(next_number)
+        next_number += 1
+        yield b"".join(chunk)
+
+    chunk = [
+        write(2, f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode("ascii")),
+        write(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    ]
+    xref_at = position
+    xref = [f"xref\n0 {next_number}\n", "0000000000 65535 f \n"]
+    xref += [f"{offsets[number]:010d} 00000 n \n" for number in range(1, next_number)]
+    xref.append(f"trailer\n<< /Size {next_number} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n")
+    chunk.append("".join(xref).encode("ascii"))
+    yield b"".join(chunk)
+
+
+def render_logs(sheets, fmt, cache=render_cache):
+    # chunks of the rendered document, for streaming or joining
+    return iter_pdf(sheets, cache) if fmt == "pdf" else (part.encode("utf-8") for part in iter_svg(sheets, cache))
@@ -0,0 +1,156 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds, covers a cache hit through a slow nominatim lookup behind the rate limiter
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# past this many spans the Server-Timing header sums them per stage
+MAX_TIMING_ENTRIES = 24
+
+# spans of the request being handled, copied into pool threads with the rest of the context
+_spans = contextvars.ContextVar("timing_spans", default=None)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_text(labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_label_text(labels + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(labels)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram("eld_plan_stage_seconds", "Time spent in each planning stage")
+REQUEST_SECONDS = Histogram("eld_http_request_seconds", "Request latency by endpoint")
+UPSTREAM_ERRORS = Counter("eld_upstream_errors_total", "Failed calls to an upstream api")
+COALESCED_CALLS = Counter("eld_upstream_coalesced_total", "Lookups that waited on an identical in-flight call instead of making their own")
+ROUTE_FALLBACKS = Counter("eld_route_fallbacks_total", "Legs answered without mapbox, by where the answer came from")
+
+
+def start_timing():
+    # fresh span list for the current request
+    spans = []
+    _spans.set(spans)
+    return spans
+
+
+def current_spans():
+    return _spans.get() or []
+
+
+@contextmanager
+def span(stage):
+    # time a block, it goes into the stage histogram and the current request's spans
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def server_timing(spans, total=None):
+    """
+    Server-Timing header value. repeated stages (one fetch_route per leg) are listed one
+    by one, unless there are so many (batches) that they're summed per stage instead
+    """
+    if len(spans) <= MAX_TIMING_ENTRIES:
+        entries = [f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in spans]
+    else:
+        totals = {}
+        for stage, elapsed in spans:
+            count, stage_total = totals.get(stage, (0, 0.0))
+            totals[stage] = (count + 1, stage_total + elapsed)
+        entries = [f'{stage};desc="{count} calls";dur={stage_total * 1000:.2f}'
+                   for stage, (count, stage_total) in totals.items()]
+
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def gauge_lines(name, help_text, samples):
+    # samples is a list of (labels dict, value), values that are None are left out
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        if value is not None:
+            lines.append(f"{name}{_label_text(tuple(sorted(labels.items())))} {_number(value)}")
+    return lines
+
+
+def render_metrics(gauges=()):
+    # prometheus text exposition format
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for gauge in gauges:
+        lines.extend(gauge)
+    return "\n".join(lines) + "\n"
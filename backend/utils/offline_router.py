@@ -0,0 +1,241 @@
+import heapq
+import json
+import math
+import os
+import sys
+import threading
+
+import numpy as np
+
+from utils.cache import TTLCache
+from utils.route_index import haversine_miles
+
+OFFLINE_ROUTER_GRAPH = os.environ.get('OFFLINE_ROUTER_GRAPH', '')
+# how far an origin/destination may be from the nearest graph node before we give up
+OFFLINE_MAX_SNAP_MILES = float(os.environ.get('OFFLINE_MAX_SNAP_MILES', 25))
+# speed used for the off-network bit between the point and its snapped node
+OFFLINE_ACCESS_SPEED = float(os.environ.get('OFFLINE_ACCESS_SPEED', 30))
+DEFAULT_EDGE_SPEED = 55.0
+
+
+class NoRouteFound(Exception):
+    pass
+
+
+class RoadGraph:
+    """
+    preprocessed road graph loaded from a json file
+
+    {
+        "nodes": [[lat, lon], ...],                     # node id is the position in this list
+        "edges": [[from, to, miles, mph, oneway], ...]  # mph and oneway are optional
+    }
+
+    shortest-time queries use a* with a straight-line / top-speed heuristic, which never
+    overestimates so the result is the true fastest path through the graph
+    """
+
+    def __init__(self, nodes, edges):
+        self.lat = np.array([node[0] for node in nodes], dtype=float)
+        self.lon = np.array([node[1] for node in nodes], dtype=float)
+        self._lat_rad = np.radians(self.lat)
+        self._lon_rad = np.radians(self.lon)
+        # repeated lanes snap to the same node pair, so remember the searches
+        self._paths = TTLCache(max_entries=int(os.environ.get('OFFLINE_PATH_CACHE_SIZE', 4096)))
+
+        # plain python lists for the search loop, numpy scalars are slow to pull out one by one
+        self.adjacency = [[] for _ in nodes]
+        self.max_speed = 1.0
+        for edge in edges:
+            source, target, miles = int(edge[0]), int(edge[1]), float(edge[2])
+            mph = float(edge[3]) if len(edge) > 3 and edge[3] else DEFAULT_EDGE_SPEED
+            oneway = bool(edge[4]) if len(edge) > 4 else False
+            hours = miles / mph
+            self.max_speed = max(self.max_speed, mph)
+            self.adjacency[source].append((target, hours, miles))
+            if not oneway:
+                self.adjacency[target].append((source, hours, miles))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["nodes"], data["edges"])
+
+    def __len__(self):
+        return len(self.adjacency)
+
+    def nearest_node(self, point):
+        # linear numpy scan, a few ms even for a national highway extract
+        distances = haversine_miles(
+            math.radians(point["latitude"]), math.radians(point["longitude"]),
+            self._lat_rad, self._lon_rad
+        )
+        node = int(np.argmin(distances))
+        return node, float(distances[node])
+
+    def _straight_miles(self, a, b):
+        lat1, lon1, lat2, lon2 = self._lat_rad[a], self._lon_rad[a], self._lat_rad[b], self._lon_rad[b]
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * 3958.7613 * math.asin(min(1.0, math.sqrt(h)))
+
+    def shortest_path(self, source, target):
+        # a* on travel time, returns (node path, hours, miles)
+        if source == target:
+            return [source], 0.0, 0.0
+
+        cached = self._paths.get((source, target))
+        if cached is not None:
+            return cached
+
+        result = self._search(source, target)
+        self._paths.set((source, target), result)
+        return result
+
+    def _search(self, source, target):
+        best = {source: 0.0}
+        miles_to = {source: 0.0}
+        previous = {}
+        queue = [(self._straight_miles(source, target) / self.max_speed, 0.0, source)]
+        closed = set()
+
+        while queue:
+            _, hours, node = heapq.heappop(queue)
+            if node == target:
+                path = [node]
+                while node in previous:
+                    node = previous[node]
+                    path.append(node)
+                path.reverse()
+                return path, hours, miles_to[target]
+
+            if node in closed:
+                continue
+            closed.add(node)
+
+            for neighbor, edge_hours, edge_miles in self.adjacency[node]:
+                candidate = hours + edge_hours
+                if candidate < best.get(neighbor, math.inf):
+                    best[neighbor] = candidate
+                    miles_to[neighbor] = miles_to[node] + edge_miles
+                    previous[neighbor] = node
+                    estimate = candidate + self._straight_miles(neighbor, target) / self.max_speed
+                    heapq.heappush(queue, (estimate, candidate, neighbor))
+
+        raise NoRouteFound("No path between the snapped nodes")
+
+    def route(self, origin, destination):
+        # same shape fetch_route returns, plus the snapped access legs at either end
+        source, source_snap = self.nearest_node(origin)
+        target, target_snap = self.nearest_node(destination)
+        if source_snap > OFFLINE_MAX_SNAP_MILES or target_snap > OFFLINE_MAX_SNAP_MILES:
+            raise NoRouteFound("Origin or destination is too far from the road graph")
+
+        path, hours, miles = self.shortest_path(source, target)
+
+        coordinates = [[origin["longitude"], origin["latitude"]]]
+        coordinates += [[float(self.lon[node]), float(self.lat[node])] for node in path]
+        coordinates.append([destination["longitude"], destination["latitude"]])
+
+        access_miles = source_snap + target_snap
+        return {
+            "distance": miles + access_miles,
+            "duration": hours + access_miles / OFFLINE_ACCESS_SPEED,
+            "geometry": {
+                "type": "LineString",
+                "coordinates": coordinates
+            },
+            "steps": [],
+            "source": "offline"
+        }
+
+
+_graph = None
+_graph_error = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    # loaded on first use so cold starts don't pay for it, None when not configured
+    global _graph, _graph_error
+    if _graph is not None or not OFFLINE_ROUTER_GRAPH:
+        return _graph
+
+    with _graph_lock:
+        if _graph is None and _graph_error is None:
+            try:
+                _graph = RoadGraph.load(OFFLINE_ROUTER_GRAPH)
+            except (OSError, ValueError, KeyError) as e:
+                # don't retry a broken file on every request
+                _graph_error = str(e)
+    return _graph
+
+
+def offline_route(origin, destination):
+    graph = get_graph()
+    if graph is None:
+        raise NoRouteFound(_graph_error or "Offline router has no graph configured")
+    return graph.route(origin, destination)
+
+
+def offline_router_status():
+    return {
+        "graph": OFFLINE_ROUTER_GRAPH or None,
+        "loaded": _graph is not None,
+        "nodes": len(_graph) if _graph is not None else 0,
+        "path_cache": _graph._paths.stats() if _graph is not None else None,
+        "error": _graph_error
+    }
+
+
+def build_graph_from_geojson(geojson, precision=5):
+    """
+    turn a geojson FeatureCollection of LineStrings (a highway extract) into the graph
+    file format, vertices that round to the same coordinate become the same node
+    properties.maxspeed (mph) and properties.oneway are used when present
+    """
+    node_ids = {}
+    nodes = []
+    edges = []
+
+    def node_for(lon, lat):
+        key = (round(lat, precision), round(lon, precision))
+        if key not in node_ids:
+            node_ids[key] = len(nodes)
+            nodes.append([key[0], key[1]])
+        return node_ids[key]
+
+    for feature in geojson["features"]:
+        geometry = feature.get("geometry") or {}
+        properties = feature.get("properties") or {}
+        lines = geometry.get("coordinates", [])
+        if geometry.get("type") == "LineString":
+            lines = [lines]
+        elif geometry.get("type") != "MultiLineString":
+            continue
+
+        mph = float(properties.get("maxspeed") or DEFAULT_EDGE_SPEED)
+        oneway = properties.get("oneway") in (True, "yes", "1", 1)
+
+        for line in lines:
+            for (lon1, lat1), (lon2, lat2) in zip(line, line[1:]):
+                a, b = node_for(lon1, lat1), node_for(lon2, lat2)
+                if a == b:
+                    continue
+                miles = float(haversine_miles(*np.radians([lat1, lon1, lat2, lon2])))
+                edges.append([a, b, round(miles, 4), mph, int(oneway)])
+
+    return {"nodes": nodes, "edges": edges}
+
+
+if __name__ == '__main__':
+    # python -m utils.offline_router highways.geojson road_graph.json
+    if len(sys.argv) != 3:
+        print("usage: python -m utils.offline_router <input.geojson> <output.json>")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        graph = build_graph_from_geojson(json.load(f))
+    with open(sys.argv[2], "w") as f:
+        json.dump(graph, f, separators=(",", ":"))
+    print(f"Wrote {len(graph['nodes'])} nodes and {len(graph['edges'])} edges to {sys.argv[2]}")
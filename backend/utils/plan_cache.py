@@ -0,0 +1,140 @@
+import hashlib
+import os
+import threading
+from datetime import date
+
+from utils.cache import TTLCache
+from utils.geocode_cache import normalize_location_key
+
+PLAN_CACHE_MAX_ENTRIES = int(os.environ.get('PLAN_CACHE_MAX_ENTRIES', 256))
+PLAN_CACHE_TTL = float(os.environ.get('PLAN_CACHE_TTL', 10 * 60))  # 10 minutes
+PLAN_CACHE_MAX_BYTES = int(os.environ.get('PLAN_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64mb
+
+
+def plan_key(trip, options, default_engine):
+    """
+    everything that changes the response body: the normalized trip, the hos engine
+    and the output options. a simulator plan with no departure_time starts at today's
+    midnight, so the date goes in the key too. a driver's stored duty history goes in
+    as the per-day hours the plan was built from. a multi-stop trip is keyed by its
+    stops in the order given and whether they get reordered
+    """
+    engine = trip.get('hos_engine') or default_engine
+    departure = trip.get('departure_time')
+    if engine == 'simulator' and not departure:
+        departure = date.today().isoformat()
+
+    if trip.get('stops') is not None:
+        stops = tuple(
+            (normalize_location_key(stop['location']), str(stop['type']).lower(), stop.get('duration'),
+             None if stop.get('load') is None else str(stop['load']))
+            for stop in trip['stops']
+        ) + (bool(trip.get('optimize_stops')),)
+    else:
+        stops = (normalize_location_key(trip['pickup_location']), normalize_location_key(trip['dropoff_location']))
+
+    return (
+        normalize_location_key(trip['current_location']),
+        stops,
+        float(trip['current_hours']),
+        tuple(trip.get('cycle_history') or ()),
+        engine,
+        departure,
+        tuple(sorted((options or {}).items()))
+    )
+
+
+def etag_for(body):
+    # strong etag, the exact bytes of the response
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class CachedPlan:
+    __slots__ = ("body", "etag", "headers", "legs", "plan_id")
+
+    def __init__(self, body, headers, legs, plan_id=None):
+        self.body = body
+        self.etag = etag_for(body)
+        self.headers = headers
+        self.legs = legs
+        self.plan_id = plan_id
+
+
+class PlanCache:
+    """
+    serialized /api/plan responses keyed by plan_key
+
+    a plan is only as fresh as the legs it was built from, so each entry lives no longer
+    than the route cache entries of its legs, and is dropped as soon as one of them is
+    evicted, expires or is cleared from the route cache
+    """
+
+    def __init__(self, route_cache, max_entries=PLAN_CACHE_MAX_ENTRIES, ttl=PLAN_CACHE_TTL,
+                 max_bytes=PLAN_CACHE_MAX_BYTES):
+        self.route_cache = route_cache
+        self.plans = TTLCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes, size_fn=lambda plan: len(plan.body))
+        self._plans_by_leg = {}  # route cache key -> plan keys built from it
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+        self.plans.add_listener(self._plan_removed)
+        route_cache.routes.add_listener(self._leg_removed)
+        route_cache.fallbacks.add_listener(self._leg_removed)
+
+    def get(self, key):
+        return self.plans.get(key)
+
+    def set(self, key, body, headers, route_data, plan_id=None):
+        """
+        returns the CachedPlan, which is only stored when every leg it was built from is
+        still in the route cache. offline router legs are never cached, a trip made only
+        of them has nothing to tie it to and is kept until evicted (or PLAN_CACHE_TTL)
+        """
+        segments = route_data["segments"]
+        legs = [self.route_cache.key(segment["from"], segment["to"]) for segment in segments]
+        plan = CachedPlan(body, headers, legs, plan_id)
+
+        ttl = self.plans.ttl or float("inf")
+        for leg, segment in zip(legs, segments):
+            remaining = self.route_cache.routes.ttl_remaining(leg)
+            if remaining is None:
+                remaining = self.route_cache.fallbacks.ttl_remaining(leg)
+            if remaining is None:
+                if getattr(segment, "source", None) == "offline":
+                    continue
+                # evicted or expired since routing, a plan stored now would outlive it
+                return plan
+            ttl = min(ttl, remaining)
+
+        if ttl == float("inf"):
+            ttl = None
+        elif ttl <= 0:
+            return plan
+
+        with self._lock:
+            for leg in legs:
+                self._plans_by_leg.setdefault(leg, set()).add(key)
+        self.plans.set(key, plan, ttl=ttl)
+        return plan
+
+    def _plan_removed(self, key, plan, reason):
+        with self._lock:
+            for leg in plan.legs:
+                keys = self._plans_by_leg.get(leg)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._plans_by_leg[leg]
+
+    def _leg_removed(self, leg, route, reason):
+        with self._lock:
+            keys = self._plans_by_leg.pop(leg, ())
+        for key in keys:
+            if self.plans.delete(key):
+                self.invalidations += 1
+
+    def clear(self):
+        self.plans.clear()
+
+    def stats(self):
+        return {**self.plans.stats(), "invalidations": self.invalidations}
@@ -0,0 +1,332 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+from models import to_json
+from utils.cache import TTLCache
+from utils.route_planner import fetch_route, geocode_location, build_legs_route_data, route_cache
+
+PLAN_STORE_MAX_ENTRIES = int(os.environ.get('PLAN_STORE_MAX_ENTRIES', 4096))
+PLAN_STORE_TTL = float(os.environ.get('PLAN_STORE_TTL', 24 * 60 * 60))  # a day, long enough for most trips
+PLAN_STORE_MAX_BYTES = int(os.environ.get('PLAN_STORE_MAX_BYTES', 128 * 1024 * 1024))  # 128mb
+PLAN_STORE_PATH = os.environ.get('PLAN_STORE_PATH', 'plan_store.sqlite3')
+PLAN_STORE_MAX_DISK_ENTRIES = int(os.environ.get('PLAN_STORE_MAX_DISK_ENTRIES', 20000))
+
+# on-duty stops this long also count as the 30 minute break
+BREAK_HOURS = 0.5
+
+
+class StoredPlan:
+    """
+    what a re-plan needs from an earlier plan
+    - points: trip start followed by the location of every stop
+    - stop_types: "pickup" / "dropoff" for each stop
+    - stop_durations: on-duty hours at each stop
+    - legs: the fetch_route results between consecutive points
+    - checkpoints: driver state right after each stop (see stop_checkpoints)
+    """
+
+    __slots__ = ("plan_id", "trip", "engine", "points", "stop_types", "stop_durations", "legs", "checkpoints")
+
+    def __init__(self, trip, engine, points, stop_types, legs, checkpoints, stop_durations=None, plan_id=None):
+        self.plan_id = plan_id or uuid.uuid4().hex
+        self.trip = trip
+        self.engine = engine
+        self.points = points
+        self.stop_types = stop_types
+        self.stop_durations = stop_durations
+        self.legs = legs
+        self.checkpoints = checkpoints
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def stored_plan_size(plan):
+    # geometry dominates, this is a rough estimate that doesn't have to serialize anything
+    return sum(len(leg["geometry"]["coordinates"]) * 40 + 1024 for leg in plan.legs)
+
+
+class PlanStore:
+    """
+    plans by id, for re-planning trips in progress
+    - memory: ttl cache in front, a replan right after its plan never touches disk
+    - disk: sqlite table shared by every worker on the host, so a plan made by one
+      gunicorn worker can be re-planned by another
+
+    where the disk can't be written (vercel's read-only filesystem) plans only live in
+    the memory of the instance that made them, and a replan that lands on another
+    instance gets a 404 like an expired plan
+    """
+
+    def __init__(self, path=PLAN_STORE_PATH, max_entries=PLAN_STORE_MAX_ENTRIES, ttl=PLAN_STORE_TTL,
+                 max_bytes=PLAN_STORE_MAX_BYTES, max_disk_entries=PLAN_STORE_MAX_DISK_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.plans = TTLCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes, size_fn=stored_plan_size)
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self._local = threading.local()
+        self._writes = 0
+        self._disk_ok = bool(path)
+
+        if self._disk_ok:
+            try:
+                self._init_db()
+            except sqlite3.Error:
+                # read-only filesystem (serverless) or bad path, memory tier still works
+                self._disk_ok = False
+
+    def _connect(self):
+        # sqlite connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            " plan_id TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS plans_created ON plans (created_at)")
+        conn.commit()
+
+    def add(self, plan):
+        self.plans.set(plan.plan_id, plan)
+        if not self._disk_ok:
+            return plan.plan_id
+
+        try:
+            # geometry is most of a plan and compresses several times over
+            value = zlib.compress(json.dumps(plan.to_dict(), separators=(",", ":"), default=to_json).encode("utf-8"))
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO plans (plan_id, value, created_at) VALUES (?, ?, ?)",
+                (plan.plan_id, value, time.time())
+            )
+            # drop expired rows and the oldest ones over the disk limit, checked every so often
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._trim(conn)
+            conn.commit()
+        except sqlite3.Error:
+            pass
+        return plan.plan_id
+
+    def get(self, plan_id):
+        plan = self.plans.get(plan_id)
+        if plan is not None or not self._disk_ok:
+            return plan
+
+        try:
+            row = self._connect().execute(
+                "SELECT value, created_at FROM plans WHERE plan_id = ?", (plan_id,)).fetchone()
+        except sqlite3.Error:
+            return None
+        now = time.time()
+        if row is None or (self.ttl and row[1] + self.ttl <= now):
+            self.disk_misses += 1
+            return None
+
+        self.disk_hits += 1
+        plan = StoredPlan.from_dict(json.loads(zlib.decompress(row[0])))
+        # promote to memory, keeping the remaining disk ttl
+        self.plans.set(plan_id, plan, ttl=(row[1] + self.ttl - now) if self.ttl else None)
+        return plan
+
+    def _trim(self, conn):
+        if self.ttl:
+            conn.execute("DELETE FROM plans WHERE created_at <= ?", (time.time() - self.ttl,))
+        conn.execute(
+            "DELETE FROM plans WHERE plan_id IN ("
+            " SELECT plan_id FROM plans ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    def __contains__(self, plan_id):
+        return self.get(plan_id) is not None
+
+    def stats(self):
+        disk_entries = None
+        if self._disk_ok:
+            try:
+                disk_entries = self._connect().execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+            except sqlite3.Error:
+                pass
+
+        return {
+            "memory": self.plans.stats(),
+            "disk": {
+                "enabled": self._disk_ok,
+                "path": self.path,
+                "entries": disk_entries,
+                "max_entries": self.max_disk_entries,
+                "hits": self.disk_hits,
+                "misses": self.disk_misses
+            }
+        }
+
+
+def stop_checkpoints(hos_plan, route_data):
+    """
+    driver state right after each pickup / dropoff, in stop order
+
+    the classic engine records a stop's entry once it's done, the simulator records it
+    when it starts (with a timestamp), so its stop time is added on here
+    """
+    durations = [stop["duration"] for stop in route_data["stops"]]
+    checkpoints = []
+    for entry in hos_plan["schedule"]:
+        if entry["status"] not in ("Pickup", "Dropoff") or len(checkpoints) >= len(durations):
+            continue
+
+        if "timestamp" not in entry:
+            checkpoints.append({
+                "day": entry["day"],
+                "hours_driven": entry["hours_driven"],
+                "hours_on_duty": entry["hours_on_duty"],
+                "weekly_hours": entry["weekly_hours"]
+            })
+            continue
+
+        duration = durations[len(checkpoints)]
+        started = datetime.fromisoformat(entry["timestamp"])
+        finished = started + timedelta(hours=duration)
+        checkpoints.append({
+            "day": entry["day"] + (finished.date() - started.date()).days,
+            "timestamp": finished.isoformat(),
+            "hours_driven": entry["hours_driven"],
+            "hours_on_duty": round(entry["hours_on_duty"] + duration, 4),
+            "weekly_hours": round(entry["weekly_hours"] + duration, 4),
+            "since_break": 0.0 if duration >= BREAK_HOURS else None
+        })
+    return checkpoints
+
+
+def store_plan(store, trip, engine, route_data, hos_plan):
+    # keep a finished plan around for re-planning, returns its plan_id
+    segments = route_data["segments"]
+    points = [segments[0]["from"]] + [segment["to"] for segment in segments]
+    legs = [
+        {
+            "distance": segment["distance"],
+            "duration": segment["duration"],
+            "geometry": segment["geometry"],
+            "steps": segment.get("steps")
+        } for segment in segments
+    ]
+    stop_types = [stop["type"] for stop in route_data["stops"]]
+    stop_durations = [stop["duration"] for stop in route_data["stops"]]
+    plan = StoredPlan(trip, engine, points, stop_types, legs, stop_checkpoints(hos_plan, route_data), stop_durations)
+    return store.add(plan)
+
+
+def _same_place(a, b):
+    # same spot as far as the route cache is concerned
+    precision = route_cache.precision
+    return (round(a["latitude"], precision) == round(b["latitude"], precision)
+            and round(a["longitude"], precision) == round(b["longitude"], precision))
+
+
+def parse_completed_stops(value, stop_types):
+    # number of stops already done, from a count or a list like ["pickup"]
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        raise ValueError("completed_stops must be a count or a list of stop types")
+    if isinstance(value, int):
+        count = value
+    elif isinstance(value, list):
+        count = len(value)
+        if [str(stop).lower() for stop in value] != stop_types[:count]:
+            raise ValueError(f"completed_stops must follow the trip's stop order: {', '.join(stop_types)}")
+    else:
+        raise ValueError("completed_stops must be a count or a list of stop types")
+
+    if not 0 <= count < len(stop_types):
+        raise ValueError(f"completed_stops must be between 0 and {len(stop_types) - 1}")
+    return count
+
+
+def resolve_position(value):
+    # the truck's position, either a place name to geocode or reported gps coordinates
+    if isinstance(value, dict):
+        try:
+            latitude = float(value["latitude"])
+            longitude = float(value["longitude"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("current_location needs numeric latitude and longitude")
+        return {
+            "address": value.get("address") or f"{latitude:.5f}, {longitude:.5f}",
+            "latitude": latitude,
+            "longitude": longitude
+        }
+    return geocode_location(value)
+
+
+def replan_route(plan, current_coords, completed, include_steps=False):
+    """
+    route data for the rest of the trip from current_coords
+
+    only the leg to the next stop changed, it's re-routed (unless the truck hasn't moved
+    off the last point), every leg after that is the stored one.
+    returns (route_data, rerouted legs)
+    """
+    points = [current_coords] + plan.points[completed + 1:]
+    stop_types = plan.stop_types[completed:]
+    legs = list(plan.legs[completed:])
+
+    moved = not _same_place(current_coords, plan.points[completed])
+    rerouted = 0
+    for i, (origin, destination) in enumerate(zip(points, points[1:])):
+        # legs stored without steps go through fetch_route too when steps are asked for now
+        if (i == 0 and moved) or (include_steps and legs[i].get("steps") is None):
+            legs[i] = fetch_route(origin, destination, include_steps)
+            rerouted += 1
+
+    stop_durations = plan.stop_durations[completed:] if plan.stop_durations is not None else None
+    route_data = build_legs_route_data(points, legs, stop_types, include_steps, stop_durations)
+    return route_data, rerouted
+
+
+def resume_state(plan, completed, update):
+    """
+    where hos picks up: the checkpoint after the last completed stop, with whatever the
+    driver reported on top (current_hours, hours_driven_today, hours_on_duty_today,
+    current_time). nothing completed and nothing reported means the original trip inputs
+    """
+    state = dict(plan.checkpoints[completed - 1]) if completed and completed <= len(plan.checkpoints) else {}
+
+    if update.get("current_hours") is not None:
+        state["weekly_hours"] = float(update["current_hours"])
+    if update.get("hours_driven_today") is not None:
+        state["hours_driven"] = float(update["hours_driven_today"])
+        state.pop("since_break", None)
+    if update.get("hours_on_duty_today") is not None:
+        state["hours_on_duty"] = float(update["hours_on_duty_today"])
+
+    if update.get("current_time"):
+        now = datetime.fromisoformat(update["current_time"])
+        if state.get("timestamp"):
+            # the trip's day count moves on with the calendar
+            state["day"] = state.get("day", 1) + max(0, (now.date() - datetime.fromisoformat(state["timestamp"]).date()).days)
+        state["timestamp"] = now.isoformat()
+
+    state.setdefault("weekly_hours", float(plan.trip["current_hours"]))
+    return state
@@ -0,0 +1,68 @@
+import json
+import os
+
+from utils.cache import TTLCache
+
+# 3 decimals is ~110m, close enough that two requests for the same depot share a leg
+ROUTE_CACHE_PRECISION = int(os.environ.get('ROUTE_CACHE_PRECISION', 3))
+ROUTE_CACHE_TTL = float(os.environ.get('ROUTE_CACHE_TTL', 6 * 60 * 60))  # 6 hours
+ROUTE_CACHE_MAX_ENTRIES = int(os.environ.get('ROUTE_CACHE_MAX_ENTRIES', 4096))
+ROUTE_CACHE_MAX_BYTES = int(os.environ.get('ROUTE_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64mb
+ROUTE_FALLBACK_TTL = float(os.environ.get('ROUTE_FALLBACK_TTL', 15 * 60))  # 15 minutes
+
+
+def route_size(route):
+    # rough footprint of a cached route, geometry and steps are most of it
+    return len(json.dumps(route, separators=(",", ":")))
+
+
+def route_key(origin, destination, precision=ROUTE_CACHE_PRECISION):
+    # quantize so tiny geocoder differences still hit the same leg
+    return (
+        round(origin["latitude"], precision),
+        round(origin["longitude"], precision),
+        round(destination["latitude"], precision),
+        round(destination["longitude"], precision)
+    )
+
+
+class RouteCache:
+    """
+    cache for fetch_route legs
+
+    real mapbox routes and straight-line estimates live in separate stores so an
+    estimate made while mapbox was down never gets served as a real route later
+    """
+
+    def __init__(self, precision=ROUTE_CACHE_PRECISION, ttl=ROUTE_CACHE_TTL,
+                 max_entries=ROUTE_CACHE_MAX_ENTRIES, max_bytes=ROUTE_CACHE_MAX_BYTES,
+                 fallback_ttl=ROUTE_FALLBACK_TTL):
+        self.precision = precision
+        self.routes = TTLCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes, size_fn=route_size)
+        self.fallbacks = TTLCache(max_entries=max_entries, ttl=fallback_ttl)
+
+    def key(self, origin, destination):
+        return route_key(origin, destination, self.precision)
+
+    def get(self, origin, destination):
+        return self.routes.get(self.key(origin, destination))
+
+    def set(self, origin, destination, route):
+        self.routes.set(self.key(origin, destination), route)
+
+    def get_fallback(self, origin, destination):
+        return self.fallbacks.get(self.key(origin, destination))
+
+    def set_fallback(self, origin, destination, route):
+        self.fallbacks.set(self.key(origin, destination), route)
+
+    def clear(self):
+        self.routes.clear()
+        self.fallbacks.clear()
+
+    def stats(self):
+        return {
+            "precision": self.precision,
+            "routes": self.routes.stats(),
+            "fallbacks": self.fallbacks.stats()
+        }
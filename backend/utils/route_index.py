@@ -0,0 +1,97 @@
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.7613
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    # vectorized great-circle distance, all inputs in radians
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class RouteIndex:
+    """
+    cumulative-distance index over a route's coordinates
+
+    built once in O(n) with numpy, after that any mileage along the route is a binary
+    search plus a linear interpolation between the two surrounding points
+    """
+
+    def __init__(self, coordinates, cumulative_miles, segment_ends=None):
+        self.coordinates = coordinates  # (n, 2) array of lon, lat in degrees
+        self.cumulative_miles = cumulative_miles  # (n,) monotonic
+        self.segment_ends = segment_ends if segment_ends is not None else np.array([cumulative_miles[-1]])
+
+    @property
+    def total_miles(self):
+        return float(self.cumulative_miles[-1])
+
+    @classmethod
+    def from_coordinates(cls, coordinates, total_miles=None):
+        # total_miles rescales the geometry length to the road distance mapbox reported
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        if len(coords) == 1:
+            coords = np.vstack([coords, coords])
+
+        lon = np.radians(coords[:, 0])
+        lat = np.radians(coords[:, 1])
+        steps = haversine_miles(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        cumulative = np.concatenate(([0.0], np.cumsum(steps)))
+
+        if total_miles is not None and cumulative[-1] > 0:
+            cumulative *= total_miles / cumulative[-1]
+        elif total_miles is not None:
+            # degenerate geometry (both ends on the same spot), spread the distance evenly
+            cumulative = np.linspace(0.0, total_miles, len(coords))
+
+        return cls(coords, cumulative)
+
+    @classmethod
+    def from_route(cls, route_data):
+        # one index over every segment, mileage measured from the start of the trip
+        coords = []
+        cumulative = []
+        segment_ends = []
+        offset = 0.0
+
+        for segment in route_data["segments"]:
+            index = cls.from_coordinates(segment["geometry"]["coordinates"], segment["distance"])
+            coords.append(index.coordinates)
+            cumulative.append(index.cumulative_miles + offset)
+            offset += index.total_miles
+            segment_ends.append(offset)
+
+        return cls(np.vstack(coords), np.concatenate(cumulative), np.array(segment_ends))
+
+    def locate_many(self, miles):
+        # (lat, lon) arrays for an array of mileages, clamped to the ends of the route
+        miles = np.clip(np.asarray(miles, dtype=float), 0.0, self.total_miles)
+        upper = np.searchsorted(self.cumulative_miles, miles, side="left")
+        upper = np.clip(upper, 1, len(self.cumulative_miles) - 1)
+        lower = upper - 1
+
+        span = self.cumulative_miles[upper] - self.cumulative_miles[lower]
+        ratio = np.divide(miles - self.cumulative_miles[lower], span, out=np.zeros_like(miles), where=span > 0)
+
+        lon = self.coordinates[lower, 0] + ratio * (self.coordinates[upper, 0] - self.coordinates[lower, 0])
+        lat = self.coordinates[lower, 1] + ratio * (self.coordinates[upper, 1] - self.coordinates[lower, 1])
+        return lat, lon
+
+    def locate(self, miles):
+        # locate_many for one mileage, in plain floats since the array overhead dwarfs the math here
+        miles = min(max(float(miles), 0.0), self.total_miles)
+        upper = int(np.searchsorted(self.cumulative_miles, miles, side="left"))
+        upper = min(max(upper, 1), len(self.cumulative_miles) - 1)
+        lower = upper - 1
+
+        start, end = float(self.cumulative_miles[lower]), float(self.cumulative_miles[upper])
+        ratio = (miles - start) / (end - start) if end > start else 0.0
+        lon_lower, lat_lower = self.coordinates[lower].tolist()
+        lon_upper, lat_upper = self.coordinates[upper].tolist()
+        return {"latitude": lat_lower + ratio * (lat_upper - lat_lower), "longitude": lon_lower + ratio * (lon_upper - lon_lower)}
+
+    def segment_at(self, miles):
+        # which route segment a mileage falls in
+        return int(min(np.searchsorted(self.segment_ends, miles, side="left"), len(self.segment_ends) - 1))
@@ -1,102 +1,676 @@
+import logging
 import os
+import random
+import threading
+import time
+from concurrent.futures import as_completed
 import requests
-from geopy.distance import geodesic
-from geopy.geocoders import Nominatim
+from requests.adapters import HTTPAdapter
 import polyline
+from models import RouteSegment
+from utils.geocode_cache import GeocodeCache, normalize_location_key
+from utils.route_cache import RouteCache
+from utils.gazetteer import gazetteer_geocode, gazetteer_status
+from utils.stop_order import DurationMatrix, parse_stops, stop_precedence, order_stops, path_hours
+from utils.concurrency import RateLimiter, UpstreamPool, SingleFlight
+from utils.metrics import span, UPSTREAM_ERRORS, ROUTE_FALLBACKS, COALESCED_CALLS
 
-# init geocoder with user agent
-geolocator = Nominatim(user_agent="eld_planner_app")
+GEOCODE_TIMEOUT = float(os.environ.get('GEOCODE_TIMEOUT', 10))
+MAPBOX_CONNECT_TIMEOUT = float(os.environ.get('MAPBOX_CONNECT_TIMEOUT', 3.05))
+MAPBOX_READ_TIMEOUT = float(os.environ.get('MAPBOX_READ_TIMEOUT', 10))
+MAPBOX_MAX_RETRIES = int(os.environ.get('MAPBOX_MAX_RETRIES', 2))
+MAPBOX_BACKOFF_BASE = float(os.environ.get('MAPBOX_BACKOFF_BASE', 0.25))
+MAPBOX_BACKOFF_MAX = float(os.environ.get('MAPBOX_BACKOFF_MAX', 4.0))
+MAPBOX_POOL_SIZE = int(os.environ.get('MAPBOX_POOL_SIZE', 16))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_TIMEOUT = float(os.environ.get('BREAKER_RESET_TIMEOUT', 30))
+# total time a plan may spend on one stage (all geocodes, or all legs)
+PLAN_STAGE_TIMEOUT = float(os.environ.get('PLAN_STAGE_TIMEOUT', 30))
+# mapbox: call mapbox first and use the local road graph (if configured) when it fails
+# offline: answer from the local road graph first and only go to mapbox when it can't
+ROUTER_PRIMARY = os.environ.get('ROUTER_PRIMARY', 'mapbox').lower()
+# run the independent lookups of a plan at the same time instead of one after another
+PLAN_CONCURRENT = os.environ.get('PLAN_CONCURRENT', 'True') == 'True'
+
+logger = logging.getLogger(__name__)
+
+# nominatim client, made on the first lookup the gazetteer can't answer (see get_geolocator)
+geolocator = None
+
+# nominatim usage policy: one request per second, no parallel requests
+nominatim_limiter = RateLimiter("nominatim", max_concurrent=1, min_interval=1.0)
+mapbox_limiter = RateLimiter("mapbox", max_concurrent=int(os.environ.get('MAPBOX_MAX_CONCURRENT', 8)))
+
+# separate pools per provider so a slow mapbox can't hold up geocoding (and the other way around)
+geocode_pool = UpstreamPool("nominatim", max_workers=int(os.environ.get('GEOCODE_POOL_SIZE', 4)))
+route_pool = UpstreamPool("mapbox", max_workers=int(os.environ.get('ROUTE_POOL_SIZE', 8)))
+
+# memory + sqlite cache in front of nominatim, lanes reuse the same few hundred places
+geocode_cache = GeocodeCache()
+
+# legs keyed by rounded origin/destination, estimates are kept apart from real routes
+route_cache = RouteCache()
+
+# on-duty time at each pickup / dropoff
+STOP_DURATION = 1.0
+
+# one directions / matrix request takes at most this many coordinates
+MAPBOX_MAX_WAYPOINTS = 25
+
+# driving hours between stops for the stop order optimizer, cached legs count as known pairs
+duration_matrix = DurationMatrix(route_cache)
+
+# identical lookups that are already in flight (shift start, big batches) wait for that call
+geocode_flight = SingleFlight("geocode", on_coalesced=lambda name: COALESCED_CALLS.inc(operation=name))
+route_flight = SingleFlight("route", on_coalesced=lambda name: COALESCED_CALLS.inc(operation=name))
 
 MAPBOX_ACCESS_TOKEN = os.environ.get('MAPBOX_ACCESS_TOKEN', 'pk.sample_key')
 
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    stops calling an upstream that keeps failing
+    - closed: calls go through, consecutive failures are counted
+    - open: calls are skipped until reset_timeout has passed
+    - half_open: one trial call is let through, success closes it, failure opens it again
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.short_circuited += 1
+                    return False
+                self.state = "half_open"
+
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    self.short_circuited += 1
+                    return False
+                self._trial_in_flight = True
+
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited
+        }
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+# one keep-alive session for every mapbox call, retries are done by hand below
+mapbox_session = requests.Session()
+mapbox_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAPBOX_POOL_SIZE, max_retries=0)
+mapbox_session.mount("https://", mapbox_adapter)
+mapbox_breaker = CircuitBreaker("mapbox")
+
+
+def _backoff_delay(attempt, response=None):
+    # honour Retry-After when mapbox sends one, otherwise full jitter exponential backoff
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        return min(float(response.headers["Retry-After"]), MAPBOX_BACKOFF_MAX)
+    return random.uniform(0, min(MAPBOX_BACKOFF_MAX, MAPBOX_BACKOFF_BASE * (2 ** attempt)))
+
+
+def mapbox_get(url, params):
+    # shared client for mapbox: pooled session, timeouts, bounded retries and the breaker
+    if not mapbox_breaker.allow_request():
+        raise UpstreamUnavailable("Mapbox circuit breaker is open")
+
+    try:
+        for attempt in range(MAPBOX_MAX_RETRIES + 1):
+            last_attempt = attempt == MAPBOX_MAX_RETRIES
+            try:
+                with mapbox_limiter.limit(timeout=PLAN_STAGE_TIMEOUT):
+                    response = mapbox_session.get(
+                        url,
+                        params=params,
+                        timeout=(MAPBOX_CONNECT_TIMEOUT, MAPBOX_READ_TIMEOUT)
+                    )
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                time.sleep(_backoff_delay(attempt))
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES and not last_attempt:
+                time.sleep(_backoff_delay(attempt, response))
+                continue
+
+            response.raise_for_status()
+            data = response.json()
+            mapbox_breaker.record_success()
+            return data
+    except Exception:
+        mapbox_breaker.record_failure()
+        UPSTREAM_ERRORS.inc(provider="mapbox")
+        raise
+
+
+def get_upstream_status():
+    # connection pool and breaker state for monitoring
+    pools = []
+    for key in list(mapbox_adapter.poolmanager.pools.keys()):
+        pool = mapbox_adapter.poolmanager.pools.get(key)
+        if pool is None:
+            continue
+        pools.append({
+            "host": pool.host,
+            "max_size": pool.pool.maxsize if pool.pool else 0,
+            # urllib3 fills the queue with None placeholders, only real connections are idle ones
+            "idle_connections": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+            "connections_opened": pool.num_connections,
+            "requests_sent": pool.num_requests
+        })
+
+    return {
+        "mapbox": {
+            "breaker": mapbox_breaker.stats(),
+            "pools": pools,
+            "limiter": mapbox_limiter.stats()
+        },
+        "nominatim": {
+            "client": geolocator is not None,
+            "limiter": nominatim_limiter.stats()
+        },
+        "gazetteer": gazetteer_status(),
+        "coalescing": {
+            "geocode": geocode_flight.stats(),
+            "route": route_flight.stats()
+        },
+        "duration_matrix": duration_matrix.stats(),
+        "offline_router": {
+            "primary": ROUTER_PRIMARY == "offline",
+            **_offline_router_status()
+        }
+    }
+
+def _offline_router_status():
+    from utils.offline_router import offline_router_status
+
+    return offline_router_status()
+
+def get_geolocator():
+    # geopy and its ssl context are a good chunk of a cold start, so the client waits for the first miss
+    global geolocator
+    if geolocator is None:
+        from geopy.geocoders import Nominatim
+
+        geolocator = Nominatim(user_agent="eld_planner_app", timeout=GEOCODE_TIMEOUT)
+    return geolocator
+
 def geocode_location(location_str):
     # converting a location string using longitude and latitude
+    with span("geocode"):
+        result = geocode_flight.do(normalize_location_key(location_str), _geocode_location, location_str,
+                                   timeout=PLAN_STAGE_TIMEOUT)
+    # every caller gets its own copy, coalesced ones share the leader's result
+    return dict(result)
+
+def _geocode_location(location_str):
+    # known cities come from the bundled gazetteer, nominatim only sees the rest
+    place = gazetteer_geocode(location_str)
+    if place is not None:
+        return place
+
+    cached = geocode_cache.get(location_str)
+    if cached is not None:
+        return dict(cached)
+
     try:
-        location = geolocator.geocode(location_str)
+        with nominatim_limiter.limit(timeout=PLAN_STAGE_TIMEOUT):
+            location = get_geolocator().geocode(location_str)
         if location:
-            return {
+            result = {
                 "address": location.address,
                 "latitude": location.latitude,
                 "longitude": location.longitude
             }
+            geocode_cache.set(location_str, result)
+            return dict(result)
         else:
             raise ValueError(f"Could not geocode location: {location_str}")
     except Exception as e:
+        if not isinstance(e, ValueError):
+            UPSTREAM_ERRORS.inc(provider="nominatim")
         raise Exception(f"Geocoding error: {str(e)}")
 
+def warm_geocode_cache(locations):
+    # preload known locations, returns the ones that failed so they can be fixed up
+    failed = []
+    for location_str in locations:
+        if not location_str.strip():
+            continue
+        try:
+            geocode_location(location_str)
+        except Exception as e:
+            failed.append({"location": location_str, "error": str(e)})
+    return failed
+
 def calculate_distance(point1, point2):
     # calculate distance between two points in a mile
     # geopy reference i used https://geopy.readthedocs.io/en/stable/index.html?highlight=geodesic#geopy.distance.geodesic
+    # geopy pulls in every geocoder it has, only import it when the estimate is needed
+    from geopy.distance import geodesic
+
     return geodesic(
         (point1["latitude"], point1["longitude"]),
         (point2["latitude"], point2["longitude"])
     ).miles
 
-def fetch_route(origin, destination):
-    # fetch data from mapbox api
-    try:
-        url = f"https://api.mapbox.com/directions/v5/mapbox/driving/{origin['longitude']},{origin['latitude']};{destination['longitude']},{destination['latitude']}"
-        params = {
-            "access_token": MAPBOX_ACCESS_TOKEN,
-            "geometries": "geojson",
-            "overview": "full",
-            "steps": "true"
-        }
+def fetch_route(origin, destination, include_steps=False):
+    # fetch data from mapbox api, reusing a cached leg when we routed this lane recently
+    # turn-by-turn steps are only requested when asked for, they're most of the payload
+    with span("fetch_route"):
+        result = route_flight.do((route_cache.key(origin, destination), include_steps), _fetch_route,
+                                 origin, destination, include_steps, timeout=PLAN_STAGE_TIMEOUT)
+    return dict(result)
 
-        response = requests.get(url, params=params)
-        response.raise_for_status()
+def _fetch_route(origin, destination, include_steps=False):
+    # the offline router brings numpy with it, imported on the first leg instead of at startup
+    from utils.offline_router import offline_route, NoRouteFound
 
-        data = response.json()
-        if "routes" not in data or not data["routes"]:
-            raise ValueError("No routes found")
+    if ROUTER_PRIMARY == "offline":
+        try:
+            return offline_route(origin, destination)
+        except NoRouteFound:
+            # off the local network, let mapbox have a go
+            pass
 
-        route = data["routes"][0]
+    cached = route_cache.get(origin, destination)
+    if cached is not None and (not include_steps or cached["steps"] is not None):
+        return dict(cached)
 
-        return {
-            "distance": route["distance"] * 0.000621371,  # meters to miles
-            "duration": route["duration"] / 60 / 60,  # seconds to hours
-            "geometry": route["geometry"],
-            "steps": route["legs"][0]["steps"] if route["legs"] else []
-        }
+    try:
+        result = fetch_mapbox_route(origin, destination, include_steps)
+        route_cache.set(origin, destination, result)
+        return dict(result)
     except Exception as e:
-        # for demo, if api fails just estimate data
-        print("API FAILED - ESTIMATING DATA")
-        distance = calculate_distance(origin, destination)
-        return {
-            "distance": distance,
-            "duration": distance / 55,  # traveling at a rate of 55mph
-            "geometry": {
-                "type": "LineString",
-                "coordinates": [
-                    [origin["longitude"], origin["latitude"]],
-                    [destination["longitude"], destination["latitude"]]
-                ]
-            },
-            "steps": []
+        # for demo, if api fails (or the breaker is open) use the local graph, or just estimate data
+        logger.warning("mapbox route failed, estimating the leg (%s: %s)", type(e).__name__, e)
+        if ROUTER_PRIMARY != "offline":
+            try:
+                result = offline_route(origin, destination)
+                ROUTE_FALLBACKS.inc(source="offline")
+                return result
+            except NoRouteFound:
+                pass
+
+        cached = route_cache.get_fallback(origin, destination)
+        if cached is not None:
+            ROUTE_FALLBACKS.inc(source="cached_estimate")
+            return dict(cached)
+
+        result = estimate_route(origin, destination)
+        route_cache.set_fallback(origin, destination, result)
+        ROUTE_FALLBACKS.inc(source="estimate")
+        return dict(result)
+
+def fetch_mapbox_route(origin, destination, include_steps=False):
+    url = f"https://api.mapbox.com/directions/v5/mapbox/driving/{origin['longitude']},{origin['latitude']};{destination['longitude']},{destination['latitude']}"
+    params = {
+        "access_token": MAPBOX_ACCESS_TOKEN,
+        "geometries": "geojson",
+        "overview": "full",
+        "steps": "true" if include_steps else "false"
+    }
+
+    data = mapbox_get(url, params)
+    if "routes" not in data or not data["routes"]:
+        raise ValueError("No routes found")
+
+    route = data["routes"][0]
+
+    return {
+        "distance": route["distance"] * 0.000621371,  # meters to miles
+        "duration": route["duration"] / 60 / 60,  # seconds to hours
+        "geometry": route["geometry"],
+        "steps": (route["legs"][0]["steps"] if route["legs"] else []) if include_steps else None,
+        "source": "mapbox"
+    }
+
+def fetch_route_legs(points, include_steps=False):
+    """
+    routes for every leg of points[0] -> points[1] -> ..., one upstream call for the lot
+    when all the legs are already in the route cache nothing is fetched, otherwise the
+    whole trip goes to mapbox as one multi-waypoint request, split back into legs that
+    are cached one by one. if that fails every leg goes through fetch_route's fallbacks
+    """
+    if len(points) == 2:
+        return [fetch_route(points[0], points[1], include_steps)]
+
+    with span("fetch_route"):
+        key = (tuple(route_cache.key(origin, destination) for origin, destination in zip(points, points[1:])), include_steps)
+        legs = route_flight.do(key, _fetch_route_legs, points, include_steps, timeout=PLAN_STAGE_TIMEOUT)
+    return [dict(leg) for leg in legs]
+
+def _fetch_route_legs(points, include_steps=False):
+    pairs = list(zip(points, points[1:]))
+    if ROUTER_PRIMARY != "offline":
+        cached = [route_cache.get(origin, destination) for origin, destination in pairs]
+        if all(leg is not None and (not include_steps or leg["steps"] is not None) for leg in cached):
+            return [dict(leg) for leg in cached]
+
+        try:
+            legs = fetch_mapbox_legs(points, include_steps)
+            for (origin, destination), leg in zip(pairs, legs):
+                route_cache.set(origin, destination, leg)
+            return [dict(leg) for leg in legs]
+        except Exception as e:
+            logger.warning("multi-waypoint route failed, routing leg by leg (%s: %s)", type(e).__name__, e)
+
+    return [_fetch_route(origin, destination, include_steps) for origin, destination in pairs]
+
+def fetch_mapbox_legs(points, include_steps=False):
+    # one directions request per 25 waypoints (the last point of a chunk starts the next), split into legs
+    legs = []
+    for start in range(0, len(points) - 1, MAPBOX_MAX_WAYPOINTS - 1):
+        legs.extend(_fetch_mapbox_chunk(points[start:start + MAPBOX_MAX_WAYPOINTS], include_steps))
+    return legs
+
+def _fetch_mapbox_chunk(points, include_steps=False):
+    coordinates = ";".join(f"{point['longitude']},{point['latitude']}" for point in points)
+    url = f"https://api.mapbox.com/directions/v5/mapbox/driving/{coordinates}"
+    params = {
+        "access_token": MAPBOX_ACCESS_TOKEN,
+        "geometries": "geojson",
+        "overview": "full",
+        "steps": "true" if include_steps else "false",
+        # one distance per coordinate pair of the overview, per leg, which is how it's cut into legs
+        "annotations": "distance"
+    }
+
+    data = mapbox_get(url, params)
+    if "routes" not in data or not data["routes"]:
+        raise ValueError("No routes found")
+
+    route = data["routes"][0]
+    if len(route["legs"]) != len(points) - 1:
+        raise ValueError(f"Expected {len(points) - 1} legs, got {len(route['legs'])}")
+
+    coordinates = route["geometry"]["coordinates"]
+    return [
+        {
+            "distance": leg["distance"] * 0.000621371,  # meters to miles
+            "duration": leg["duration"] / 60 / 60,  # seconds to hours
+            "geometry": {"type": "LineString", "coordinates": coordinates[start:end + 1]},
+            "steps": leg.get("steps", []) if include_steps else None,
+            "source": "mapbox"
         }
+        for leg, (start, end) in zip(route["legs"], _leg_bounds(route["legs"], coordinates, data.get("waypoints")))
+    ]
+
+def _leg_bounds(legs, coordinates, waypoints):
+    # (first, last) overview coordinate of each leg, neighbouring legs share their boundary point
+    counts = [len((leg.get("annotation") or {}).get("distance") or ()) for leg in legs]
+    if all(counts) and sum(counts) == len(coordinates) - 1:
+        bounds = []
+        start = 0
+        for count in counts:
+            bounds.append((start, start + count))
+            start += count
+        return bounds
 
-def plan_route(current_location, pickup_location, dropoff_location):
+    # no annotations, cut at the overview point closest to each snapped waypoint instead
+    if not waypoints or len(waypoints) != len(legs) + 1:
+        raise ValueError("Can't split the route into legs")
+    cuts = [0]
+    for waypoint in waypoints[1:-1]:
+        longitude, latitude = waypoint["location"]
+        cuts.append(min(
+            range(cuts[-1], len(coordinates)),
+            key=lambda k: (coordinates[k][0] - longitude) ** 2 + (coordinates[k][1] - latitude) ** 2
+        ))
+    cuts.append(len(coordinates) - 1)
+    return list(zip(cuts, cuts[1:]))
+
+def fetch_mapbox_matrix(points):
+    # driving hours between every pair of points (25 at most) from one matrix request, None where there's no route
+    coordinates = ";".join(f"{point['longitude']},{point['latitude']}" for point in points)
+    url = f"https://api.mapbox.com/directions-matrix/v1/mapbox/driving/{coordinates}"
+    data = mapbox_get(url, {"access_token": MAPBOX_ACCESS_TOKEN, "annotations": "duration"})
+    if not data.get("durations"):
+        raise ValueError("No durations found")
+    return [[None if seconds is None else seconds / 60 / 60 for seconds in row] for row in data["durations"]]
+
+def estimate_route(origin, destination):
+    # straight line estimate used when mapbox is unavailable
+    distance = calculate_distance(origin, destination)
+    return {
+        "distance": distance,
+        "duration": distance / 55,  # traveling at a rate of 55mph
+        "geometry": {
+            "type": "LineString",
+            "coordinates": [
+                [origin["longitude"], origin["latitude"]],
+                [destination["longitude"], destination["latitude"]]
+            ]
+        },
+        "steps": [],
+        "source": "estimate"
+    }
+
+def plan_route(current_location, pickup_location, dropoff_location, concurrent=None, include_steps=False):
     # plan for a complete route including fuel stops
+    stops = [
+        {"location": pickup_location, "type": "pickup", "duration": STOP_DURATION, "load": None},
+        {"location": dropoff_location, "type": "dropoff", "duration": STOP_DURATION, "load": None}
+    ]
+    return plan_stops_route(current_location, stops, concurrent=concurrent, include_steps=include_steps)
+
+def trip_stops(trip):
+    # a trip's stops as parse_stops gives them: its "stops" list, or the classic pickup then dropoff
+    if trip.get("stops") is not None:
+        return parse_stops(trip["stops"], STOP_DURATION)
+    return [
+        {"location": trip["pickup_location"], "type": "pickup", "duration": STOP_DURATION, "load": None},
+        {"location": trip["dropoff_location"], "type": "dropoff", "duration": STOP_DURATION, "load": None}
+    ]
 
-    # geocode locations
-    current_coords = geocode_location(current_location)
-    pickup_coords = geocode_location(pickup_location)
-    dropoff_coords = geocode_location(dropoff_location)
+def plan_stops_route(current_location, stops, optimize=False, concurrent=None, include_steps=False):
+    """
+    route from current_location through stops (parse_stops output), in the order given
+    or, with optimize, in the order with the least driving that still picks every load
+    up before dropping it off. every leg comes from one multi-waypoint request
+    """
+    if concurrent is None:
+        concurrent = PLAN_CONCURRENT
 
-    # fetching routes for each segment
-    to_pickup_route = fetch_route(current_coords, pickup_coords)
-    delivery_route = fetch_route(pickup_coords, dropoff_coords)
+    locations = [current_location] + [stop["location"] for stop in stops]
+    if concurrent:
+        # the geocodes don't depend on each other
+        points = geocode_pool.map(geocode_location, locations, timeout=PLAN_STAGE_TIMEOUT)
+    else:
+        points = [geocode_location(location) for location in locations]
 
+    stop_order = None
+    if optimize and len(stops) > 1:
+        with span("optimize_stops"):
+            matrix = duration_matrix.get(points, fetch_mapbox_matrix)
+            order, hours = order_stops(matrix, stop_precedence(stops))
+        stop_order = {
+            "order": order,  # indexes into the stops as given
+            "driving_hours": round(hours, 4),
+            "given_order_driving_hours": round(path_hours(list(range(len(stops))), matrix), 4)
+        }
+        points = [points[0]] + [points[i + 1] for i in order]
+        stops = [stops[i] for i in order]
+
+    routes = fetch_route_legs(points, include_steps)
+    route_data = build_legs_route_data(
+        points, routes, [stop["type"] for stop in stops], include_steps, [stop["duration"] for stop in stops]
+    )
+    if stop_order is not None:
+        route_data["stop_order"] = stop_order
+    return route_data
+
+def _collect(futures, deadline):
+    # key -> result, or the exception for that key, so one bad lookup only fails its own trips
+    results = {}
+    for key, future in futures.items():
+        try:
+            results[key] = future.result(timeout=max(0, deadline - time.monotonic()))
+        except Exception as e:
+            future.cancel()
+            results[key] = e if not isinstance(e, TimeoutError) else TimeoutError(f"Upstream lookup timed out for {key}")
+    return results
+
+def plan_routes_batch(trips, include_steps=False):
+    """
+    plan many trips at once, every unique location is geocoded once and every unique
+    leg is routed once, however many trips share them
+
+    trips is a list of dicts with current_location and pickup_location, dropoff_location
+    or stops (planned in the order given). returns (results, stats) where results is in the same order as trips and holds either
+    route_data or the exception for that trip
+    """
+    results = [None] * len(trips)
+    stats = {}
+    for index, route_data in iter_routes_batch(trips, stats, include_steps):
+        results[index] = route_data
+    return results, stats
+
+def iter_routes_batch(trips, stats=None, include_steps=False):
+    """
+    same as plan_routes_batch, but yields (index, route_data or exception) as soon as
+    each trip's legs are in, so callers can stream results out in completion order
+    """
+    deadline = time.monotonic() + PLAN_STAGE_TIMEOUT * 2
+
+    # unique locations across the batch
+    location_keys = []
+    trip_stop_lists = []
+    location_futures = {}
+    for trip in trips:
+        stops = trip_stops(trip)
+        locations = [trip["current_location"]] + [stop["location"] for stop in stops]
+        keys = [normalize_location_key(location) for location in locations]
+        location_keys.append(keys)
+        trip_stop_lists.append(stops)
+        for location, key in zip(locations, keys):
+            if key not in location_futures:
+                location_futures[key] = geocode_pool.submit(geocode_location, location)
+    coords = _collect(location_futures, deadline)
+
+    # unique legs across the batch, keyed the same way the route cache keys them
+    leg_futures = {}
+    trip_legs = {}
+    waiting = {}  # leg key -> trips that need it
+    for index, keys in enumerate(location_keys):
+        points = [coords[key] for key in keys]
+        errors = [point for point in points if isinstance(point, Exception)]
+        if errors:
+            yield index, errors[0]
+            continue
+
+        legs = []
+        for origin, destination in zip(points, points[1:]):
+            leg_key = route_cache.key(origin, destination)
+            if leg_key not in leg_futures:
+                leg_futures[leg_key] = route_pool.submit(fetch_route, origin, destination, include_steps)
+            waiting.setdefault(leg_key, []).append(index)
+            legs.append(leg_key)
+        trip_legs[index] = legs
+
+    if stats is not None:
+        stats["unique_locations"] = len(location_futures)
+        stats["unique_legs"] = len(leg_futures)
+
+    routes = {}
+    remaining = {index: len(set(legs)) for index, legs in trip_legs.items()}
+    future_keys = {future: key for key, future in leg_futures.items()}
+
+    try:
+        for future in as_completed(future_keys, timeout=max(0, deadline - time.monotonic())):
+            leg_key = future_keys[future]
+            try:
+                routes[leg_key] = future.result()
+            except Exception as e:
+                routes[leg_key] = e
+
+            for index in dict.fromkeys(waiting[leg_key]):
+                remaining[index] -= 1
+                if remaining[index] == 0:
+                    yield index, _assemble_batch_trip(location_keys[index], trip_legs[index], coords, routes,
+                                                       trip_stop_lists[index], include_steps)
+    except TimeoutError:
+        for future in future_keys:
+            future.cancel()
+        for index, count in remaining.items():
+            if count > 0:
+                yield index, TimeoutError("Upstream lookups timed out for this trip")
+
+def _assemble_batch_trip(keys, legs, coords, routes, stops, include_steps=False):
+    points = [coords[key] for key in keys]
+    errors = [routes[leg] for leg in legs if isinstance(routes[leg], Exception)]
+    if errors:
+        return errors[0]
+
+    try:
+        return build_legs_route_data(
+            [dict(point) for point in points],
+            [dict(routes[leg]) for leg in legs],
+            [stop["type"] for stop in stops],
+            include_steps,
+            [stop["duration"] for stop in stops]
+        )
+    except Exception as e:
+        return e
+
+def build_legs_route_data(points, routes, stop_types, include_steps=False, stop_durations=None):
+    """
+    route data for any number of legs: routes[i] goes from points[i] to points[i + 1],
+    and stop_types[i] ("pickup" / "dropoff") is the stop made at the end of it, taking
+    stop_durations[i] hours on duty (STOP_DURATION when not given)
+    """
     # calculate total distance and duration
-    total_distance = to_pickup_route["distance"] + delivery_route["distance"]
-    total_duration = to_pickup_route["duration"] + delivery_route["duration"]
+    total_distance = sum(route["distance"] for route in routes)
+    total_duration = sum(route["duration"] for route in routes)
 
     # incrememt 1 hr / pickup and dropoff
-    pickup_duration = 1.0
-    dropoff_duration = 1.0
+    if stop_durations is None:
+        stop_durations = [STOP_DURATION for _ in stop_types]
 
     total_driving_duration = total_duration
-    total_duration += pickup_duration + dropoff_duration
+    total_duration += sum(stop_durations)
 
     # determine fuel stops every 1000 miles
     num_fuel_stops = int(total_distance / 1000)
@@ -107,12 +681,8 @@ def plan_route(current_location, pickup_location, dropoff_location):
         distance_between_stops = total_distance / (num_fuel_stops + 1)
 
         accumulated_distance = 0
-        current_point = current_coords
 
-        segments = [
-            {"route": to_pickup_route, "end": pickup_coords},
-            {"route": delivery_route, "end": dropoff_coords}
-        ]
+        segments = [{"route": route, "end": end} for route, end in zip(routes, points[1:])]
 
         for segment in segments:
             segment_distance = segment["route"]["distance"]
@@ -122,7 +692,6 @@ def plan_route(current_location, pickup_location, dropoff_location):
 
                 if next_stop_distance < segment_distance:
                     # add fuel stop within segment, for this assessment i just estimate
-                    stop_ratio = next_stop_distance / segment_distance
                     fuel_stop = {
                         "type": "fuel",
                         "distance_from_start": accumulated_distance + next_stop_distance,
@@ -141,32 +710,21 @@ def plan_route(current_location, pickup_location, dropoff_location):
     # summation of route data
     route_data = {
         "segments": [
-            {
-                "from": current_coords,
-                "to": pickup_coords,
-                "distance": to_pickup_route["distance"],
-                "duration": to_pickup_route["duration"],
-                "geometry": to_pickup_route["geometry"]
-            },
-            {
-                "from": pickup_coords,
-                "to": dropoff_coords,
-                "distance": delivery_route["distance"],
-                "duration": delivery_route["duration"],
-                "geometry": delivery_route["geometry"]
-            }
+            RouteSegment(
+                origin=origin,
+                destination=destination,
+                distance=route["distance"],
+                duration=route["duration"],
+                geometry=route["geometry"],
+                source=route.get("source")
+            ) for origin, destination, route in zip(points, points[1:], routes)
         ],
         "stops": [
             {
-                "type": "pickup",
-                "location": pickup_coords,
-                "duration": pickup_duration
-            },
-            {
-                "type": "dropoff",
-                "location": dropoff_coords,
-                "duration": dropoff_duration
-            }
+                "type": stop_type,
+                "location": location,
+                "duration": duration
+            } for stop_type, location, duration in zip(stop_types, points[1:], stop_durations)
         ],
         "fuel_stops": fuel_stops,
         "total_distance": total_distance,
@@ -174,4 +732,21 @@ def plan_route(current_location, pickup_location, dropoff_location):
         "total_duration": total_duration
     }
 
-    return route_data
\ No newline at end of file
+    # real coordinates for the fuel stops from a distance index over the route geometry
+    if fuel_stops:
+        from utils.route_index import RouteIndex
+
+        index = RouteIndex.from_route(route_data)
+        latitudes, longitudes = index.locate_many([stop["distance_from_start"] for stop in fuel_stops])
+        for stop, latitude, longitude in zip(fuel_stops, latitudes, longitudes):
+            stop["latitude"] = float(latitude)
+            stop["longitude"] = float(longitude)
+            # label from the segment the mileage actually falls in
+            segment = route_data["segments"][index.segment_at(stop["distance_from_start"])]
+            stop["estimated_location"] = f"Along route to {segment['to']['address']}"
+
+    if include_steps:
+        for segment, route in zip(route_data["segments"], routes):
+            segment.steps = route["steps"] or []
+
+    return route_data
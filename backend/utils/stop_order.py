@@ -0,0 +1,228 @@
+import logging
+import math
+import os
+
+from utils.cache import TTLCache
+
+MAX_TRIP_STOPS = int(os.environ.get('MAX_TRIP_STOPS', 24))  # mapbox takes 25 coordinates with the start
+DURATION_MATRIX_TTL = float(os.environ.get('DURATION_MATRIX_TTL', 6 * 60 * 60))  # 6 hours, like the route cache
+DURATION_MATRIX_MAX_ENTRIES = int(os.environ.get('DURATION_MATRIX_MAX_ENTRIES', 100000))
+STOP_TYPES = ("pickup", "dropoff")
+# straight line miles to road hours when there's no matrix, a rough 1.2 detour at 55mph
+ESTIMATE_DETOUR = 1.2
+ESTIMATE_SPEED = 55.0
+
+logger = logging.getLogger(__name__)
+
+
+def parse_stops(stops, default_duration):
+    """
+    the "stops" of a multi-stop trip, in the order given
+    [{"location": "Memphis, TN", "type": "pickup", "duration": 1.5, "load": "A"}, ...]
+    duration (on-duty hours at the stop) and load are optional. ValueError names the
+    first bad stop
+    """
+    if not isinstance(stops, list) or not stops:
+        raise ValueError("stops must be a non-empty list")
+    if len(stops) > MAX_TRIP_STOPS:
+        raise ValueError(f"Too many stops, max {MAX_TRIP_STOPS}")
+
+    parsed = []
+    for index, stop in enumerate(stops):
+        if not isinstance(stop, dict) or not str(stop.get("location") or "").strip():
+            raise ValueError(f"stops[{index}] needs a location")
+        stop_type = str(stop.get("type") or "").lower()
+        if stop_type not in STOP_TYPES:
+            raise ValueError(f"stops[{index}] type must be one of {', '.join(STOP_TYPES)}")
+        try:
+            duration = float(stop["duration"]) if stop.get("duration") is not None else default_duration
+        except (TypeError, ValueError):
+            raise ValueError(f"stops[{index}] duration must be a number of hours")
+        if not 0 <= duration <= 24:
+            raise ValueError(f"stops[{index}] duration must be between 0 and 24 hours")
+        parsed.append({
+            "location": str(stop["location"]),
+            "type": stop_type,
+            "duration": duration,
+            "load": None if stop.get("load") is None else str(stop["load"])
+        })
+    return parsed
+
+
+def stop_precedence(stops):
+    """
+    for each stop, the stops that have to come before it. a dropoff with a load comes
+    after the pickups of that load, one without comes after every pickup that was ahead
+    of it in the given order, so reordering never drops off something not yet picked up
+    """
+    before = [set() for _ in stops]
+    for j, stop in enumerate(stops):
+        if stop["type"] != "dropoff":
+            continue
+        for i, other in enumerate(stops):
+            if other["type"] != "pickup" or i == j:
+                continue
+            if stop["load"] is not None:
+                if other["load"] == stop["load"]:
+                    before[j].add(i)
+            elif i < j:
+                before[j].add(i)
+    return before
+
+
+def _feasible(order, before):
+    seen = set()
+    for stop in order:
+        if not before[stop] <= seen:
+            return False
+        seen.add(stop)
+    return True
+
+
+def path_hours(order, matrix):
+    # matrix row / column 0 is the start, stop i is i + 1
+    total = matrix[0][order[0] + 1]
+    for a, b in zip(order, order[1:]):
+        total += matrix[a + 1][b + 1]
+    return total
+
+
+def _nearest_neighbour(matrix, before):
+    count = len(before)
+    order = []
+    visited = set()
+    current = 0
+    while len(order) < count:
+        candidates = [stop for stop in range(count) if stop not in visited and before[stop] <= visited]
+        stop = min(candidates, key=lambda candidate: matrix[current][candidate + 1])
+        order.append(stop)
+        visited.add(stop)
+        current = stop + 1
+    return order
+
+
+def _moves(order):
+    # every 2-opt reversal, then every or-opt move of a run of 1 to 3 stops to another spot
+    count = len(order)
+    for i in range(count - 1):
+        for j in range(i + 1, count):
+            yield order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+    for length in (1, 2, 3):
+        for i in range(count - length + 1):
+            run, rest = order[i:i + length], order[:i] + order[i + length:]
+            for k in range(len(rest) + 1):
+                if k != i:
+                    yield rest[:k] + run + rest[k:]
+
+
+def _local_search(order, matrix, before):
+    """
+    take any move that drives less until none does. a reversal flips pickups and their
+    dropoffs so precedence blocks most of them, moving a run of stops keeps their
+    relative order and is what gets past that
+    """
+    best = path_hours(order, matrix)
+    improved = True
+    while improved:
+        improved = False
+        for candidate in _moves(order):
+            hours = path_hours(candidate, matrix)
+            if hours < best - 1e-9 and _feasible(candidate, before):
+                order, best = candidate, hours
+                improved = True
+                break
+    return order, best
+
+
+def order_stops(matrix, before):
+    """
+    stop order with the least driving time from the start (open path, it ends at
+    whichever stop is last), honouring before. local search (2-opt and or-opt moves)
+    from both a nearest neighbour order and the order given, and the given order wins
+    ties, so the result never drives longer than what was asked for. durations can be
+    asymmetric, so each candidate is costed in full, fine for the couple of dozen stops
+    a truck makes
+    returns (order, hours)
+    """
+    given = list(range(len(before)))
+    starts = [_nearest_neighbour(matrix, before)]
+    if _feasible(given, before):
+        starts.insert(0, given)
+
+    best_order, best = None, math.inf
+    for start in starts:
+        order, hours = _local_search(start, matrix, before)
+        if hours < best - 1e-9:
+            best_order, best = order, hours
+    return best_order, best
+
+
+def estimate_hours(origin, destination):
+    # great circle miles with a detour factor, for pairs the matrix couldn't give us
+    lat1, lon1 = math.radians(origin["latitude"]), math.radians(origin["longitude"])
+    lat2, lon2 = math.radians(destination["latitude"]), math.radians(destination["longitude"])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    miles = 2 * 3958.7613 * math.asin(min(1.0, math.sqrt(h)))
+    return miles * ESTIMATE_DETOUR / ESTIMATE_SPEED
+
+
+class DurationMatrix:
+    """
+    driving hours between pairs of points, keyed like the route cache so a pair that's
+    already a cached leg costs nothing. the pairs a trip is missing are filled with one
+    matrix request for all its points
+    """
+
+    def __init__(self, route_cache, ttl=DURATION_MATRIX_TTL, max_entries=DURATION_MATRIX_MAX_ENTRIES):
+        self.route_cache = route_cache
+        self.pairs = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.requests = 0
+        self.estimated = 0
+
+    def _known(self, origin, destination):
+        key = self.route_cache.key(origin, destination)
+        hours = self.pairs.get(key)
+        if hours is None:
+            leg = self.route_cache.routes.get(key)
+            hours = leg["duration"] if leg is not None else None
+        return hours
+
+    def get(self, points, fetch):
+        """
+        n x n hours for points. fetch(points) returns the full matrix from upstream and
+        is only called when some pair isn't known yet, pairs it can't give (or all of
+        them when it fails) are straight-line estimates that aren't kept
+        """
+        size = len(points)
+        matrix = [[0.0] * size for _ in range(size)]
+        missing = []
+        for i in range(size):
+            for j in range(size):
+                if i != j:
+                    hours = self._known(points[i], points[j])
+                    if hours is None:
+                        missing.append((i, j))
+                    else:
+                        matrix[i][j] = hours
+        if not missing:
+            return matrix
+
+        try:
+            self.requests += 1
+            fetched = fetch(points)
+        except Exception as e:
+            logger.warning("duration matrix failed, estimating durations (%s: %s)", type(e).__name__, e)
+            fetched = None
+
+        for i, j in missing:
+            hours = fetched[i][j] if fetched is not None else None
+            if hours is None:
+                self.estimated += 1
+                matrix[i][j] = estimate_hours(points[i], points[j])
+            else:
+                matrix[i][j] = hours
+                self.pairs.set(self.route_cache.key(points[i], points[j]), hours)
+        return matrix
+
+    def stats(self):
+        return {**self.pairs.stats(), "requests": self.requests, "estimated": self.estimated}
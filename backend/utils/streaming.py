@@ -0,0 +1,34 @@
+import json
+
+from models import to_json
+
+STREAM_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+# let nginx/vercel proxies pass chunks through instead of buffering the whole body
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+
+def stream_format(args, accept):
+    # ?stream=ndjson|sse wins, otherwise look at the Accept header, None means a normal json response
+    requested = (args.get("stream") or "").lower()
+    if requested in STREAM_CONTENT_TYPES:
+        return requested
+
+    accept = (accept or "").lower()
+    for fmt, content_type in STREAM_CONTENT_TYPES.items():
+        if content_type in accept:
+            return fmt
+    return None
+
+
+def encode_event(fmt, event, data):
+    # one ndjson line or one sse message
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=to_json)}\n\n"
+    return json.dumps({"stage": event, "data": data}, separators=(",", ":"), default=to_json) + "\n"